@@ -1,3 +1,5 @@
+import logging
+
 from rest_framework import status, generics, permissions
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
@@ -8,6 +10,9 @@ from django.db.models import Count, Q
 from .models import User
 from .serializers import UserSerializer, LoginSerializer, RegisterSerializer, ProfileSerializer
 
+logger = logging.getLogger(__name__)
+
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def login_view(request):
@@ -79,10 +84,10 @@ def logout_view(request):
         return Response({'message': 'Déconnexion réussie'}, status=status.HTTP_200_OK)
     except AttributeError as e:
         # Blacklist not available - this is OK, just return success
-        print(f"Token blacklist not available: {e}")
+        logger.warning("Token blacklist not available: %s", e)
         return Response({'message': 'Déconnexion réussie'}, status=status.HTTP_200_OK)
     except Exception as e:
-        print(f"Logout error: {str(e)}")
+        logger.warning("Logout error: %s", e)
         return Response(
             {'error': f'Erreur lors de la déconnexion: {str(e)}'}, 
             status=status.HTTP_400_BAD_REQUEST
@@ -4,6 +4,8 @@ from django.urls import reverse
 from django.utils.safestring import mark_safe
 from .models import Appointment, TimeSlot, AppointmentHistory
 from .schedule_models import DoctorWeeklySchedule, DoctorDayOff, DoctorExceptionalSchedule
+from .availability_cache import invalidate_doctor_availability
+from .stats import rebuild_daily_stats
 
 @admin.register(TimeSlot)
 class TimeSlotAdmin(admin.ModelAdmin):
@@ -148,8 +150,16 @@ class AppointmentAdmin(admin.ModelAdmin):
     
     actions = ['mark_as_confirmed', 'mark_as_completed', 'mark_as_cancelled']
     
+    def _refresh_derived_data(self, queryset):
+        # queryset.update() bypasses the post_save signal
+        doctor_ids = list(queryset.order_by().values_list('doctor_id', flat=True).distinct())
+        for doctor_id in doctor_ids:
+            invalidate_doctor_availability(doctor_id)
+        rebuild_daily_stats(doctor_ids)
+    
     def mark_as_confirmed(self, request, queryset):
         updated = queryset.filter(status='scheduled').update(status='confirmed')
+        self._refresh_derived_data(queryset)
         self.message_user(
             request, 
             f'{updated} appointments marked as confirmed.'
@@ -169,6 +179,7 @@ class AppointmentAdmin(admin.ModelAdmin):
     
     def mark_as_completed(self, request, queryset):
         updated = queryset.exclude(status__in=['completed', 'cancelled']).update(status='completed')
+        self._refresh_derived_data(queryset)
         self.message_user(
             request, 
             f'{updated} appointments marked as completed.'
@@ -187,6 +198,7 @@ class AppointmentAdmin(admin.ModelAdmin):
     
     def mark_as_cancelled(self, request, queryset):
         updated = queryset.exclude(status='cancelled').update(status='cancelled')
+        self._refresh_derived_data(queryset)
         self.message_user(
             request, 
             f'{updated} appointments marked as cancelled.'
@@ -0,0 +1,105 @@
+"""
+Per-doctor, per-day cache of generated availability.
+
+Entries live in the Django cache configured by AVAILABILITY_CACHE_ALIAS and are
+keyed by doctor, a per-doctor version number and the date. Any change to a
+doctor's schedule, day-offs, exceptional schedules, time slots or appointments
+bumps the version, so entries computed before the change are never read again
+and simply expire.
+
+The version must be read *before* the schedule data is loaded from the
+database: a change committed in between bumps the version and the freshly
+computed (possibly stale) entries end up under an old key.
+
+Version bumps only reach the other web workers through a shared cache backend
+(Redis, Memcached, database). With the process-local LocMemCache a booking in
+one worker would leave the days cached by the others stale, so the cache is
+only used there when AVAILABILITY_CACHE_ALLOW_LOCAL declares a single process
+(see is_enabled()).
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+
+def _cache():
+    return caches[getattr(settings, 'AVAILABILITY_CACHE_ALIAS', 'default')]
+
+
+def _timeout():
+    return getattr(settings, 'AVAILABILITY_CACHE_TIMEOUT', 60 * 60)
+
+
+def is_enabled():
+    """Whether generated availability is cached (shared backend, or a single process)"""
+    if not _timeout():
+        return False
+    if isinstance(_cache(), LocMemCache):
+        return getattr(settings, 'AVAILABILITY_CACHE_ALLOW_LOCAL', False)
+    return True
+
+
+def _version_key(doctor_id):
+    return f"availability:{doctor_id}:version"
+
+
+def _day_key(doctor_id, version, date):
+    return f"availability:{doctor_id}:v{version}:{date.isoformat()}"
+
+
+def get_version(doctor_id):
+    """Return the current availability version for a doctor"""
+    cache = _cache()
+    version = cache.get(_version_key(doctor_id))
+    if version is None:
+        # Seed from the clock so a version evicted from the cache never
+        # comes back with a number that older day entries were stored under
+        cache.add(_version_key(doctor_id), time.time_ns(), timeout=None)
+        version = cache.get(_version_key(doctor_id))
+    return version
+
+
+def get_days(doctor_id, version, dates):
+    """
+    Fetch cached day entries in one round trip.
+
+    Returns:
+        Dictionary {date: [(start_time, end_time, duration_minutes), ...]}
+        containing only the dates found in the cache.
+    """
+    keys = {_day_key(doctor_id, version, date): date for date in dates}
+    found = _cache().get_many(list(keys))
+    return {keys[key]: value for key, value in found.items()}
+
+
+def set_days(doctor_id, version, days):
+    """Store computed day entries ({date: slots}) under the given version"""
+    _cache().set_many(
+        {_day_key(doctor_id, version, date): slots for date, slots in days.items()},
+        timeout=_timeout()
+    )
+
+
+def _bump_version(doctor_id):
+    cache = _cache()
+    try:
+        cache.incr(_version_key(doctor_id))
+    except ValueError:
+        cache.set(_version_key(doctor_id), time.time_ns(), timeout=None)
+
+
+def invalidate_doctor_availability(doctor_id):
+    """
+    Invalidate all cached availability for a doctor.
+
+    The version is bumped immediately and again once the current transaction
+    commits, so a reader that recomputed between the two (without seeing the
+    uncommitted change) cannot leave a stale entry under the live version.
+    """
+    if doctor_id is None or not is_enabled():
+        return
+    _bump_version(doctor_id)
+    transaction.on_commit(lambda: _bump_version(doctor_id))
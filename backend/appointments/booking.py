@@ -0,0 +1,111 @@
+"""
+Atomic booking service.
+
+A slot is claimed with a single conditional UPDATE (``... WHERE is_available``),
+so when several requests race for the same slot exactly one of them wins and
+the others get SlotUnavailable instead of an IntegrityError deep inside the
+serializer.
+"""
+import time
+
+from django.db import IntegrityError, OperationalError, transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .models import Appointment, AppointmentHistory, TimeSlot
+from .serializers import AppointmentCreateSerializer
+
+# SQLite reports lock contention between concurrent writers as
+# "database is locked"; the booking is retried this many times
+BOOKING_LOCK_RETRIES = 5
+BOOKING_LOCK_BACKOFF = 0.05  # seconds, multiplied by the attempt number
+
+
+class SlotUnavailable(Exception):
+    """Raised when the requested time slot is already booked"""
+
+
+def claim_time_slot(time_slot_id):
+    """
+    Atomically mark a time slot as booked.
+
+    Returns:
+        True if this call claimed the slot, False if it was already taken
+    """
+    claimed = TimeSlot.objects.filter(
+        pk=time_slot_id,
+        is_available=True
+    ).update(is_available=False, updated_at=timezone.now())
+    return claimed == 1
+
+
+def book_virtual_slot(doctor, date, start_time, end_time, appointment_data, booked_by, notes=''):
+    """
+    Book an appointment on a (possibly not yet materialized) time slot.
+
+    Args:
+        doctor: User object (doctor)
+        date, start_time, end_time: Slot boundaries
+        appointment_data: Appointment fields accepted by AppointmentCreateSerializer
+            (patient, doctor, consultation_type, reason_for_visit, ...)
+        booked_by: User making the booking
+        notes: Notes for the history entry
+
+    Returns:
+        The created Appointment
+
+    Raises:
+        SlotUnavailable: If the slot is already booked
+        ValidationError: If the appointment data is invalid
+    """
+    for attempt in range(1, BOOKING_LOCK_RETRIES + 1):
+        try:
+            return _book(doctor, date, start_time, end_time, appointment_data, booked_by, notes)
+        except OperationalError:
+            # Any statement of the booking can hit the lock, not only the claim
+            if attempt == BOOKING_LOCK_RETRIES:
+                raise
+            time.sleep(BOOKING_LOCK_BACKOFF * attempt)
+
+
+def _book(doctor, date, start_time, end_time, appointment_data, booked_by, notes):
+    # get_or_create recovers from the IntegrityError raised when two
+    # requests create the same slot concurrently
+    time_slot, _ = TimeSlot.objects.get_or_create(
+        doctor=doctor,
+        date=date,
+        start_time=start_time,
+        end_time=end_time,
+        defaults={'is_available': True, 'duration_minutes': 30}
+    )
+
+    if not time_slot.is_available:
+        raise SlotUnavailable()
+
+    serializer = AppointmentCreateSerializer(data={**appointment_data, 'time_slot': time_slot.id})
+    if not serializer.is_valid():
+        # Another request may have claimed the slot since it was fetched
+        if not TimeSlot.objects.filter(pk=time_slot.id, is_available=True).exists():
+            raise SlotUnavailable()
+        raise ValidationError(serializer.errors)
+
+    try:
+        with transaction.atomic():
+            if not claim_time_slot(time_slot.id):
+                raise SlotUnavailable()
+
+            appointment = Appointment.objects.create(
+                **serializer.validated_data,
+                created_by=booked_by
+            )
+            AppointmentHistory.objects.create(
+                appointment=appointment,
+                changed_by=booked_by,
+                change_type='created',
+                new_status=appointment.status,
+                notes=notes
+            )
+        return appointment
+    except IntegrityError:
+        # The slot already has an appointment attached (OneToOneField)
+        raise SlotUnavailable()
@@ -0,0 +1,63 @@
+"""
+Benchmark the dynamic slot generator.
+
+Reports, for increasing window sizes, the number of SQL queries and the time
+spent generating a doctor's availability. The query count should stay constant
+as the window grows. By default the availability cache is bypassed; pass
+--cache to measure warm-cache reads instead.
+
+Usage:
+    python manage.py benchmark_slots --doctor 3
+    python manage.py benchmark_slots --doctor 3 --windows 7 30 90 365 --repeat 5
+    python manage.py benchmark_slots --doctor 3 --cache
+"""
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from appointments import availability_cache
+from appointments.slot_generator import get_available_slots
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Measure query count and latency of get_available_slots for several window sizes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctor', type=int, required=True, help="Doctor ID")
+        parser.add_argument(
+            '--windows', type=int, nargs='+', default=[7, 30, 90, 365],
+            help="Window sizes in days"
+        )
+        parser.add_argument('--repeat', type=int, default=3, help="Runs per window size")
+        parser.add_argument('--cache', action='store_true', help="Measure warm availability cache reads")
+
+    def handle(self, *args, **options):
+        try:
+            doctor = User.objects.get(id=options['doctor'], user_type='doctor')
+        except User.DoesNotExist:
+            raise CommandError(f"Doctor {options['doctor']} not found")
+
+        use_cache = options['cache']
+        if use_cache and not availability_cache.is_enabled():
+            raise CommandError("The availability cache is disabled (see AVAILABILITY_CACHE_ALLOW_LOCAL)")
+        self.stdout.write(f"{'days':>6} {'slots':>8} {'queries':>8} {'best ms':>10}")
+
+        for days in options['windows']:
+            if use_cache:
+                # Warm up so the measured runs are cache hits
+                get_available_slots(doctor, days_ahead=days)
+
+            best = None
+            for _ in range(options['repeat']):
+                with CaptureQueriesContext(connection) as ctx:
+                    started = time.perf_counter()
+                    slots = get_available_slots(doctor, days_ahead=days, use_cache=use_cache)
+                    elapsed = (time.perf_counter() - started) * 1000
+                best = elapsed if best is None else min(best, elapsed)
+
+            self.stdout.write(f"{days:>6} {len(slots):>8} {len(ctx.captured_queries):>8} {best:>10.2f}")
@@ -0,0 +1,110 @@
+"""
+Concurrent booking load test.
+
+Fires many simultaneous bookings at one slot and checks that exactly one of
+them succeeds while the others are rejected as conflicts. The appointment and
+time slot created by the test are removed afterwards unless --keep is given.
+
+Usage:
+    python manage.py loadtest_booking --doctor 5 --patient 10 --date 2026-11-02 --start-time 09:00
+    python manage.py loadtest_booking --doctor 5 --patient 10 --date 2026-11-02 --start-time 09:00 --threads 50
+"""
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from appointments.booking import book_virtual_slot, SlotUnavailable
+from appointments.models import TimeSlot
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Fire simultaneous bookings at one slot and assert exactly one succeeds"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctor', type=int, required=True, help="Doctor ID")
+        parser.add_argument('--patient', type=int, required=True, help="Patient ID")
+        parser.add_argument('--date', required=True, help="Slot date (YYYY-MM-DD)")
+        parser.add_argument('--start-time', required=True, help="Slot start time (HH:MM)")
+        parser.add_argument('--duration', type=int, default=30, help="Slot duration in minutes")
+        parser.add_argument('--threads', type=int, default=20, help="Number of concurrent bookings")
+        parser.add_argument('--keep', action='store_true', help="Keep the booked appointment")
+
+    def handle(self, *args, **options):
+        try:
+            doctor = User.objects.get(id=options['doctor'], user_type='doctor')
+            patient = User.objects.get(id=options['patient'], user_type='patient')
+            start = datetime.strptime(f"{options['date']} {options['start_time']}", '%Y-%m-%d %H:%M')
+        except User.DoesNotExist:
+            raise CommandError("Doctor or patient not found")
+        except ValueError as e:
+            raise CommandError(f"Invalid date/time: {e}")
+
+        end = start + timedelta(minutes=options['duration'])
+        slot_lookup = {
+            'doctor': doctor,
+            'date': start.date(),
+            'start_time': start.time(),
+            'end_time': end.time(),
+        }
+        if TimeSlot.objects.filter(**slot_lookup).exists():
+            raise CommandError("The slot already exists; pick a free slot for the load test")
+
+        appointment_data = {
+            'patient': patient.id,
+            'doctor': doctor.id,
+            'reason_for_visit': 'Load test',
+            'contact_phone': '+33600000000',
+        }
+        results = Counter()
+        booked = []
+        barrier = threading.Barrier(options['threads'])
+        lock = threading.Lock()
+
+        def worker():
+            barrier.wait()
+            try:
+                appointment = book_virtual_slot(
+                    doctor=doctor,
+                    date=start.date(),
+                    start_time=start.time(),
+                    end_time=end.time(),
+                    appointment_data=appointment_data,
+                    booked_by=patient,
+                    notes="Load test booking"
+                )
+                outcome = 'booked'
+                with lock:
+                    booked.append(appointment)
+            except SlotUnavailable:
+                outcome = 'conflict'
+            except Exception as e:
+                outcome = f'error: {e.__class__.__name__}'
+            finally:
+                connection.close()
+            with lock:
+                results[outcome] += 1
+
+        threads = [threading.Thread(target=worker) for _ in range(options['threads'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for outcome, count in sorted(results.items()):
+            self.stdout.write(f"{outcome:>20}: {count}")
+
+        if not options['keep']:
+            for appointment in booked:
+                appointment.delete()
+            TimeSlot.objects.filter(**slot_lookup).delete()
+
+        if results['booked'] != 1 or results['conflict'] != options['threads'] - 1:
+            raise CommandError("Expected exactly one successful booking and only conflicts otherwise")
+
+        self.stdout.write(self.style.SUCCESS("OK: exactly one booking succeeded"))
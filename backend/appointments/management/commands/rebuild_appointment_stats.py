@@ -0,0 +1,27 @@
+"""
+Rebuild the AppointmentDailyStats roll-up from the Appointment table.
+
+The roll-up is maintained incrementally by signals; use this command to
+backfill it or to repair it after raw SQL or queryset.update() changes.
+
+Usage:
+    python manage.py rebuild_appointment_stats
+    python manage.py rebuild_appointment_stats --doctor 5 --doctor 7
+"""
+from django.core.management.base import BaseCommand
+
+from appointments.stats import rebuild_daily_stats
+
+
+class Command(BaseCommand):
+    help = "Recompute the per doctor/date/status appointment roll-up"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--doctor', type=int, action='append', dest='doctors',
+            help="Only rebuild this doctor (repeatable)"
+        )
+
+    def handle(self, *args, **options):
+        rows = rebuild_daily_stats(options['doctors'])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {rows} roll-up rows"))
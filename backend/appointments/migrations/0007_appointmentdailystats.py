@@ -0,0 +1,46 @@
+# Generated by Django 4.2.7 on 2026-10-17 03:51
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_daily_stats(apps, schema_editor):
+    Appointment = apps.get_model('appointments', 'Appointment')
+    AppointmentDailyStats = apps.get_model('appointments', 'AppointmentDailyStats')
+
+    rows = [
+        AppointmentDailyStats(doctor_id=doctor_id, date=date, status=status, count=count)
+        for doctor_id, date, status, count in Appointment.objects.order_by().values_list(
+            'doctor_id', 'time_slot__date', 'status'
+        ).annotate(count=models.Count('id'))
+    ]
+    AppointmentDailyStats.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('appointments', '0006_remove_appointment_appointment_type'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AppointmentDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('status', models.CharField(choices=[('scheduled', 'Scheduled'), ('confirmed', 'Confirmed'), ('in_progress', 'In Progress'), ('completed', 'Completed'), ('cancelled', 'Cancelled'), ('no_show', 'No Show')], max_length=20)),
+                ('count', models.IntegerField(default=0)),
+                ('doctor', models.ForeignKey(limit_choices_to={'user_type': 'doctor'}, on_delete=django.db.models.deletion.CASCADE, related_name='appointment_daily_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Appointment daily stats',
+                'ordering': ['-date'],
+                'indexes': [models.Index(fields=['date', 'status'], name='appointment_date_c05bdd_idx')],
+                'unique_together': {('doctor', 'date', 'status')},
+            },
+        ),
+        migrations.RunPython(backfill_daily_stats, migrations.RunPython.noop),
+    ]
@@ -148,13 +148,21 @@ class Appointment(models.Model):
         """Check if appointment is today"""
         return self.time_slot.date == timezone.now().date()
     
-    def can_be_cancelled(self):
-        """Check if appointment can still be cancelled (24 hours before)"""
+    def can_be_cancelled(self, appointment_datetime=None, now=None):
+        """
+        Check if appointment can still be cancelled (24 hours before).
+        appointment_datetime and now can be passed in when already computed.
+        """
         if self.status in [AppointmentStatus.CANCELLED, AppointmentStatus.COMPLETED]:
             return False
         
-        cancel_deadline = self.appointment_datetime - timezone.timedelta(hours=24)
-        return timezone.now() < cancel_deadline
+        if appointment_datetime is None:
+            appointment_datetime = self.appointment_datetime
+        if now is None:
+            now = timezone.now()
+        
+        cancel_deadline = appointment_datetime - timezone.timedelta(hours=24)
+        return now < cancel_deadline
     
     def save(self, *args, **kwargs):
         # Mark time slot as unavailable when appointment is created
@@ -200,6 +208,32 @@ class AppointmentHistory(models.Model):
     def __str__(self):
         return f"{self.appointment} - {self.change_type} at {self.timestamp}"
 
+class AppointmentDailyStats(models.Model):
+    """
+    Materialized daily roll-up of appointment counts per doctor, date and status.
+    Maintained incrementally by signals (see appointments/stats.py).
+    """
+    doctor = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='appointment_daily_stats',
+        limit_choices_to={'user_type': 'doctor'}
+    )
+    date = models.DateField()
+    status = models.CharField(max_length=20, choices=AppointmentStatus.choices)
+    count = models.IntegerField(default=0)
+    
+    class Meta:
+        unique_together = ['doctor', 'date', 'status']
+        ordering = ['-date']
+        verbose_name_plural = "Appointment daily stats"
+        indexes = [
+            models.Index(fields=['date', 'status']),
+        ]
+    
+    def __str__(self):
+        return f"Dr. {self.doctor_id} - {self.date} {self.status}: {self.count}"
+
 
 # Import schedule models to make them available through appointments app
 from .schedule_models import DoctorWeeklySchedule, DoctorDayOff, DoctorExceptionalSchedule
@@ -208,6 +242,7 @@ __all__ = [
     'TimeSlot',
     'Appointment',
     'AppointmentHistory',
+    'AppointmentDailyStats',
     'AppointmentStatus',
     'ConsultationType',
     'DoctorWeeklySchedule',
@@ -12,6 +12,7 @@ from .schedule_serializers import (
     BulkWeeklyScheduleSerializer
 )
 from .permissions import IsDoctorOrReadOnly
+from .availability_cache import invalidate_doctor_availability
 
 
 class DoctorWeeklyScheduleViewSet(viewsets.ModelViewSet):
@@ -54,6 +55,7 @@ class DoctorWeeklyScheduleViewSet(viewsets.ModelViewSet):
         
         if serializer.is_valid():
             schedules = serializer.save()
+            invalidate_doctor_availability(request.user.id)
             return Response(
                 DoctorWeeklyScheduleSerializer(schedules, many=True).data,
                 status=status.HTTP_200_OK
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from django.db import IntegrityError, connection, transaction
 from django.utils import timezone
 from .models import Appointment, TimeSlot, AppointmentHistory
 
@@ -54,52 +55,171 @@ class TimeSlotSerializer(serializers.ModelSerializer):
         
         return data
 
+class TimeSlotSessionSerializer(serializers.Serializer):
+    """A working session (start/end time) used by bulk slot creation"""
+    start_time = serializers.TimeField()
+    end_time = serializers.TimeField()
+    
+    def validate(self, data):
+        if data['end_time'] <= data['start_time']:
+            raise serializers.ValidationError("End time must be after start time.")
+        return data
+
 class TimeSlotCreateSerializer(serializers.Serializer):
-    """Serializer for creating multiple time slots at once"""
+    """
+    Serializer for creating multiple time slots at once.
+    
+    Accepts either a single day (date + start_time/end_time) or a range:
+    start_date/end_date x weekdays x sessions.
+    """
+    MAX_RANGE_DAYS = 366
+    CREATE_ATTEMPTS = 3
+    
     doctor = serializers.PrimaryKeyRelatedField(
         queryset=User.objects.filter(user_type='doctor')
     )
-    date = serializers.DateField()
-    start_time = serializers.TimeField()
-    end_time = serializers.TimeField()
+    date = serializers.DateField(required=False)
+    start_date = serializers.DateField(required=False)
+    end_date = serializers.DateField(required=False)
+    weekdays = serializers.ListField(
+        child=serializers.IntegerField(min_value=0, max_value=6),
+        required=False,
+        help_text="Days of the week to fill (0=Monday, 6=Sunday); default: every day"
+    )
+    start_time = serializers.TimeField(required=False)
+    end_time = serializers.TimeField(required=False)
+    sessions = TimeSlotSessionSerializer(many=True, required=False)
     slot_duration = serializers.IntegerField(default=30, min_value=15, max_value=120)
+    return_slots = serializers.BooleanField(default=True)
     
     def validate(self, data):
-        if data['end_time'] <= data['start_time']:
-            raise serializers.ValidationError("End time must be after start time.")
+        # Single day is a one-day range
+        start_date = data.get('start_date') or data.get('date')
+        end_date = data.get('end_date') or start_date
         
-        if data['date'] < timezone.now().date():
+        if not start_date:
+            raise serializers.ValidationError("Either date or start_date is required.")
+        
+        if end_date < start_date:
+            raise serializers.ValidationError("End date must be on or after start date.")
+        
+        if (end_date - start_date).days >= self.MAX_RANGE_DAYS:
+            raise serializers.ValidationError(
+                f"Date range cannot exceed {self.MAX_RANGE_DAYS} days."
+            )
+        
+        if start_date < timezone.now().date():
             raise serializers.ValidationError("Cannot create time slots for past dates.")
         
+        sessions = data.get('sessions')
+        if not sessions:
+            if not data.get('start_time') or not data.get('end_time'):
+                raise serializers.ValidationError(
+                    "Either start_time/end_time or sessions is required."
+                )
+            if data['end_time'] <= data['start_time']:
+                raise serializers.ValidationError("End time must be after start time.")
+            sessions = [{'start_time': data['start_time'], 'end_time': data['end_time']}]
+        
+        sessions = sorted(sessions, key=lambda session: session['start_time'])
+        for previous, session in zip(sessions, sessions[1:]):
+            if session['start_time'] < previous['end_time']:
+                raise serializers.ValidationError("Sessions must not overlap.")
+        
+        data['start_date'] = start_date
+        data['end_date'] = end_date
+        data['sessions'] = sessions
+        data['weekdays'] = set(data.get('weekdays') or range(7))
         return data
     
+    def build_candidate_slots(self):
+        """Compute every (date, start_time, end_time) slot of the request in memory"""
+        validated_data = self.validated_data
+        duration = timezone.timedelta(minutes=validated_data['slot_duration'])
+        candidates = []
+        
+        current_date = validated_data['start_date']
+        while current_date <= validated_data['end_date']:
+            if current_date.weekday() in validated_data['weekdays']:
+                for session in validated_data['sessions']:
+                    current_time = timezone.datetime.combine(current_date, session['start_time'])
+                    end_datetime = timezone.datetime.combine(current_date, session['end_time'])
+                    
+                    while current_time + duration <= end_datetime:
+                        slot_end_time = current_time + duration
+                        candidates.append((current_date, current_time.time(), slot_end_time.time()))
+                        current_time = slot_end_time
+            current_date += timezone.timedelta(days=1)
+        
+        return candidates
+    
     def create_time_slots(self):
-        """Create multiple time slots based on duration"""
+        """
+        Create all time slots of the request in one transaction.
+        
+        Overlaps with existing slots are detected with a single range query;
+        the remaining slots are inserted with one bulk_create. If another
+        request inserts one of them in between, the unique constraint rejects
+        the insert and the transaction is retried against the new state, so
+        the counts and slots returned are exactly the rows inserted.
+        
+        Returns:
+            Tuple (created_count, skipped_count, created_slots); created_slots
+            is None unless return_slots is set.
+        """
+        from .availability_cache import invalidate_doctor_availability
+        from .slot_generator import BusyIntervals
+        
         validated_data = self.validated_data
         doctor = validated_data['doctor']
-        date = validated_data['date']
-        start_time = validated_data['start_time']
-        end_time = validated_data['end_time']
         duration = validated_data['slot_duration']
+        candidates = self.build_candidate_slots()
+        slots_in_range = TimeSlot.objects.filter(
+            doctor=doctor,
+            date__gte=validated_data['start_date'],
+            date__lte=validated_data['end_date']
+        )
         
-        slots_created = []
-        current_time = timezone.datetime.combine(date, start_time)
-        end_datetime = timezone.datetime.combine(date, end_time)
-        
-        while current_time < end_datetime:
-            slot_end_time = current_time + timezone.timedelta(minutes=duration)
-            if slot_end_time <= end_datetime:
-                time_slot = TimeSlot.objects.create(
-                    doctor=doctor,
-                    date=date,
-                    start_time=current_time.time(),
-                    end_time=slot_end_time.time(),
-                    duration_minutes=duration
-                )
-                slots_created.append(time_slot)
-            current_time = slot_end_time
+        for attempt in range(1, self.CREATE_ATTEMPTS + 1):
+            try:
+                with transaction.atomic():
+                    existing = BusyIntervals(slots_in_range.values_list('date', 'start_time', 'end_time'))
+                    new_slots = [
+                        TimeSlot(
+                            doctor=doctor,
+                            date=date,
+                            start_time=start_time,
+                            end_time=end_time,
+                            duration_minutes=duration
+                        )
+                        for date, start_time, end_time in candidates
+                        if not existing.overlaps(date, start_time, end_time)
+                    ]
+                    TimeSlot.objects.bulk_create(new_slots, batch_size=500)
+                break
+            except IntegrityError:
+                # Slots inserted concurrently by another request
+                if attempt == self.CREATE_ATTEMPTS:
+                    raise serializers.ValidationError(
+                        "Time slots were created concurrently for this doctor, please retry."
+                    )
+        
+        invalidate_doctor_availability(doctor.id)
+        
+        created_slots = None
+        if validated_data['return_slots']:
+            if connection.features.can_return_rows_from_bulk_insert:
+                created_slots = new_slots
+            else:
+                # No primary keys on the inserted objects: every slot with
+                # their keys is one of them (unique doctor/date/start_time)
+                new_keys = {(slot.date, slot.start_time) for slot in new_slots}
+                created_slots = [
+                    slot for slot in slots_in_range.select_related('doctor')
+                    if (slot.date, slot.start_time) in new_keys
+                ]
         
-        return slots_created
+        return len(new_slots), len(candidates) - len(new_slots), created_slots
 
 class UserBasicSerializer(serializers.ModelSerializer):
     """Basic user info for appointments"""
@@ -109,13 +229,29 @@ class UserBasicSerializer(serializers.ModelSerializer):
         model = User
         fields = ['id', 'first_name', 'last_name', 'full_name', 'email']
 
+def appointment_timing(appointment, now=None):
+    """
+    Fields derived from an appointment's time slot, computed once per row.
+
+    Returns:
+        Dictionary with appointment_datetime, is_upcoming, is_today and can_cancel
+    """
+    now = now or timezone.now()
+    appointment_datetime = appointment.appointment_datetime
+    return {
+        'appointment_datetime': appointment_datetime,
+        'is_upcoming': appointment_datetime > now,
+        'is_today': appointment.time_slot.date == now.date(),
+        'can_cancel': appointment.can_be_cancelled(appointment_datetime, now),
+    }
+
 class AppointmentSerializer(serializers.ModelSerializer):
     patient_info = UserBasicSerializer(source='patient', read_only=True)
     doctor_info = UserBasicSerializer(source='doctor', read_only=True)
     time_slot_info = TimeSlotSerializer(source='time_slot', read_only=True)
-    appointment_datetime = serializers.ReadOnlyField()
-    is_upcoming = serializers.ReadOnlyField()
-    is_today = serializers.ReadOnlyField()
+    appointment_datetime = serializers.SerializerMethodField()
+    is_upcoming = serializers.SerializerMethodField()
+    is_today = serializers.SerializerMethodField()
     can_cancel = serializers.SerializerMethodField()
     status_display = serializers.CharField(source='get_status_display', read_only=True)
     consultation_type_display = serializers.CharField(source='get_consultation_type_display', read_only=True)
@@ -132,13 +268,24 @@ class AppointmentSerializer(serializers.ModelSerializer):
             'appointment_datetime', 'is_upcoming', 'is_today', 'can_cancel',
             'created_at', 'updated_at', 'created_by'
         ]
-        read_only_fields = [
-            'created_at', 'updated_at', 'created_by', 'doctor_notes',
-            'appointment_datetime', 'is_upcoming', 'is_today'
-        ]
+        read_only_fields = ['created_at', 'updated_at', 'created_by', 'doctor_notes']
+    
+    def to_representation(self, instance):
+        # The four timing fields of a row share one appointment_timing() call
+        self._timing = appointment_timing(instance)
+        return super().to_representation(instance)
+    
+    def get_appointment_datetime(self, obj):
+        return self._timing['appointment_datetime']
+    
+    def get_is_upcoming(self, obj):
+        return self._timing['is_upcoming']
+    
+    def get_is_today(self, obj):
+        return self._timing['is_today']
     
     def get_can_cancel(self, obj):
-        return obj.can_be_cancelled()
+        return self._timing['can_cancel']
     
     def validate_time_slot(self, value):
         """Ensure the time slot is available"""
@@ -0,0 +1,68 @@
+"""
+Signal handlers keeping derived data consistent.
+
+Any saved or deleted row that affects a doctor's availability invalidates that
+doctor's cached days, and appointment changes are reflected incrementally in
+the AppointmentDailyStats roll-up.
+"""
+from django.db.models.signals import post_save, post_delete, pre_save, pre_delete
+from django.dispatch import receiver
+
+from .availability_cache import invalidate_doctor_availability
+from .models import Appointment, TimeSlot
+from .stats import adjust_daily_stats
+from .schedule_models import DoctorWeeklySchedule, DoctorDayOff, DoctorExceptionalSchedule
+
+AVAILABILITY_MODELS = (
+    DoctorWeeklySchedule,
+    DoctorDayOff,
+    DoctorExceptionalSchedule,
+    TimeSlot,
+    Appointment,
+)
+
+
+def invalidate_availability(sender, instance, **kwargs):
+    """Invalidate the doctor's cached availability when a related row changes"""
+    invalidate_doctor_availability(instance.doctor_id)
+
+
+for model in AVAILABILITY_MODELS:
+    post_save.connect(invalidate_availability, sender=model, dispatch_uid=f'availability_save_{model.__name__}')
+    post_delete.connect(invalidate_availability, sender=model, dispatch_uid=f'availability_delete_{model.__name__}')
+
+
+def _stats_key(appointment):
+    """Roll-up key (doctor, date, status) of an appointment"""
+    return appointment.doctor_id, appointment.time_slot.date, appointment.status
+
+
+@receiver(pre_save, sender=Appointment, dispatch_uid='appointment_stats_pre_save')
+def remember_previous_stats_key(sender, instance, **kwargs):
+    instance._previous_stats_key = None
+    if instance.pk:
+        previous = Appointment.objects.filter(pk=instance.pk).values_list(
+            'doctor_id', 'time_slot__date', 'status'
+        ).first()
+        instance._previous_stats_key = previous
+
+
+@receiver(post_save, sender=Appointment, dispatch_uid='appointment_stats_post_save')
+def update_daily_stats_on_save(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_stats_key', None)
+    current = _stats_key(instance)
+    if previous == current:
+        return
+    if previous is not None:
+        adjust_daily_stats(*previous, -1)
+    adjust_daily_stats(*current, 1)
+
+
+@receiver(pre_delete, sender=Appointment, dispatch_uid='appointment_stats_pre_delete')
+def remember_deleted_stats_key(sender, instance, **kwargs):
+    instance._previous_stats_key = _stats_key(instance)
+
+
+@receiver(post_delete, sender=Appointment, dispatch_uid='appointment_stats_post_delete')
+def update_daily_stats_on_delete(sender, instance, **kwargs):
+    adjust_daily_stats(*instance._previous_stats_key, -1)
@@ -1,118 +1,425 @@
 """
 Utility functions to generate available time slots dynamically from doctor's schedule.
 This avoids needing to pre-generate and store TimeSlot records.
+
+The schedule data for the whole window is loaded up-front in bulk (weekly schedule,
+day-offs, exceptional schedules, booked time slots) and indexed in dictionaries,
+so the number of SQL queries does not depend on the number of days requested.
+
+A materialized TimeSlot that is not available is busy whatever its appointment
+became: a cancelled or completed appointment keeps its (one-to-one) time slot,
+so booking that time again is refused and it must not be offered either.
 """
+import heapq
+from bisect import bisect_left
+from collections import defaultdict
 from datetime import datetime, timedelta, time
+from itertools import islice
+from django.db.models import Q
 from django.utils import timezone
+from . import availability_cache
 from .schedule_models import DoctorWeeklySchedule, DoctorDayOff, DoctorExceptionalSchedule
 
+# Appointment statuses that keep a slot occupied
+ACTIVE_APPOINTMENT_STATUSES = ['scheduled', 'confirmed', 'in_progress']
+
+# Upper bound on the generation window, in days
+MAX_DAYS_AHEAD = 365
+
+# Number of days fetched from the availability cache per round trip
+CACHE_CHUNK_DAYS = 31
+
 
-def get_available_slots(doctor, start_date=None, end_date=None, days_ahead=30):
+class BusyIntervals:
     """
-    Generate available time slots for a doctor based on their schedule.
-    
+    Per-date sorted, merged busy intervals.
+
+    Built once from (date, start, end) ranges in O(n log n); each overlap
+    check is then a binary search in O(log n).
+    """
+
+    def __init__(self, ranges=()):
+        by_date = defaultdict(list)
+        for date, start, end in ranges:
+            if start < end:
+                by_date[date].append((start, end))
+
+        self._starts = {}
+        self._ends = {}
+        for date, intervals in by_date.items():
+            intervals.sort()
+            merged = [list(intervals[0])]
+            for start, end in intervals[1:]:
+                if start <= merged[-1][1]:
+                    merged[-1][1] = max(merged[-1][1], end)
+                else:
+                    merged.append([start, end])
+            self._starts[date] = [start for start, _ in merged]
+            self._ends[date] = [end for _, end in merged]
+
+    def overlaps(self, date, start, end):
+        """Check whether [start, end) intersects a busy interval on this date"""
+        starts = self._starts.get(date)
+        if not starts:
+            return False
+        # Last busy interval starting before the candidate ends
+        i = bisect_left(starts, end) - 1
+        return i >= 0 and self._ends[date][i] > start
+
+
+def load_schedule_indexes(doctors, start_date, end_date):
+    """
+    Load everything needed to generate slots for several doctors between two dates.
+
+    Runs at most four queries regardless of the window length or the number
+    of doctors.
+
+    Returns:
+        Dictionary {doctor_id: index}, where each index is a dictionary with:
+            - weekly: {day_of_week: DoctorWeeklySchedule}
+            - day_offs: {date: DoctorDayOff} (full-day absences only)
+            - exceptional: {date: DoctorExceptionalSchedule}
+            - busy: BusyIntervals built from booked time slots and partial day-offs
+        Doctors without any available weekly schedule are left out.
+    """
+    from .models import TimeSlot
+
+    indexes = {}
+    for schedule in DoctorWeeklySchedule.objects.filter(
+        doctor__in=[doctor.id for doctor in doctors],
+        is_available=True
+    ):
+        index = indexes.setdefault(schedule.doctor_id, {
+            'weekly': {},
+            'day_offs': {},
+            'exceptional': {},
+        })
+        index['weekly'][schedule.day_of_week] = schedule
+
+    if not indexes:
+        return {}
+
+    doctor_ids = list(indexes)
+    busy_ranges = defaultdict(list)
+
+    for day_off in DoctorDayOff.objects.filter(
+        doctor__in=doctor_ids,
+        date__gte=start_date,
+        date__lte=end_date
+    ):
+        if not day_off.is_full_day and day_off.unavailable_start and day_off.unavailable_end:
+            busy_ranges[day_off.doctor_id].append(
+                (day_off.date, day_off.unavailable_start, day_off.unavailable_end)
+            )
+        else:
+            indexes[day_off.doctor_id]['day_offs'][day_off.date] = day_off
+
+    for schedule in DoctorExceptionalSchedule.objects.filter(
+        doctor__in=doctor_ids,
+        date__gte=start_date,
+        date__lte=end_date
+    ):
+        indexes[schedule.doctor_id]['exceptional'][schedule.date] = schedule
+
+    # Booked or blocked time slots (see the module docstring)
+    for doctor_id, date, start, end in TimeSlot.objects.filter(
+        Q(is_available=False) | Q(appointment__status__in=ACTIVE_APPOINTMENT_STATUSES),
+        doctor__in=doctor_ids,
+        date__gte=start_date,
+        date__lte=end_date
+    ).values_list('doctor_id', 'date', 'start_time', 'end_time'):
+        busy_ranges[doctor_id].append((date, start, end))
+
+    for doctor_id, index in indexes.items():
+        index['busy'] = BusyIntervals(busy_ranges[doctor_id])
+
+    return indexes
+
+
+def load_schedule_index(doctor, start_date, end_date):
+    """
+    Load everything needed to generate a doctor's slots between two dates.
+
+    Returns:
+        The doctor's index (see load_schedule_indexes), or None if the doctor
+        has no available weekly schedule.
+    """
+    return load_schedule_indexes([doctor], start_date, end_date).get(doctor.id)
+
+
+def get_sessions(schedule):
+    """Return the (start, end) working sessions defined on a weekly or exceptional schedule"""
+    sessions = []
+    if schedule.morning_start and schedule.morning_end:
+        sessions.append((schedule.morning_start, schedule.morning_end))
+    if schedule.afternoon_start and schedule.afternoon_end:
+        sessions.append((schedule.afternoon_start, schedule.afternoon_end))
+    return sessions
+
+
+def get_day_plan(index, current_date):
+    """
+    Resolve the working sessions and slot duration for one date.
+
+    Day-offs take precedence over exceptional schedules, which take precedence
+    over the regular weekly schedule.
+
+    Returns:
+        Tuple (sessions, duration_minutes); sessions is empty if the doctor
+        does not work that day.
+    """
+    if current_date in index['day_offs']:
+        return [], None
+
+    exceptional = index['exceptional'].get(current_date)
+    if exceptional:
+        return get_sessions(exceptional), exceptional.appointment_duration
+
+    schedule = index['weekly'].get(current_date.weekday())  # 0=Monday, 6=Sunday
+    if not schedule:
+        return [], None
+
+    return get_sessions(schedule), schedule.appointment_duration
+
+
+def generate_day_slots(index, current_date):
+    """
+    Compute a doctor's free slots for one date from the in-memory index.
+
+    Returns:
+        List of (start_time, end_time, duration_minutes) tuples, times as
+        HH:MM:SS strings, in chronological order.
+    """
+    sessions, duration = get_day_plan(index, current_date)
+    busy = index['busy']
+    day_slots = []
+
+    for start_time, end_time in sessions:
+        current_time = datetime.combine(current_date, start_time)
+        end_datetime = datetime.combine(current_date, end_time)
+
+        while current_time < end_datetime:
+            slot_end = current_time + timedelta(minutes=duration)
+
+            if slot_end > end_datetime:
+                break
+
+            if not busy.overlaps(current_date, current_time.time(), slot_end.time()):
+                day_slots.append((
+                    current_time.time().isoformat(),
+                    slot_end.time().isoformat(),
+                    duration
+                ))
+
+            current_time = slot_end
+
+    return day_slots
+
+
+def format_slot(doctor, doctor_name, date_str, slot, compact=False):
+    """Build the API representation of a (start_time, end_time, duration) slot"""
+    start_str, end_str, duration = slot
+    if compact:
+        return {
+            'date': date_str,
+            'start_time': start_str,
+            'end_time': end_str,
+            'duration_minutes': duration
+        }
+    return {
+        'id': f"{doctor.id}_{date_str}_{start_str}",
+        'doctor_id': doctor.id,
+        'doctor_name': doctor_name,
+        'date': date_str,
+        'start_time': start_str,
+        'end_time': end_str,
+        'is_available': True,
+        'duration_minutes': duration
+    }
+
+
+def _iter_formatted(doctor, days, after=None, compact=False):
+    """Format (date, day_slots) pairs into slot dictionaries, skipping slots up to `after`"""
+    doctor_name = doctor.get_full_name()
+    after_key = (after.date().isoformat(), after.time().isoformat()) if after else None
+
+    for current_date, day_slots in days:
+        date_str = current_date.isoformat()
+        for slot in day_slots:
+            if after_key is not None and (date_str, slot[0]) <= after_key:
+                continue
+            yield format_slot(doctor, doctor_name, date_str, slot, compact)
+
+
+def iter_doctor_slots(doctor, index, start_date, end_date, after=None, compact=False):
+    """
+    Lazily yield a doctor's free slots in chronological order.
+
     Args:
         doctor: User object (doctor)
-        start_date: Start date (default: today)
-        end_date: End date (default: start_date + days_ahead)
-        days_ahead: Number of days to generate slots for
-        
+        index: Schedule index from load_schedule_indexes
+        start_date: First date of the window
+        end_date: Last date of the window (inclusive)
+        after: Optional naive datetime; slots starting at or before it are skipped
+        compact: Leave the doctor fields out of each slot
+    """
+    dates = (start_date + timedelta(days=offset) for offset in range((end_date - start_date).days + 1))
+    days = ((date, generate_day_slots(index, date)) for date in dates)
+    yield from _iter_formatted(doctor, days, after=after, compact=compact)
+
+
+def iter_cached_days(doctor, start_date, end_date):
+    """
+    Yield (date, day_slots) for a doctor, going through the availability cache.
+
+    The window is processed in chunks of CACHE_CHUNK_DAYS: each chunk costs one
+    cache round trip, plus the bulk schedule queries only if some of its days
+    are missing from the cache.
+    """
+    chunk_start = start_date
+    while chunk_start <= end_date:
+        chunk_end = min(chunk_start + timedelta(days=CACHE_CHUNK_DAYS - 1), end_date)
+        dates = [
+            chunk_start + timedelta(days=offset)
+            for offset in range((chunk_end - chunk_start).days + 1)
+        ]
+
+        version = availability_cache.get_version(doctor.id)
+        days = availability_cache.get_days(doctor.id, version, dates)
+        missing = [date for date in dates if date not in days]
+
+        if missing:
+            index = load_schedule_index(doctor, missing[0], missing[-1])
+            computed = {
+                date: generate_day_slots(index, date) if index else []
+                for date in missing
+            }
+            availability_cache.set_days(doctor.id, version, computed)
+            days.update(computed)
+
+        for date in dates:
+            yield date, days[date]
+
+        chunk_start = chunk_end + timedelta(days=1)
+
+
+def resolve_window(start_date=None, end_date=None, days_ahead=30):
+    """
+    Apply the default window and clamp it to MAX_DAYS_AHEAD.
+
     Returns:
-        List of dictionaries with available slots
+        Tuple (start_date, end_date)
     """
     if start_date is None:
         start_date = timezone.now().date()
-    
+
     if end_date is None:
         end_date = start_date + timedelta(days=days_ahead)
-    
-    available_slots = []
-    
-    # Get doctor's weekly schedules
-    weekly_schedules = DoctorWeeklySchedule.objects.filter(
-        doctor=doctor,
-        is_available=True
-    )
-    
-    if not weekly_schedules.exists():
-        return []
-    
-    # Get doctor's day-offs and exceptional schedules
-    day_offs = DoctorDayOff.objects.filter(doctor=doctor)
-    exceptional_schedules = DoctorExceptionalSchedule.objects.filter(doctor=doctor)
-    
-    # Get booked appointments to mark slots as unavailable
-    from .models import Appointment
-    booked_slots = Appointment.objects.filter(
-        doctor=doctor,
-        status__in=['scheduled', 'confirmed', 'in_progress']
-    ).values_list('time_slot__id', flat=True)
-    
-    # Iterate through each day
-    current_date = start_date
-    while current_date <= end_date:
-        day_of_week = current_date.weekday()  # 0=Monday, 6=Sunday
-        
-        # Check if it's a day off
-        if day_offs.filter(date=current_date).exists():
-            current_date += timedelta(days=1)
-            continue
-        
-        # Check for exceptional schedule
-        exceptional = exceptional_schedules.filter(date=current_date).first()
-        
-        if exceptional:
-            # Use exceptional schedule for this date
-            if exceptional.start_time and exceptional.end_time:
-                times_to_generate = [(exceptional.start_time, exceptional.end_time)]
-            else:
-                current_date += timedelta(days=1)
-                continue
-            duration = 30  # Default duration for exceptional schedules
-        else:
-            # Use regular weekly schedule for this day
-            schedule = weekly_schedules.filter(day_of_week=day_of_week).first()
-            
-            if not schedule:
-                current_date += timedelta(days=1)
-                continue
-            
-            times_to_generate = []
-            if schedule.morning_start and schedule.morning_end:
-                times_to_generate.append((schedule.morning_start, schedule.morning_end))
-            if schedule.afternoon_start and schedule.afternoon_end:
-                times_to_generate.append((schedule.afternoon_start, schedule.afternoon_end))
-            
-            duration = schedule.appointment_duration
-        
-        # Generate slots for each time range
-        for start_time, end_time in times_to_generate:
-            current_time = datetime.combine(current_date, start_time)
-            end_datetime = datetime.combine(current_date, end_time)
-            
-            while current_time < end_datetime:
-                slot_end = current_time + timedelta(minutes=duration)
-                
-                if slot_end > end_datetime:
-                    break
-                
-                # Check if slot is already booked
-                is_available = True
-                # In a real system, you'd check if this time is already booked
-                
-                available_slots.append({
-                    'id': f"{doctor.id}_{current_date.isoformat()}_{current_time.time().isoformat()}",
-                    'doctor_id': doctor.id,
-                    'doctor_name': doctor.get_full_name(),
-                    'date': current_date.isoformat(),
-                    'start_time': current_time.time().isoformat(),
-                    'end_time': slot_end.time().isoformat(),
-                    'is_available': is_available,
-                    'duration_minutes': duration
-                })
-                
-                current_time = slot_end
-        
-        current_date += timedelta(days=1)
-    
-    return available_slots
+
+    return start_date, min(end_date, start_date + timedelta(days=MAX_DAYS_AHEAD))
+
+
+def iter_available_slots(doctor, start_date=None, end_date=None, days_ahead=30, after=None,
+                         compact=False, use_cache=True):
+    """
+    Lazily generate available time slots for a doctor based on their schedule.
+
+    Days are served from the availability cache when it is enabled (see
+    availability_cache.is_enabled); slots are yielded one by one so callers
+    only pay for what they consume.
+
+    Args:
+        doctor: User object (doctor)
+        start_date: Start date (default: today)
+        end_date: End date (default: start_date + days_ahead)
+        days_ahead: Number of days to generate slots for
+        after: Optional naive datetime cursor; only later slots are yielded
+        compact: Leave the doctor fields out of each slot
+        use_cache: Set to False to always recompute from the database
+    """
+    start_date, end_date = resolve_window(start_date, end_date, days_ahead)
+
+    if after is not None:
+        start_date = max(start_date, after.date())
+
+    if start_date > end_date:
+        return
+
+    if use_cache and availability_cache.is_enabled():
+        yield from _iter_formatted(
+            doctor, iter_cached_days(doctor, start_date, end_date), after=after, compact=compact
+        )
+        return
+
+    index = load_schedule_index(doctor, start_date, end_date)
+    if index is None:
+        return
+
+    yield from iter_doctor_slots(doctor, index, start_date, end_date, after=after, compact=compact)
+
+
+def get_available_slots(doctor, start_date=None, end_date=None, days_ahead=30, use_cache=True):
+    """
+    Generate available time slots for a doctor based on their schedule.
+
+    Args:
+        doctor: User object (doctor)
+        start_date: Start date (default: today)
+        end_date: End date (default: start_date + days_ahead)
+        days_ahead: Number of days to generate slots for
+        use_cache: Set to False to always recompute from the database
+
+    Returns:
+        List of dictionaries with available slots. Slots overlapping a booked
+        time slot or a partial day-off are left out.
+    """
+    return list(iter_available_slots(doctor, start_date, end_date, days_ahead, use_cache=use_cache))
+
+
+def slot_cursor(slot):
+    """Build the pagination cursor (date + start time) pointing at a slot"""
+    return f"{slot['date']}T{slot['start_time']}"
+
+
+def parse_slot_cursor(cursor):
+    """
+    Parse a cursor produced by slot_cursor.
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    return datetime.strptime(cursor, '%Y-%m-%dT%H:%M:%S')
+
+
+def find_first_available_slots(doctors, start_date, end_date, limit=10):
+    """
+    Find the earliest free slots across several doctors.
+
+    Schedules, day-offs, exceptions and bookings for all doctors are loaded in
+    bulk, then the per-doctor chronological slot streams are merged with a heap.
+    Generation stops as soon as `limit` slots have been found.
+
+    Args:
+        doctors: Iterable of User objects (doctors)
+        start_date: First date of the window
+        end_date: Last date of the window (inclusive)
+        limit: Maximum number of slots to return
+
+    Returns:
+        List of slot dictionaries ordered by date and start time
+    """
+    doctors = list(doctors)
+    indexes = load_schedule_indexes(doctors, start_date, end_date)
+
+    # Slots that already started today are not bookable
+    now = timezone.localtime()
+    after = now.replace(tzinfo=None) if start_date <= now.date() else None
+
+    streams = [
+        iter_doctor_slots(doctor, indexes[doctor.id], start_date, end_date, after=after)
+        for doctor in doctors
+        if doctor.id in indexes
+    ]
+    merged = heapq.merge(*streams, key=lambda slot: (slot['date'], slot['start_time']))
+
+    return list(islice(merged, limit))
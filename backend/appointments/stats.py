@@ -0,0 +1,112 @@
+"""
+Appointment statistics.
+
+Counters are computed with conditional aggregation so a dashboard load costs a
+single query, either directly on Appointment or on the AppointmentDailyStats
+roll-up (one row per doctor, date and status) when
+APPOINTMENT_STATS_USE_ROLLUP is enabled.
+"""
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+
+from .models import Appointment, AppointmentDailyStats
+
+
+def get_stat_periods(today):
+    """Return the (this_month_start, last_month_start) boundaries for a date"""
+    this_month_start = today.replace(day=1)
+    last_month_start = (this_month_start - timedelta(days=1)).replace(day=1)
+    return this_month_start, last_month_start
+
+
+def _counter_filters(today, date_field, status_field):
+    """Q filters for every dashboard counter, keyed by statistic name"""
+    this_month_start, last_month_start = get_stat_periods(today)
+    return {
+        'scheduled_appointments': Q(**{status_field: 'scheduled'}),
+        'completed_appointments': Q(**{status_field: 'completed'}),
+        'cancelled_appointments': Q(**{status_field: 'cancelled'}),
+        'today_appointments': Q(**{date_field: today}),
+        'upcoming_appointments': Q(**{
+            f'{date_field}__gte': today,
+            f'{status_field}__in': ['scheduled', 'confirmed'],
+        }),
+        'this_month_total': Q(**{
+            f'{date_field}__gte': this_month_start,
+            f'{date_field}__lte': today,
+        }),
+        'last_month_total': Q(**{
+            f'{date_field}__gte': last_month_start,
+            f'{date_field}__lt': this_month_start,
+        }),
+    }
+
+
+def aggregate_statistics(queryset, today):
+    """Compute all dashboard counters for an Appointment queryset in one query"""
+    filters = _counter_filters(today, 'time_slot__date', 'status')
+    return queryset.aggregate(
+        total_appointments=Count('id'),
+        **{name: Count('id', filter=condition) for name, condition in filters.items()}
+    )
+
+
+def rollup_statistics(today, doctor=None):
+    """Compute the dashboard counters from the daily roll-up in one query"""
+    queryset = AppointmentDailyStats.objects.all()
+    if doctor is not None:
+        queryset = queryset.filter(doctor=doctor)
+
+    filters = _counter_filters(today, 'date', 'status')
+    stats = queryset.aggregate(
+        total_appointments=Sum('count'),
+        **{name: Sum('count', filter=condition) for name, condition in filters.items()}
+    )
+    # SUM over no rows is NULL
+    return {name: value or 0 for name, value in stats.items()}
+
+
+def adjust_daily_stats(doctor_id, date, status, delta):
+    """Increment (or decrement) one roll-up counter"""
+    lookup = {'doctor_id': doctor_id, 'date': date, 'status': status}
+    updated = AppointmentDailyStats.objects.filter(**lookup).update(count=F('count') + delta)
+
+    if not updated and delta > 0:
+        try:
+            with transaction.atomic():
+                AppointmentDailyStats.objects.create(count=delta, **lookup)
+        except IntegrityError:
+            # Created concurrently by another request
+            AppointmentDailyStats.objects.filter(**lookup).update(count=F('count') + delta)
+
+
+def rebuild_daily_stats(doctor_ids=None):
+    """
+    Recompute the roll-up from the Appointment table.
+
+    Args:
+        doctor_ids: Only rebuild these doctors (default: everyone)
+
+    Returns:
+        Number of roll-up rows written
+    """
+    appointments = Appointment.objects.all()
+    stats = AppointmentDailyStats.objects.all()
+    if doctor_ids is not None:
+        appointments = appointments.filter(doctor_id__in=doctor_ids)
+        stats = stats.filter(doctor_id__in=doctor_ids)
+
+    rows = [
+        AppointmentDailyStats(doctor_id=doctor_id, date=date, status=status, count=count)
+        for doctor_id, date, status, count in appointments.order_by().values_list(
+            'doctor_id', 'time_slot__date', 'status'
+        ).annotate(count=Count('id'))
+    ]
+
+    with transaction.atomic():
+        stats.delete()
+        AppointmentDailyStats.objects.bulk_create(rows, batch_size=500)
+
+    return len(rows)
@@ -0,0 +1,744 @@
+import threading
+from collections import Counter
+from datetime import datetime, time, timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from . import availability_cache, serializers
+from .booking import SlotUnavailable, book_virtual_slot
+from .models import Appointment, AppointmentDailyStats, TimeSlot
+from .schedule_models import DoctorDayOff, DoctorWeeklySchedule
+from .slot_generator import BusyIntervals, get_available_slots
+from .stats import aggregate_statistics, rebuild_daily_stats, rollup_statistics
+
+User = get_user_model()
+
+
+def create_doctor(username='doctor', **fields):
+    return User.objects.create_user(
+        username=username, email=f'{username}@example.com', password='pass', user_type='doctor',
+        first_name='Dr', last_name=username.title(), **fields
+    )
+
+
+def create_patient(username='patient'):
+    return User.objects.create_user(
+        username=username, email=f'{username}@example.com', password='pass', user_type='patient'
+    )
+
+
+def work_every_day(doctor, morning=(time(9), time(12)), afternoon=(None, None), duration=30):
+    """Weekly schedule with the same sessions on every day of the week"""
+    for day in range(7):
+        DoctorWeeklySchedule.objects.create(
+            doctor=doctor,
+            day_of_week=day,
+            morning_start=morning[0],
+            morning_end=morning[1],
+            afternoon_start=afternoon[0],
+            afternoon_end=afternoon[1],
+            appointment_duration=duration
+        )
+
+
+class AppointmentListQueryCountTests(APITestCase):
+    """
+    The appointment list endpoints load their relations in the base query:
+    the number of queries must not grow with the number of appointments.
+    """
+    APPOINTMENTS = 5
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = User.objects.create_user(
+            username='doctor', email='doctor@example.com', password='pass', user_type='doctor',
+            first_name='Amel', last_name='Haddad'
+        )
+        cls.patients = [
+            User.objects.create_user(
+                username=f'patient{index}', email=f'patient{index}@example.com', password='pass',
+                user_type='patient', first_name='Patient', last_name=str(index)
+            )
+            for index in range(cls.APPOINTMENTS)
+        ]
+        today = timezone.now().date()
+        for index, patient in enumerate(cls.patients):
+            slot = TimeSlot.objects.create(
+                doctor=cls.doctor,
+                date=today + timedelta(days=index % 2),
+                start_time=time(9 + index),
+                end_time=time(9 + index, 30)
+            )
+            Appointment.objects.create(
+                patient=patient,
+                doctor=cls.doctor,
+                time_slot=slot,
+                reason_for_visit='Contrôle',
+                contact_phone='+21612345678'
+            )
+
+    def setUp(self):
+        self.client.force_authenticate(self.doctor)
+
+    def test_list(self):
+        # Page count, then the page with its relations
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('appointments:appointment-list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), self.APPOINTMENTS)
+
+    def test_upcoming_appointments(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('appointments:upcoming'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), self.APPOINTMENTS)
+
+    def test_today_appointments(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('appointments:today'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), (self.APPOINTMENTS + 1) // 2)
+        self.assertTrue(all(appointment['is_today'] for appointment in response.data))
+        self.assertTrue(all('can_cancel' in appointment for appointment in response.data))
+
+    def test_timing_fields(self):
+        with mock.patch.object(
+            serializers, 'appointment_timing', wraps=serializers.appointment_timing
+        ) as appointment_timing:
+            response = self.client.get(reverse('appointments:appointment-list'))
+        # Computed once per row, in the declared field order
+        self.assertEqual(appointment_timing.call_count, self.APPOINTMENTS)
+        fields = serializers.AppointmentSerializer.Meta.fields
+        self.assertEqual([list(appointment) for appointment in response.data['results']], [fields] * self.APPOINTMENTS)
+
+        declared = serializers.AppointmentSerializer().fields
+        for name in ('appointment_datetime', 'is_upcoming', 'is_today', 'can_cancel'):
+            self.assertTrue(declared[name].read_only)
+
+
+class BulkSlotCreationTests(APITestCase):
+    """create_bulk_slots reports exactly the slots it inserted"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = User.objects.create_user(
+            username='doctor', email='doctor@example.com', password='pass', user_type='doctor'
+        )
+        cls.date = timezone.now().date() + timedelta(days=1)
+
+    def setUp(self):
+        self.client.force_authenticate(self.doctor)
+        TimeSlot.objects.create(doctor=self.doctor, date=self.date, start_time=time(9), end_time=time(9, 30))
+
+    def create_slots(self):
+        return self.client.post(reverse('appointments:timeslot-create-bulk-slots'), {
+            'doctor': self.doctor.id,
+            'date': self.date.isoformat(),
+            'start_time': '09:00',
+            'end_time': '11:00',
+            'slot_duration': 30,
+        }, format='json')
+
+    def assert_created_exactly(self, response):
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created_count'], 3)
+        self.assertEqual(response.data['skipped_count'], 1)
+        created = TimeSlot.objects.filter(doctor=self.doctor).exclude(start_time=time(9))
+        self.assertEqual(
+            sorted(slot['id'] for slot in response.data['slots']),
+            sorted(created.values_list('id', flat=True))
+        )
+
+    def test_existing_slots_are_skipped(self):
+        self.assert_created_exactly(self.create_slots())
+
+    def test_concurrent_insert_is_retried(self):
+        # The first attempt does not see the 9:00 slot, as if another request
+        # had inserted it after the overlap check
+        attempts = []
+
+        def busy_intervals(ranges):
+            attempts.append(ranges)
+            return BusyIntervals(ranges if len(attempts) > 1 else ())
+
+        with mock.patch('appointments.slot_generator.BusyIntervals', side_effect=busy_intervals):
+            response = self.create_slots()
+        self.assertEqual(len(attempts), 2)
+        self.assert_created_exactly(response)
+
+
+class CancelledSlotTests(APITestCase):
+    """A cancelled appointment keeps its time slot: it is neither offered nor bookable"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = create_doctor()
+        cls.patient = create_patient()
+        work_every_day(cls.doctor)
+        cls.date = timezone.now().date() + timedelta(days=7)
+
+    def setUp(self):
+        self.client.force_authenticate(self.patient)
+
+    def book(self, start_time='09:00:00', end_time='09:30:00'):
+        return self.client.post(reverse('appointments:appointment-book-with-virtual-slot'), {
+            'patient': self.patient.id,
+            'doctor': self.doctor.id,
+            'date': self.date.isoformat(),
+            'start_time': start_time,
+            'end_time': end_time,
+            'reason_for_visit': 'Contrôle',
+            'contact_phone': '+21612345678',
+        }, format='json')
+
+    def offered_start_times(self):
+        response = self.client.get(reverse('appointments:timeslot-available-slots'), {
+            'doctor': self.doctor.id,
+            'start_date': self.date.isoformat(),
+            'end_date': self.date.isoformat(),
+        })
+        self.assertEqual(response.status_code, 200)
+        return [slot['start_time'] for slot in response.data['slots']]
+
+    def test_cancel_then_rebook(self):
+        self.assertIn('09:00:00', self.offered_start_times())
+        booked = self.book()
+        self.assertEqual(booked.status_code, 201)
+        self.assertNotIn('09:00:00', self.offered_start_times())
+
+        cancelled = self.client.post(
+            reverse('appointments:appointment-cancel', args=[booked.data['appointment']['id']])
+        )
+        self.assertEqual(cancelled.status_code, 200)
+
+        # Whatever the generator offers can be booked
+        offered = self.offered_start_times()
+        self.assertNotIn('09:00:00', offered)
+        self.assertEqual(self.book().status_code, 409)
+        self.assertIn('09:30:00', offered)
+        self.assertEqual(self.book('09:30:00', '10:00:00').status_code, 201)
+
+
+@override_settings(AVAILABILITY_CACHE_ALLOW_LOCAL=True)
+class AvailabilityCacheInvalidationTests(APITestCase):
+    """Every change to a doctor's availability drops the days cached for them"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = create_doctor()
+        cls.patient = create_patient()
+        work_every_day(cls.doctor)
+        cls.date = timezone.now().date() + timedelta(days=7)
+
+    def setUp(self):
+        availability_cache._cache().clear()
+        self.client.force_authenticate(self.doctor)
+        self.assertEqual(self.offered_start_times()[:2], ['09:00:00', '09:30:00'])
+        self.assertIsNotNone(self.cached_day())
+
+    def offered_start_times(self):
+        response = self.client.get(reverse('appointments:timeslot-available-slots'), {
+            'doctor': self.doctor.id,
+            'start_date': self.date.isoformat(),
+            'end_date': self.date.isoformat(),
+        })
+        return [slot['start_time'] for slot in response.data['slots']]
+
+    def cached_day(self):
+        version = availability_cache.get_version(self.doctor.id)
+        return availability_cache.get_days(self.doctor.id, version, [self.date]).get(self.date)
+
+    def book(self):
+        self.client.force_authenticate(self.patient)
+        response = self.client.post(reverse('appointments:appointment-book-with-virtual-slot'), {
+            'patient': self.patient.id,
+            'doctor': self.doctor.id,
+            'date': self.date.isoformat(),
+            'start_time': '09:00:00',
+            'end_time': '09:30:00',
+            'reason_for_visit': 'Contrôle',
+            'contact_phone': '+21612345678',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.data['appointment']['id']
+
+    def test_booking(self):
+        self.book()
+        self.assertIsNone(self.cached_day())
+        self.assertNotIn('09:00:00', self.offered_start_times())
+
+    def test_cancellation(self):
+        appointment_id = self.book()
+        self.offered_start_times()
+        self.assertIsNotNone(self.cached_day())
+
+        response = self.client.post(reverse('appointments:appointment-cancel', args=[appointment_id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(self.cached_day())
+
+    def test_weekly_schedule_edit(self):
+        schedule = DoctorWeeklySchedule.objects.get(doctor=self.doctor, day_of_week=self.date.weekday())
+        response = self.client.patch(
+            reverse('appointments:weekly-schedule-detail', args=[schedule.id]),
+            {'is_available': True, 'morning_start': '10:00:00', 'morning_end': '12:00:00'},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(self.cached_day())
+        self.assertEqual(self.offered_start_times()[0], '10:00:00')
+
+    def test_weekly_schedule_bulk_update(self):
+        response = self.client.post(reverse('appointments:weekly-schedule-bulk-update'), {
+            'schedules': [
+                {'day_of_week': day, 'is_available': True, 'morning_start': '10:00:00', 'morning_end': '12:00:00'}
+                for day in range(7)
+            ]
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(self.cached_day())
+        self.assertEqual(self.offered_start_times()[0], '10:00:00')
+
+    def test_day_off(self):
+        response = self.client.post(reverse('appointments:day-off-list'), {
+            'date': self.date.isoformat(),
+            'is_full_day': False,
+            'unavailable_start': '09:00:00',
+            'unavailable_end': '10:00:00',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertIsNone(self.cached_day())
+        self.assertEqual(self.offered_start_times()[0], '10:00:00')
+
+    def test_bulk_slot_creation(self):
+        response = self.client.post(reverse('appointments:timeslot-create-bulk-slots'), {
+            'doctor': self.doctor.id,
+            'date': self.date.isoformat(),
+            'start_time': '09:00',
+            'end_time': '10:00',
+            'return_slots': False,
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertIsNone(self.cached_day())
+
+    @override_settings(AVAILABILITY_CACHE_ALLOW_LOCAL=False)
+    def test_local_memory_cache_disabled_for_several_workers(self):
+        self.assertFalse(availability_cache.is_enabled())
+        availability_cache._cache().clear()
+        self.offered_start_times()
+        self.assertIsNone(self.cached_day())
+
+
+class ConcurrentBookingTests(TransactionTestCase):
+    """Simultaneous bookings of one slot: exactly one wins, the others conflict"""
+    THREADS = 8
+
+    def test_one_booking_per_slot(self):
+        doctor = create_doctor()
+        patient = create_patient()
+        date = timezone.now().date() + timedelta(days=7)
+        barrier = threading.Barrier(self.THREADS)
+        lock = threading.Lock()
+        outcomes = Counter()
+
+        def book():
+            barrier.wait()
+            try:
+                book_virtual_slot(
+                    doctor=doctor,
+                    date=date,
+                    start_time=time(9),
+                    end_time=time(9, 30),
+                    appointment_data={
+                        'patient': patient.id,
+                        'doctor': doctor.id,
+                        'reason_for_visit': 'Contrôle',
+                        'contact_phone': '+21612345678',
+                    },
+                    booked_by=patient
+                )
+                outcome = 'booked'
+            except SlotUnavailable:
+                outcome = 'conflict'
+            except Exception as e:
+                outcome = e.__class__.__name__
+            finally:
+                connection.close()
+            with lock:
+                outcomes[outcome] += 1
+
+        threads = [threading.Thread(target=book) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(outcomes, Counter(booked=1, conflict=self.THREADS - 1))
+        self.assertEqual(Appointment.objects.count(), 1)
+        self.assertEqual(TimeSlot.objects.filter(doctor=doctor, date=date).count(), 1)
+
+
+def reference_slots(doctor, start_date, end_date):
+    """
+    Slots of the original day-by-day generator (one query per day and lookup),
+    for weekly schedules and full-day absences
+    """
+    slots = []
+    current_date = start_date
+    while current_date <= end_date:
+        schedule = DoctorWeeklySchedule.objects.filter(
+            doctor=doctor, is_available=True, day_of_week=current_date.weekday()
+        ).first()
+        if schedule and not DoctorDayOff.objects.filter(doctor=doctor, date=current_date).exists():
+            for start_time, end_time in [
+                (schedule.morning_start, schedule.morning_end),
+                (schedule.afternoon_start, schedule.afternoon_end),
+            ]:
+                if not (start_time and end_time):
+                    continue
+                current_time = datetime.combine(current_date, start_time)
+                end_datetime = datetime.combine(current_date, end_time)
+                while current_time + timedelta(minutes=schedule.appointment_duration) <= end_datetime:
+                    slot_end = current_time + timedelta(minutes=schedule.appointment_duration)
+                    slots.append({
+                        'id': f"{doctor.id}_{current_date.isoformat()}_{current_time.time().isoformat()}",
+                        'doctor_id': doctor.id,
+                        'doctor_name': doctor.get_full_name(),
+                        'date': current_date.isoformat(),
+                        'start_time': current_time.time().isoformat(),
+                        'end_time': slot_end.time().isoformat(),
+                        'is_available': True,
+                        'duration_minutes': schedule.appointment_duration
+                    })
+                    current_time = slot_end
+        current_date += timedelta(days=1)
+    return slots
+
+
+class SlotGeneratorBulkLoadTests(TestCase):
+    """The bulk-loaded generator matches the day-by-day one, in a constant number of queries"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = create_doctor()
+        cls.start_date = timezone.now().date() + timedelta(days=1)
+        for day, duration in [(0, 30), (1, 20), (2, 45), (3, 30), (4, 15)]:
+            DoctorWeeklySchedule.objects.create(
+                doctor=cls.doctor,
+                day_of_week=day,
+                morning_start=time(8, 30),
+                morning_end=time(12),
+                afternoon_start=time(14) if day != 2 else None,
+                afternoon_end=time(17, 10) if day != 2 else None,
+                appointment_duration=duration
+            )
+        DoctorWeeklySchedule.objects.create(doctor=cls.doctor, day_of_week=5, is_available=False)
+        for offset in (3, 10):
+            DoctorDayOff.objects.create(doctor=cls.doctor, date=cls.start_date + timedelta(days=offset))
+
+    def test_output_matches_day_by_day_generator(self):
+        end_date = self.start_date + timedelta(days=27)
+        slots = get_available_slots(self.doctor, self.start_date, end_date, use_cache=False)
+        self.assertTrue(slots)
+        self.assertEqual(slots, reference_slots(self.doctor, self.start_date, end_date))
+
+    def test_query_count_does_not_depend_on_the_window(self):
+        # Weekly schedules, day-offs, exceptional schedules, booked time slots
+        for days in (1, 7, 90, 365):
+            with self.subTest(days=days), self.assertNumQueries(4):
+                get_available_slots(self.doctor, self.start_date, days_ahead=days, use_cache=False)
+
+    def test_doctor_without_schedule(self):
+        doctor = create_doctor('other')
+        with self.assertNumQueries(1):
+            self.assertEqual(get_available_slots(doctor, self.start_date, use_cache=False), [])
+
+
+class BusyIntervalsTests(SimpleTestCase):
+    def setUp(self):
+        self.day = timezone.now().date()
+        self.busy = BusyIntervals([
+            (self.day, time(10), time(10, 30)),
+            (self.day, time(10, 30), time(11)),  # adjacent: merged with the previous one
+            (self.day, time(9), time(9, 15)),
+            (self.day, time(14), time(14)),  # empty: ignored
+        ])
+
+    def test_overlaps(self):
+        self.assertTrue(self.busy.overlaps(self.day, time(9), time(9, 30)))
+        self.assertTrue(self.busy.overlaps(self.day, time(10, 45), time(11, 15)))
+        self.assertTrue(self.busy.overlaps(self.day, time(8), time(12)))
+
+    def test_touching_intervals_do_not_overlap(self):
+        self.assertFalse(self.busy.overlaps(self.day, time(9, 15), time(10)))
+        self.assertFalse(self.busy.overlaps(self.day, time(11), time(11, 30)))
+        self.assertFalse(self.busy.overlaps(self.day, time(13, 45), time(14, 15)))
+
+    def test_other_dates_are_free(self):
+        self.assertFalse(self.busy.overlaps(self.day + timedelta(days=1), time(10), time(10, 30)))
+
+
+class BusySlotSubtractionTests(TestCase):
+    """Booked time slots and partial absences are subtracted from the generated slots"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = create_doctor()
+        cls.patient = create_patient()
+        work_every_day(cls.doctor, morning=(time(9), time(12)))
+        cls.date = timezone.now().date() + timedelta(days=3)
+
+    def start_times(self):
+        return [
+            slot['start_time']
+            for slot in get_available_slots(self.doctor, self.date, self.date, use_cache=False)
+        ]
+
+    def book(self, start, end, status='scheduled'):
+        slot = TimeSlot.objects.create(doctor=self.doctor, date=self.date, start_time=start, end_time=end)
+        return Appointment.objects.create(
+            patient=self.patient,
+            doctor=self.doctor,
+            time_slot=slot,
+            status=status,
+            reason_for_visit='Contrôle',
+            contact_phone='+21612345678'
+        )
+
+    def test_booked_slots(self):
+        self.book(time(9), time(9, 30))
+        self.book(time(10, 15), time(10, 45))  # off the grid: blocks 10:00 and 10:30
+        self.assertEqual(self.start_times(), ['09:30:00', '11:00:00', '11:30:00'])
+
+    def test_cancelled_and_completed_appointments_keep_their_slot(self):
+        self.book(time(9), time(9, 30), status='cancelled')
+        self.book(time(9, 30), time(10), status='completed')
+        self.assertEqual(self.start_times()[0], '10:00:00')
+
+    def test_slots_blocked_without_appointment(self):
+        TimeSlot.objects.create(
+            doctor=self.doctor, date=self.date, start_time=time(11), end_time=time(11, 30), is_available=False
+        )
+        TimeSlot.objects.create(doctor=self.doctor, date=self.date, start_time=time(11, 30), end_time=time(12))
+        self.assertEqual(self.start_times(), ['09:00:00', '09:30:00', '10:00:00', '10:30:00', '11:30:00'])
+
+    def test_partial_day_off(self):
+        DoctorDayOff.objects.create(
+            doctor=self.doctor, date=self.date, is_full_day=False,
+            unavailable_start=time(9, 45), unavailable_end=time(11)
+        )
+        self.assertEqual(self.start_times(), ['09:00:00', '11:00:00', '11:30:00'])
+
+    def test_full_day_off(self):
+        DoctorDayOff.objects.create(doctor=self.doctor, date=self.date)
+        self.assertEqual(self.start_times(), [])
+
+
+class FirstAvailableTests(APITestCase):
+    """first_available merges the doctors' slot streams in chronological order"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.date = timezone.now().date() + timedelta(days=2)
+        cls.first = create_doctor('first', specialization='cardiology')
+        work_every_day(cls.first, morning=(time(9), time(12)))
+        cls.second = create_doctor('second', specialization='cardiology')
+        work_every_day(cls.second, morning=(time(9, 15), time(12)), duration=40)
+        # Would be first, but is off that day
+        cls.absent = create_doctor('absent', specialization='cardiology')
+        work_every_day(cls.absent, morning=(time(8), time(12)))
+        DoctorDayOff.objects.create(doctor=cls.absent, date=cls.date)
+        # Other specialization, inactive account
+        work_every_day(create_doctor('dermatologist', specialization='dermatology'), morning=(time(7), time(8)))
+        work_every_day(create_doctor('inactive', specialization='cardiology', is_active=False), morning=(time(7), time(8)))
+
+    def setUp(self):
+        self.client.force_authenticate(create_patient())
+
+    def first_available(self, **params):
+        response = self.client.get(reverse('appointments:timeslot-first-available'), {
+            'specialization': 'cardiology', 'start_date': self.date.isoformat(), **params
+        })
+        self.assertEqual(response.status_code, 200)
+        return response.data['slots']
+
+    def test_ordering_and_limit(self):
+        slots = self.first_available(limit=5)
+        self.assertEqual(
+            [(slot['doctor_id'], slot['start_time']) for slot in slots],
+            [
+                (self.first.id, '09:00:00'),
+                (self.second.id, '09:15:00'),
+                (self.first.id, '09:30:00'),
+                (self.second.id, '09:55:00'),
+                (self.first.id, '10:00:00'),
+            ]
+        )
+        self.assertTrue(all(slot['date'] == self.date.isoformat() for slot in slots))
+        self.assertTrue(all(slot['doctor_specialization'] == 'cardiology' for slot in slots))
+
+    def test_merged_across_days(self):
+        slots = self.first_available(limit=100, end_date=(self.date + timedelta(days=1)).isoformat())
+        keys = [(slot['date'], slot['start_time']) for slot in slots]
+        self.assertEqual(keys, sorted(keys))
+        # 6 + 4 slots on the first day, 8 + 6 + 4 on the next one
+        self.assertEqual(len(slots), 28)
+        self.assertEqual(slots[10]['doctor_id'], self.absent.id)
+
+    def test_query_count_does_not_depend_on_the_doctors(self):
+        # Doctors, then their weekly schedules, day-offs, exceptional schedules and booked slots
+        with self.assertNumQueries(5):
+            self.first_available(limit=100, days_ahead=60)
+
+    def test_invalid_specialization(self):
+        url = reverse('appointments:timeslot-first-available')
+        self.assertEqual(self.client.get(url).status_code, 400)
+        self.assertEqual(self.client.get(url, {'specialization': 'alchemy'}).status_code, 400)
+
+
+class AvailableSlotsPaginationTests(APITestCase):
+    """available_slots pages through the window with next_cursor"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = create_doctor(specialization='cardiology')
+        work_every_day(cls.doctor, morning=(time(9), time(12)), afternoon=(time(14), time(16)))
+        cls.start_date = timezone.now().date() + timedelta(days=1)
+        cls.end_date = cls.start_date + timedelta(days=6)
+
+    def setUp(self):
+        self.client.force_authenticate(create_patient())
+
+    def available_slots(self, **params):
+        return self.client.get(reverse('appointments:timeslot-available-slots'), {
+            'doctor': self.doctor.id,
+            'start_date': self.start_date.isoformat(),
+            'end_date': self.end_date.isoformat(),
+            **params
+        })
+
+    def test_cursor_round_trip(self):
+        everything = self.available_slots().data
+        self.assertNotIn('next_cursor', everything)
+        self.assertEqual(everything['total_slots'], 7 * 10)
+
+        pages, cursor = [], None
+        while True:
+            params = {'page_size': 8}
+            if cursor:
+                params['cursor'] = cursor
+            data = self.available_slots(**params).data
+            self.assertLessEqual(data['total_slots'], 8)
+            pages.append(data['slots'])
+            cursor = data['next_cursor']
+            if cursor is None:
+                break
+
+        # No slot is repeated or skipped between pages
+        self.assertEqual(len(pages), 9)
+        self.assertEqual([slot for page in pages for slot in page], everything['slots'])
+
+    def test_last_full_page(self):
+        data = self.available_slots(page_size=70).data
+        self.assertEqual(data['total_slots'], 70)
+        self.assertIsNone(data['next_cursor'])
+
+    def test_compact(self):
+        full = self.available_slots(page_size=3).data
+        data = self.available_slots(page_size=3, compact='true').data
+        self.assertEqual(data['doctor_specialization'], 'cardiology')
+        self.assertEqual(data['next_cursor'], full['next_cursor'])
+        self.assertEqual(
+            data['slots'],
+            [{key: slot[key] for key in ('date', 'start_time', 'end_time', 'duration_minutes')} for slot in full['slots']]
+        )
+        self.assertNotIn('doctor_specialization', full)
+
+    def test_invalid_cursor(self):
+        for cursor in ('tomorrow', '2030-02-30T09:00:00'):
+            response = self.available_slots(cursor=cursor)
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.data, {'error': 'Invalid cursor'})
+
+
+class DailyStatsRollupTests(TestCase):
+    """The signals keep AppointmentDailyStats equal to the Appointment table"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = create_doctor()
+        cls.other_doctor = create_doctor('other')
+        cls.patient = create_patient()
+        cls.today = timezone.now().date()
+
+    def book(self, doctor, day, hour=9, status='scheduled'):
+        slot = TimeSlot.objects.create(
+            doctor=doctor, date=self.today + timedelta(days=day),
+            start_time=time(hour), end_time=time(hour, 30), is_available=False
+        )
+        return Appointment.objects.create(
+            patient=self.patient, doctor=doctor, time_slot=slot, status=status,
+            reason_for_visit='Contrôle', contact_phone='+21612345678'
+        )
+
+    def assertRollupMatches(self):
+        for doctor in (None, self.doctor, self.other_doctor):
+            appointments = Appointment.objects.all()
+            if doctor is not None:
+                appointments = appointments.filter(doctor=doctor)
+            with self.subTest(doctor=doctor):
+                self.assertEqual(
+                    rollup_statistics(self.today, doctor),
+                    aggregate_statistics(appointments, self.today)
+                )
+
+    def test_create(self):
+        self.book(self.doctor, 0)
+        self.book(self.doctor, 0, hour=10, status='completed')
+        self.book(self.doctor, 3)
+        self.book(self.doctor, -40, status='cancelled')
+        self.book(self.other_doctor, 1, status='confirmed')
+        self.assertRollupMatches()
+        self.assertEqual(rollup_statistics(self.today, self.doctor)['total_appointments'], 4)
+
+    def test_status_change(self):
+        appointment = self.book(self.doctor, 0)
+        self.book(self.doctor, 0, hour=10)
+        appointment.status = 'cancelled'
+        appointment.save()
+        self.assertRollupMatches()
+        self.assertEqual(rollup_statistics(self.today, self.doctor)['cancelled_appointments'], 1)
+        # The previous status counter was decremented
+        self.assertEqual(
+            AppointmentDailyStats.objects.get(doctor=self.doctor, date=self.today, status='scheduled').count, 1
+        )
+
+    def test_date_change(self):
+        appointment = self.book(self.doctor, 0)
+        appointment.time_slot = TimeSlot.objects.create(
+            doctor=self.doctor, date=self.today - timedelta(days=35),
+            start_time=time(9), end_time=time(9, 30), is_available=False
+        )
+        appointment.save()
+        self.assertRollupMatches()
+        self.assertEqual(rollup_statistics(self.today, self.doctor)['today_appointments'], 0)
+
+    def test_delete(self):
+        appointment = self.book(self.doctor, 0)
+        self.book(self.doctor, 0, hour=10)
+        self.book(self.other_doctor, 0).delete()
+        appointment.delete()
+        self.assertRollupMatches()
+        self.assertEqual(rollup_statistics(self.today)['total_appointments'], 1)
+
+    def test_rebuild(self):
+        self.book(self.doctor, 0)
+        self.book(self.other_doctor, 2, status='confirmed')
+        AppointmentDailyStats.objects.all().delete()
+        self.assertEqual(rebuild_daily_stats(), 2)
+        self.assertRollupMatches()
@@ -4,11 +4,13 @@ from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
 from rest_framework.decorators import action
 from django.shortcuts import get_object_or_404
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from django.db.models import Q, Count
 from datetime import datetime, timedelta
 import calendar
+from itertools import islice
 
 from .models import Appointment, TimeSlot, AppointmentHistory
 from .schedule_models import DoctorDayOff
@@ -18,10 +20,18 @@ from .serializers import (
     DoctorAvailabilitySerializer, AppointmentStatsSerializer
 )
 from .permissions import IsPatientOrDoctor, IsAppointmentParticipant
-from .slot_generator import get_available_slots
+from .booking import book_virtual_slot, SlotUnavailable
+from .stats import aggregate_statistics, rollup_statistics
+from .slot_generator import (
+    iter_available_slots, find_first_available_slots, resolve_window,
+    slot_cursor, parse_slot_cursor
+)
 
 User = get_user_model()
 
+# Relations read by AppointmentSerializer, loaded with the base query
+APPOINTMENT_LIST_RELATED = ('patient', 'doctor', 'time_slot', 'time_slot__doctor')
+
 class TimeSlotViewSet(ModelViewSet):
     """ViewSet for managing time slots"""
     queryset = TimeSlot.objects.all()
@@ -29,7 +39,7 @@ class TimeSlotViewSet(ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        queryset = TimeSlot.objects.all()
+        queryset = TimeSlot.objects.select_related('doctor')
         
         # Filter by doctor
         doctor_id = self.request.query_params.get('doctor', None)
@@ -68,7 +78,14 @@ class TimeSlotViewSet(ModelViewSet):
     
     @action(detail=False, methods=['post'])
     def create_bulk_slots(self, request):
-        """Create multiple time slots at once"""
+        """
+        Create multiple time slots at once.
+        
+        Either a single day (date, start_time, end_time) or a range
+        (start_date, end_date, weekdays, sessions). Slots overlapping existing
+        ones are skipped and counted in skipped_count; set return_slots=false
+        to only get the counts back.
+        """
         serializer = TimeSlotCreateSerializer(data=request.data)
         if serializer.is_valid():
             # Ensure only doctors can create slots for themselves
@@ -80,13 +97,16 @@ class TimeSlotViewSet(ModelViewSet):
             
             # Override doctor to current user
             serializer.validated_data['doctor'] = request.user
-            slots = serializer.create_time_slots()
+            created_count, skipped_count, slots = serializer.create_time_slots()
             
-            slot_serializer = TimeSlotSerializer(slots, many=True)
-            return Response({
-                "message": f"Created {len(slots)} time slots successfully.",
-                "slots": slot_serializer.data
-            }, status=status.HTTP_201_CREATED)
+            response_data = {
+                "message": f"Created {created_count} time slots successfully.",
+                "created_count": created_count,
+                "skipped_count": skipped_count,
+            }
+            if slots is not None:
+                response_data["slots"] = TimeSlotSerializer(slots, many=True).data
+            return Response(response_data, status=status.HTTP_201_CREATED)
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
@@ -98,7 +118,12 @@ class TimeSlotViewSet(ModelViewSet):
             - doctor: Doctor ID (required)
             - start_date: Start date (YYYY-MM-DD, default: today)
             - end_date: End date (YYYY-MM-DD, optional)
-            - days_ahead: Number of days to generate (default: 30)
+            - days_ahead: Number of days to generate (default: 30, max: 365)
+            - page_size: Return at most this many slots plus a next_cursor (max: 500)
+            - cursor: next_cursor from the previous page (YYYY-MM-DDTHH:MM:SS)
+            - compact: true to hoist doctor fields out of each slot
+        
+        Without page_size or cursor the whole window is returned.
         """
         doctor_id = request.query_params.get('doctor')
         
@@ -147,19 +172,138 @@ class TimeSlotViewSet(ModelViewSet):
         except ValueError:
             days_ahead = 30
         
-        # Generate available slots dynamically from doctor's schedule
-        available_slots = get_available_slots(
+        cursor = request.query_params.get('cursor')
+        page_size = request.query_params.get('page_size')
+        compact = request.query_params.get('compact', 'false').lower() == 'true'
+        paginated = bool(cursor or page_size)
+        
+        after = None
+        if cursor:
+            try:
+                after = parse_slot_cursor(cursor)
+            except ValueError:
+                return Response(
+                    {"error": "Invalid cursor"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        
+        try:
+            page_size = min(max(int(page_size or 100), 1), 500)
+        except ValueError:
+            page_size = 100
+        
+        start_date, end_date = resolve_window(start_date, end_date, days_ahead)
+        
+        # Generate available slots lazily from doctor's schedule
+        slots_iter = iter_available_slots(
             doctor=doctor,
             start_date=start_date,
             end_date=end_date,
-            days_ahead=days_ahead
+            after=after,
+            compact=compact
         )
         
-        return Response({
+        response_data = {
             "doctor_id": doctor.id,
             "doctor_name": doctor.get_full_name(),
-            "total_slots": len(available_slots),
-            "slots": available_slots
+        }
+        if compact:
+            response_data["doctor_specialization"] = doctor.specialization
+        
+        if paginated:
+            # Fetch one extra slot to know whether another page exists
+            available_slots = list(islice(slots_iter, page_size + 1))
+            has_more = len(available_slots) > page_size
+            available_slots = available_slots[:page_size]
+            response_data["next_cursor"] = (
+                slot_cursor(available_slots[-1]) if has_more else None
+            )
+        else:
+            available_slots = list(slots_iter)
+        
+        response_data["total_slots"] = len(available_slots)
+        response_data["slots"] = available_slots
+        
+        return Response(response_data, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'])
+    def first_available(self, request):
+        """
+        Find the earliest free slots across all doctors of a specialization.
+        Query parameters:
+            - specialization: Doctor specialization (required, e.g. cardiology)
+            - start_date: Start date (YYYY-MM-DD, default: today)
+            - end_date: End date (YYYY-MM-DD, default: start_date + days_ahead)
+            - days_ahead: Number of days to search (default: 30)
+            - limit: Maximum number of slots to return (default: 10, max: 100)
+        """
+        specialization = request.query_params.get('specialization')
+        valid_specializations = dict(User.SPECIALIZATION_CHOICES)
+        
+        if not specialization:
+            return Response(
+                {"error": "Specialization is required"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if specialization not in valid_specializations:
+            return Response(
+                {"error": f"Unknown specialization: {specialization}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            start_date_str = request.query_params.get('start_date')
+            end_date_str = request.query_params.get('end_date')
+            start_date = (
+                datetime.strptime(start_date_str, '%Y-%m-%d').date()
+                if start_date_str else timezone.now().date()
+            )
+            end_date = (
+                datetime.strptime(end_date_str, '%Y-%m-%d').date()
+                if end_date_str else None
+            )
+        except ValueError:
+            return Response(
+                {"error": "Invalid date format. Use YYYY-MM-DD"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            days_ahead = int(request.query_params.get('days_ahead', 30))
+        except ValueError:
+            days_ahead = 30
+        
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), 100)
+        except ValueError:
+            limit = 10
+        
+        start_date, end_date = resolve_window(start_date, end_date, days_ahead)
+        
+        if end_date < start_date:
+            return Response(
+                {"error": "end_date must be on or after start_date"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        doctors = User.objects.filter(
+            user_type='doctor',
+            specialization=specialization,
+            is_active=True
+        )
+        
+        slots = find_first_available_slots(doctors, start_date, end_date, limit=limit)
+        for slot in slots:
+            slot['doctor_specialization'] = specialization
+        
+        return Response({
+            "specialization": specialization,
+            "specialization_display": valid_specializations[specialization],
+            "start_date": start_date,
+            "end_date": end_date,
+            "total_slots": len(slots),
+            "slots": slots
         }, status=status.HTTP_200_OK)
 
 class AppointmentViewSet(ModelViewSet):
@@ -176,7 +320,7 @@ class AppointmentViewSet(ModelViewSet):
     
     def get_queryset(self):
         user = self.request.user
-        queryset = Appointment.objects.all()
+        queryset = Appointment.objects.select_related(*APPOINTMENT_LIST_RELATED)
         
         # Filter based on user type
         if user.user_type == 'patient':
@@ -233,6 +377,8 @@ class AppointmentViewSet(ModelViewSet):
             "contact_phone": "...",
             "patient_notes": "..."
         }
+        
+        Returns 409 if the slot is already booked.
         """
         patient_id = request.data.get('patient')
         doctor_id = request.data.get('doctor')
@@ -274,27 +420,9 @@ class AppointmentViewSet(ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Find or create the TimeSlot
-        time_slot, created = TimeSlot.objects.get_or_create(
-            doctor=doctor,
-            date=booking_date,
-            start_time=start_time,
-            end_time=end_time,
-            defaults={'is_available': True, 'duration_minutes': 30}
-        )
-        
-        # Check if slot is available
-        if not time_slot.is_available:
-            return Response(
-                {"error": "This time slot is already booked"},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        # Create appointment with the found/created time slot
         appointment_data = {
             'patient': patient_id,
             'doctor': doctor_id,
-            'time_slot': time_slot.id,
             'consultation_type': request.data.get('consultation_type', 'general'),
             'reason_for_visit': request.data.get('reason_for_visit', ''),
             'symptoms': request.data.get('symptoms', ''),
@@ -303,29 +431,27 @@ class AppointmentViewSet(ModelViewSet):
             'patient_notes': request.data.get('patient_notes', ''),
         }
         
-        serializer = AppointmentCreateSerializer(data=appointment_data)
-        if serializer.is_valid():
-            appointment = serializer.save(created_by=request.user)
-            
-            # Create history entry
-            AppointmentHistory.objects.create(
-                appointment=appointment,
-                changed_by=request.user,
-                change_type='created',
-                new_status=appointment.status,
+        # Claim the slot and create the appointment atomically
+        try:
+            appointment = book_virtual_slot(
+                doctor=doctor,
+                date=booking_date,
+                start_time=start_time,
+                end_time=end_time,
+                appointment_data=appointment_data,
+                booked_by=request.user,
                 notes=f"Appointment booked via virtual slot by {request.user.get_full_name()}"
             )
-            
-            # Mark time slot as unavailable
-            time_slot.is_available = False
-            time_slot.save()
-            
-            return Response({
-                "message": "Appointment booked successfully",
-                "appointment": AppointmentSerializer(appointment).data
-            }, status=status.HTTP_201_CREATED)
-        else:
-            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        except SlotUnavailable:
+            return Response(
+                {"error": "This time slot is already booked"},
+                status=status.HTTP_409_CONFLICT
+            )
+        
+        return Response({
+            "message": "Appointment booked successfully",
+            "appointment": AppointmentSerializer(appointment).data
+        }, status=status.HTTP_201_CREATED)
     
     def perform_update(self, serializer):
         old_status = serializer.instance.status
@@ -532,29 +658,12 @@ def appointment_statistics(request):
         queryset = Appointment.objects.all()
     
     today = timezone.now().date()
-    this_month_start = today.replace(day=1)
-    last_month = this_month_start - timedelta(days=1)
-    last_month_start = last_month.replace(day=1)
     
-    stats = {
-        'total_appointments': queryset.count(),
-        'scheduled_appointments': queryset.filter(status='scheduled').count(),
-        'completed_appointments': queryset.filter(status='completed').count(),
-        'cancelled_appointments': queryset.filter(status='cancelled').count(),
-        'today_appointments': queryset.filter(time_slot__date=today).count(),
-        'upcoming_appointments': queryset.filter(
-            time_slot__date__gte=today, 
-            status__in=['scheduled', 'confirmed']
-        ).count(),
-        'this_month_total': queryset.filter(
-            time_slot__date__gte=this_month_start,
-            time_slot__date__lte=today
-        ).count(),
-        'last_month_total': queryset.filter(
-            time_slot__date__gte=last_month_start,
-            time_slot__date__lt=this_month_start
-        ).count(),
-    }
+    # All counters in a single query
+    if user.user_type != 'patient' and settings.APPOINTMENT_STATS_USE_ROLLUP:
+        stats = rollup_statistics(today, doctor=user if user.user_type == 'doctor' else None)
+    else:
+        stats = aggregate_statistics(queryset, today)
     
     # Popular time slots (for doctors and admins)
     if user.user_type in ['doctor', 'admin']:
@@ -578,19 +687,19 @@ def upcoming_appointments(request):
     user = request.user
     
     if user.user_type == 'patient':
-        appointments = Appointment.objects.filter(
+        appointments = Appointment.objects.select_related(*APPOINTMENT_LIST_RELATED).filter(
             patient=user,
             time_slot__date__gte=timezone.now().date(),
             status__in=['scheduled', 'confirmed']
         ).order_by('time_slot__date', 'time_slot__start_time')[:5]
     elif user.user_type == 'doctor':
-        appointments = Appointment.objects.filter(
+        appointments = Appointment.objects.select_related(*APPOINTMENT_LIST_RELATED).filter(
             doctor=user,
             time_slot__date__gte=timezone.now().date(),
             status__in=['scheduled', 'confirmed']
         ).order_by('time_slot__date', 'time_slot__start_time')[:10]
     else:  # admin
-        appointments = Appointment.objects.filter(
+        appointments = Appointment.objects.select_related(*APPOINTMENT_LIST_RELATED).filter(
             time_slot__date__gte=timezone.now().date(),
             status__in=['scheduled', 'confirmed']
         ).order_by('time_slot__date', 'time_slot__start_time')[:10]
@@ -606,17 +715,17 @@ def today_appointments(request):
     today = timezone.now().date()
     
     if user.user_type == 'patient':
-        appointments = Appointment.objects.filter(
+        appointments = Appointment.objects.select_related(*APPOINTMENT_LIST_RELATED).filter(
             patient=user,
             time_slot__date=today
         ).order_by('time_slot__start_time')
     elif user.user_type == 'doctor':
-        appointments = Appointment.objects.filter(
+        appointments = Appointment.objects.select_related(*APPOINTMENT_LIST_RELATED).filter(
             doctor=user,
             time_slot__date=today
         ).order_by('time_slot__start_time')
     else:  # admin
-        appointments = Appointment.objects.filter(
+        appointments = Appointment.objects.select_related(*APPOINTMENT_LIST_RELATED).filter(
             time_slot__date=today
         ).order_by('time_slot__start_time')
     
@@ -638,4 +747,4 @@ class AppointmentHistoryListView(generics.ListAPIView):
            (user.user_type == 'doctor' and appointment.doctor != user):
             return AppointmentHistory.objects.none()
         
-        return AppointmentHistory.objects.filter(appointment=appointment)
\ No newline at end of file
+        return AppointmentHistory.objects.filter(appointment=appointment).select_related('changed_by')
\ No newline at end of file
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import HeartDiseasePrediction
+from .models import HeartDiseasePrediction, SegmentationResult, SegmentationJob
 
 
 @admin.register(HeartDiseasePrediction)
@@ -30,3 +30,20 @@ class HeartDiseasePredictionAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         })
     )
+
+
+@admin.register(SegmentationResult)
+class SegmentationResultAdmin(admin.ModelAdmin):
+    list_display = ['key', 'model_version', 'created_by', 'hit_count', 'processing_time', 'created_at', 'last_accessed_at']
+    list_filter = ['model_version', 'created_at']
+    search_fields = ['key']
+    readonly_fields = ['key', 'model_version', 'hit_count', 'processing_time', 'created_at', 'last_accessed_at']
+
+
+@admin.register(SegmentationJob)
+class SegmentationJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'created_by', 'status', 'progress', 'created_at', 'finished_at']
+    list_filter = ['status', 'created_at']
+    readonly_fields = [
+        'id', 'result', 'progress', 'error', 'created_at', 'started_at', 'heartbeat_at', 'finished_at'
+    ]
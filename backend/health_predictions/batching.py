@@ -0,0 +1,159 @@
+"""
+Dynamic micro-batching for model inference.
+
+Requests submit their input tensor and wait on a Future. A single worker thread
+collects pending inputs until either max_batch_size inputs are queued or the
+oldest one has waited max_wait seconds, runs the model once on the stacked
+batch and hands every caller its own slice of the output. Concurrent uploads
+therefore share one model call instead of queueing up behind each other.
+"""
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class _Request:
+    __slots__ = ('inputs', 'future', 'enqueued_at')
+
+    def __init__(self, inputs):
+        self.inputs = inputs
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class MicroBatcher:
+    """
+    Batch concurrent inference calls into single model calls.
+
+    Args:
+        predict_fn: Callable taking a stacked batch (N, ...) and returning an
+            array whose first dimension is N
+        max_batch_size: Largest number of inputs per model call
+        max_wait: Seconds the first input of a batch waits for more to arrive
+    """
+
+    def __init__(self, predict_fn, max_batch_size=8, max_wait=0.005):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+
+        self._queue = queue.Queue()
+        self._worker = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self._batch_sizes = Counter()
+        self._requests = 0
+        self._queue_wait_total = 0.0
+        self._queue_wait_max = 0.0
+        self._inference_total = 0.0
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._start_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._run,
+                    name='micro-batcher',
+                    daemon=True
+                )
+                self._worker.start()
+
+    def submit(self, inputs):
+        """
+        Queue one input for inference.
+
+        Args:
+            inputs: Array with a leading batch dimension, e.g. (1, 256, 768)
+
+        Returns:
+            Future resolving to the model output for these inputs
+        """
+        self._ensure_worker()
+        request = _Request(np.asarray(inputs))
+        self._queue.put(request)
+        return request.future
+
+    def predict(self, inputs, timeout=None):
+        """Blocking variant of submit()"""
+        return self.submit(inputs).result(timeout=timeout)
+
+    def _collect(self):
+        """Block for the first request, then gather more until full or timed out"""
+        batch = [self._queue.get()]
+        size = len(batch[0].inputs)
+        deadline = batch[0].enqueued_at + self.max_wait
+
+        while size < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                request = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(request)
+            size += len(request.inputs)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            # Callers that gave up (cancelled futures) are skipped
+            batch = [request for request in batch if request.future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            try:
+                outputs = self.predict_fn(np.concatenate([request.inputs for request in batch], axis=0))
+            except Exception as e:
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+            finished = time.perf_counter()
+
+            offset = 0
+            for request in batch:
+                count = len(request.inputs)
+                request.future.set_result(outputs[offset:offset + count])
+                offset += count
+
+            waits = [started - request.enqueued_at for request in batch]
+            with self._stats_lock:
+                self._batch_sizes[offset] += 1
+                self._requests += len(batch)
+                self._queue_wait_total += sum(waits)
+                self._queue_wait_max = max(self._queue_wait_max, max(waits))
+                self._inference_total += finished - started
+
+    def stats(self, reset=False):
+        """
+        Batching metrics since startup (or the last reset).
+
+        Returns:
+            Dictionary with request and batch counts, the batch-size
+            histogram and queue-latency / inference-time figures in ms
+        """
+        with self._stats_lock:
+            batches = sum(self._batch_sizes.values())
+            stats = {
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': round(self.max_wait * 1000, 3),
+                'queued': self._queue.qsize(),
+                'requests': self._requests,
+                'batches': batches,
+                'avg_batch_size': round(self._requests / batches, 2) if batches else 0,
+                'batch_size_histogram': dict(sorted(self._batch_sizes.items())),
+                'avg_queue_wait_ms': round(self._queue_wait_total / self._requests * 1000, 3) if self._requests else 0,
+                'max_queue_wait_ms': round(self._queue_wait_max * 1000, 3),
+                'avg_inference_ms': round(self._inference_total / batches * 1000, 3) if batches else 0,
+            }
+            if reset:
+                self._reset_stats()
+        return stats
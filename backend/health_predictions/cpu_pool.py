@@ -0,0 +1,76 @@
+"""
+Worker pool for the CPU-bound segmentation stages.
+
+Decoding and resizing the upload, postprocessing the prediction and PNG
+encoding run in this pool instead of the request thread. Within one request
+the original image is encoded while the model runs; across requests, the
+preprocessing of one upload overlaps the inference of another.
+
+SEGMENTATION_CPU_POOL selects the pool:
+    thread  - a thread pool; PIL and zlib release the GIL for resizing and
+              PNG compression (default)
+    process - a process pool, for stages that hold the GIL; arrays are
+              pickled to and from the workers
+    none    - run inline in the calling thread
+SEGMENTATION_CPU_WORKERS sets the number of workers (default: CPU count).
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _create_pool(kind, workers):
+    if kind == 'process':
+        # Spawned workers only import the pure NumPy/PIL stage functions;
+        # forking would copy the web process's threads and model state
+        return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+    if kind == 'thread':
+        return ThreadPoolExecutor(max_workers=workers, thread_name_prefix='segmentation-cpu')
+    return None
+
+
+def get_pool():
+    """The shared executor, or None when stages run inline"""
+    global _pool
+    if _pool is None and settings.SEGMENTATION_CPU_POOL != 'none':
+        with _pool_lock:
+            if _pool is None:
+                _pool = _create_pool(
+                    settings.SEGMENTATION_CPU_POOL,
+                    settings.SEGMENTATION_CPU_WORKERS or os.cpu_count()
+                )
+    return _pool
+
+
+def submit(fn, *args):
+    """Run fn(*args) in the pool; returns a Future"""
+    pool = get_pool()
+    if pool is not None:
+        return pool.submit(fn, *args)
+
+    future = Future()
+    try:
+        future.set_result(fn(*args))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def run(fn, *args):
+    """Run fn(*args) in the pool and wait for the result"""
+    return submit(fn, *args).result()
+
+
+def shutdown_pool():
+    """Stop the pool; the next call creates one from the current settings"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True)
+            _pool = None
@@ -0,0 +1,400 @@
+"""
+Helpers for heart disease prediction.
+
+Features are passed to the model as a NumPy matrix in FEATURE_NAMES order;
+class and confidence both come from a single predict_proba call.
+
+The model is served through HeartPredictor, which answers repeated feature
+vectors from an LRU cache and, when the estimator is supported, evaluates it
+with a NumPy-only "compiled" copy of its parameters (see compile_model)
+instead of going through scikit-learn's estimator dispatch.
+"""
+import itertools
+import logging
+import threading
+import warnings
+from collections import OrderedDict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+# Feature names, in the order the model was trained with
+FEATURE_NAMES = [
+    'age', 'sex', 'cp', 'trestbps', 'chol', 'fbs', 'restecg',
+    'thalach', 'exang', 'oldpeak', 'slope', 'ca', 'thal'
+]
+
+# Values per feature spanning the accepted input ranges, used to check a
+# compiled model against scikit-learn (feature_grid). Continuous features are
+# given by their extremes; samples draw them from the whole range.
+GRID_LEVELS = {
+    'age': (20, 80),
+    'sex': (0, 1),
+    'cp': (0, 1, 2, 3),
+    'trestbps': (90, 200),
+    'chol': (120, 560),
+    'fbs': (0, 1),
+    'restecg': (0, 1, 2),
+    'thalach': (70, 210),
+    'exang': (0, 1),
+    'oldpeak': (0.0, 6.2),
+    'slope': (0, 1, 2),
+    'ca': (0, 1, 2, 3),
+    'thal': (1, 3, 6, 7),
+}
+CONTINUOUS_FEATURES = ('age', 'trestbps', 'chol', 'thalach', 'oldpeak')
+
+# Largest probability difference tolerated between a compiled model and
+# scikit-learn
+PARITY_TOLERANCE = 1e-9
+
+
+def features_to_matrix(rows):
+    """
+    Stack validated feature dictionaries into a (n_rows, 13) float64 matrix.
+
+    Args:
+        rows: Iterable of dictionaries containing every name in FEATURE_NAMES
+    """
+    return np.array(
+        [[row[name] for name in FEATURE_NAMES] for row in rows],
+        dtype=np.float64
+    ).reshape(-1, len(FEATURE_NAMES))
+
+
+def predict_heart_disease(model, features):
+    """
+    Run the model over a feature matrix.
+
+    Args:
+        model: Trained scikit-learn classifier
+        features: Matrix of shape (n_rows, 13)
+
+    Returns:
+        Tuple (predictions, confidences) as NumPy arrays; confidence is the
+        probability of the predicted class.
+    """
+    # The model was fitted on a DataFrame; silence the feature-name warning
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+
+        if not hasattr(model, 'predict_proba'):
+            predictions = np.asarray(model.predict(features)).astype(int)
+            return predictions, (predictions == 1).astype(np.float64)
+
+        proba = model.predict_proba(features)
+
+    best = np.argmax(proba, axis=1)
+    predictions = np.asarray(model.classes_)[best].astype(int)
+    confidences = proba[np.arange(len(best)), best]
+    return predictions, confidences
+
+
+def feature_grid(sample=None, seed=0):
+    """
+    Feature matrix of every combination of GRID_LEVELS, or a random sample.
+
+    Args:
+        sample: If given, draw this many rows instead: categorical features
+            from their levels, continuous ones anywhere in their range
+            (integers, and oldpeak to one decimal)
+        seed: Random seed for the sample
+
+    Returns:
+        Matrix of shape (n_rows, 13)
+    """
+    if sample is None:
+        return np.array(list(itertools.product(*(GRID_LEVELS[name] for name in FEATURE_NAMES))), dtype=np.float64)
+
+    rng = np.random.default_rng(seed)
+    columns = []
+    for name in FEATURE_NAMES:
+        levels = GRID_LEVELS[name]
+        if name not in CONTINUOUS_FEATURES:
+            columns.append(rng.choice(levels, size=sample))
+        elif name == 'oldpeak':
+            columns.append(np.round(rng.uniform(min(levels), max(levels), size=sample), 1))
+        else:
+            columns.append(rng.integers(min(levels), max(levels), size=sample, endpoint=True))
+    return np.column_stack(columns).astype(np.float64)
+
+
+def _unwrap_estimator(model):
+    """Fitted estimator behind a search object (GridSearchCV.best_estimator_)"""
+    while hasattr(model, 'best_estimator_'):
+        model = model.best_estimator_
+    return model
+
+
+class _Scaler:
+    """x * scale + offset, the fitted form of StandardScaler and MinMaxScaler"""
+
+    def __init__(self, scale, offset):
+        self.scale = scale
+        self.offset = offset
+
+    def __call__(self, features):
+        return features * self.scale + self.offset
+
+
+class CompiledLogisticRegression:
+    """Binary logistic regression evaluated from its coefficients"""
+    kind = 'logistic_regression'
+
+    def __init__(self, estimator):
+        self.classes_ = np.asarray(estimator.classes_)
+        self.coef = np.asarray(estimator.coef_, dtype=np.float64).ravel()
+        self.intercept = float(np.ravel(estimator.intercept_)[0])
+
+    def predict_proba(self, features):
+        decision = features @ self.coef + self.intercept
+        positive = 1.0 / (1.0 + np.exp(-decision))
+        return np.column_stack([1.0 - positive, positive])
+
+
+class CompiledTrees:
+    """
+    Decision tree or forest evaluated from its node arrays; the forest's
+    probability is the mean of its trees', as in scikit-learn.
+    """
+    kind = 'trees'
+
+    def __init__(self, estimator):
+        self.classes_ = np.asarray(estimator.classes_)
+        trees = estimator.estimators_ if hasattr(estimator, 'estimators_') else [estimator]
+        self.trees = []
+        for tree in trees:
+            nodes = tree.tree_
+            value = nodes.value[:, 0, :].astype(np.float64)
+            totals = value.sum(axis=1, keepdims=True)
+            self.trees.append((
+                nodes.children_left.copy(),
+                nodes.children_right.copy(),
+                nodes.feature.copy(),
+                nodes.threshold.copy(),
+                value / np.where(totals == 0, 1.0, totals),
+            ))
+
+    def predict_proba(self, features):
+        # scikit-learn compares float32 features with the float64 thresholds
+        features = features.astype(np.float32).astype(np.float64)
+        rows = np.arange(len(features))
+        proba = np.zeros((len(features), len(self.classes_)))
+        for left, right, feature, threshold, value in self.trees:
+            node = np.zeros(len(features), dtype=np.intp)
+            inner = left[node] != -1
+            while inner.any():
+                current = node[inner]
+                goes_left = features[rows[inner], feature[current]] <= threshold[current]
+                node[inner] = np.where(goes_left, left[current], right[current])
+                inner = left[node] != -1
+            proba += value[node]
+        return proba / len(self.trees)
+
+
+class CompiledModel:
+    """Scaling steps followed by a compiled classifier"""
+
+    def __init__(self, scalers, classifier):
+        self.scalers = scalers
+        self.classifier = classifier
+        self.classes_ = classifier.classes_
+        self.kind = classifier.kind
+
+    def predict_proba(self, features):
+        for scaler in self.scalers:
+            features = scaler(features)
+        return self.classifier.predict_proba(features)
+
+
+def compile_model(model):
+    """
+    Extract a fitted classifier's parameters into a NumPy-only evaluator.
+
+    Supported: binary LogisticRegression and decision trees / random forests,
+    optionally inside a search object and after StandardScaler or MinMaxScaler
+    steps of a Pipeline.
+
+    Returns:
+        An object with classes_ and predict_proba(features), or None if the
+        model is not supported
+    """
+    from sklearn.ensemble import ExtraTreesClassifier, RandomForestClassifier
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import MinMaxScaler, StandardScaler
+    from sklearn.tree import DecisionTreeClassifier, ExtraTreeClassifier
+
+    estimator = _unwrap_estimator(model)
+    scalers = []
+    if isinstance(estimator, Pipeline):
+        *steps, estimator = [step for _, step in estimator.steps if step not in (None, 'passthrough')]
+        for step in steps:
+            if isinstance(step, StandardScaler):
+                scale = 1.0 / step.scale_ if step.scale_ is not None else 1.0
+                mean = step.mean_ if step.mean_ is not None else 0.0
+                scalers.append(_Scaler(scale, -mean * scale))
+            elif isinstance(step, MinMaxScaler) and not step.clip:
+                scalers.append(_Scaler(step.scale_, step.min_))
+            else:
+                return None
+        estimator = _unwrap_estimator(estimator)
+
+    if isinstance(estimator, LogisticRegression) and len(estimator.classes_) == 2:
+        classifier = CompiledLogisticRegression(estimator)
+    elif isinstance(estimator, (DecisionTreeClassifier, ExtraTreeClassifier)) and estimator.n_outputs_ == 1:
+        classifier = CompiledTrees(estimator)
+    elif isinstance(estimator, (RandomForestClassifier, ExtraTreesClassifier)) and estimator.n_outputs_ == 1:
+        classifier = CompiledTrees(estimator)
+    else:
+        return None
+    return CompiledModel(scalers, classifier)
+
+
+def check_parity(model, compiled, features):
+    """
+    Compare a compiled model with scikit-learn on a feature matrix.
+
+    Returns:
+        Tuple (max_abs_difference, class_mismatches)
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        expected = model.predict_proba(features)
+    actual = compiled.predict_proba(features)
+    mismatches = int((np.argmax(expected, axis=1) != np.argmax(actual, axis=1)).sum())
+    return float(np.abs(expected - actual).max()), mismatches
+
+
+class PredictionCache:
+    """Thread-safe LRU cache of (prediction, confidence) by feature tuple"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, keys):
+        """Cached values for keys (None where missing), counting hits and misses"""
+        values = []
+        with self._lock:
+            for key in keys:
+                value = self._entries.get(key)
+                if value is None:
+                    self.misses += 1
+                else:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                values.append(value)
+        return values
+
+    def set_many(self, items):
+        with self._lock:
+            for key, value in items:
+                self._entries[key] = value
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+            }
+
+
+class HeartPredictor:
+    """
+    Serving wrapper around the trained heart disease model.
+
+    Args:
+        model: Trained scikit-learn classifier
+        compiled: Evaluate the model with compile_model when it is supported
+            and matches scikit-learn on a sample of feature_grid
+        cache_size: Maximum number of cached feature vectors (0 disables the
+            cache)
+    """
+
+    def __init__(self, model, compiled=True, cache_size=10000):
+        self.model = model
+        self.compiled = None
+        if compiled:
+            self.compiled = self._compile(model)
+        self.cache = PredictionCache(cache_size) if cache_size > 0 else None
+
+    @staticmethod
+    def _compile(model):
+        compiled = compile_model(model)
+        if compiled is None:
+            logger.info("No compiled evaluator for %s, using scikit-learn", type(_unwrap_estimator(model)).__name__)
+            return None
+
+        max_difference, mismatches = check_parity(model, compiled, feature_grid(sample=2000))
+        if max_difference > PARITY_TOLERANCE or mismatches:
+            logger.warning(
+                "Compiled heart model differs from scikit-learn (max difference %.3g, %d class mismatches), "
+                "using scikit-learn", max_difference, mismatches
+            )
+            return None
+        return compiled
+
+    def _predict_uncached(self, features):
+        if self.compiled is None:
+            return predict_heart_disease(self.model, features)
+
+        proba = self.compiled.predict_proba(features)
+        best = np.argmax(proba, axis=1)
+        predictions = self.compiled.classes_[best].astype(int)
+        return predictions, proba[np.arange(len(best)), best]
+
+    def predict(self, features):
+        """
+        Predict a feature matrix, answering known feature vectors from the cache.
+
+        Args:
+            features: Matrix of shape (n_rows, 13)
+
+        Returns:
+            Tuple (predictions, confidences), as predict_heart_disease
+        """
+        if self.cache is None:
+            return self._predict_uncached(features)
+
+        keys = [tuple(row) for row in features.tolist()]
+        # Identical rows within a call are looked up (and predicted) once
+        first_rows = {}
+        for index, key in enumerate(keys):
+            first_rows.setdefault(key, index)
+        unique_keys = list(first_rows)
+
+        results = dict(zip(unique_keys, self.cache.get_many(unique_keys)))
+        missing = [key for key in unique_keys if results[key] is None]
+        if missing:
+            predictions, confidences = self._predict_uncached(features[[first_rows[key] for key in missing]])
+            computed = list(zip(missing, zip(predictions.tolist(), confidences.tolist())))
+            self.cache.set_many(computed)
+            results.update(computed)
+
+        predictions, confidences = zip(*(results[key] for key in keys))
+        return np.array(predictions, dtype=int), np.array(confidences, dtype=np.float64)
+
+    def stats(self):
+        return {
+            'evaluator': f"compiled_{self.compiled.kind}" if self.compiled is not None else 'sklearn',
+            'cache': self.cache.stats() if self.cache is not None else None,
+        }
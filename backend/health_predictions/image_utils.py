@@ -7,73 +7,91 @@ from io import BytesIO
 from PIL import Image
 import base64
 
+from .metrics import NULL_TIMER
+
 
 def simple_patchify(image, patch_size, num_channels=3):
     """
     Patchify implementation that mimics the patchify library behavior.
     Extracts non-overlapping patches from image and returns them in the correct order.
     
+    The patches are produced by a reshape/transpose of the image, which only
+    creates views; the single copy happens when the result is made contiguous
+    (and converted to float32 at the same time).
+    
     Args:
-        image: Input image of shape (H, W, C) normalized to 0-1
+        image: Input image of shape (H, W, C) normalized to 0-1, or a batch of
+            images of shape (N, H, W, C)
         patch_size: Size of each patch (e.g., 16)
         num_channels: Number of channels (default 3 for RGB)
         
     Returns:
-        patches: Array of shape (num_patches, patch_size * patch_size * num_channels)
+        patches: Array of shape (num_patches, patch_size * patch_size * num_channels),
+            or (N, num_patches, patch_size * patch_size * num_channels) for a batch
     """
-    h, w, c = image.shape
+    image = np.asarray(image)
+    batched = image.ndim == 4
+    if not batched:
+        image = image[np.newaxis]
+    
+    n, h, w, c = image.shape
     num_patches_h = h // patch_size
     num_patches_w = w // patch_size
-    num_patches = num_patches_h * num_patches_w
     
-    # Extract patches in row-major order (same as patchify library)
-    patches = []
-    for i in range(num_patches_h):
-        for j in range(num_patches_w):
-            patch = image[i*patch_size:(i+1)*patch_size, j*patch_size:(j+1)*patch_size, :]
-            # Flatten the patch to (patch_size * patch_size * num_channels)
-            flat_patch = patch.reshape(-1)
-            patches.append(flat_patch)
+    # Drop the remainder rows/columns that do not fill a whole patch
+    image = image[:, :num_patches_h * patch_size, :num_patches_w * patch_size, :]
     
-    return np.array(patches, dtype=np.float32)
+    # (N, rows, patch, cols, patch, C) -> (N, rows, cols, patch, patch, C),
+    # i.e. patches in row-major order (same as patchify library)
+    patches = image.reshape(n, num_patches_h, patch_size, num_patches_w, patch_size, c)
+    patches = patches.transpose(0, 1, 3, 2, 4, 5)
+    patches = np.ascontiguousarray(patches, dtype=np.float32).reshape(
+        n, num_patches_h * num_patches_w, patch_size * patch_size * c
+    )
+    
+    return patches if batched else patches[0]
 
 
-def process_image_for_model(image_file, config):
+def process_image_for_model(image_file, config, timer=NULL_TIMER):
     """
     Process an uploaded image file for the UNETR model.
     
     Args:
         image_file: Django UploadedFile object
         config: Configuration dictionary with model parameters
+        timer: StageTimer receiving the decode, resize and patchify durations
         
     Returns:
         tuple: (processed_image, original_image_array) as numpy arrays
     """
     try:
         # Read image from uploaded file
-        image_data = image_file.read()
-        image = Image.open(BytesIO(image_data)).convert('RGB')
-        
-        # Resize to model's expected size (256x256)
-        image = image.resize((config["image_size"], config["image_size"]), Image.Resampling.LANCZOS)
+        with timer.stage('decode'):
+            image_data = image_file.read()
+            image = Image.open(BytesIO(image_data)).convert('RGB')
         
-        # Keep original as uint8 for display
-        original_image_array = np.array(image, dtype=np.uint8)
+        with timer.stage('resize'):
+            # Resize to model's expected size (256x256)
+            image = image.resize((config["image_size"], config["image_size"]), Image.Resampling.LANCZOS)
+            
+            # Keep original as uint8 for display
+            original_image_array = np.array(image, dtype=np.uint8)
         
-        # Normalize to 0-1 range for model input
-        image_normalized = original_image_array.astype(np.float32) / 255.0
-        
-        # Extract patches using the corrected patchify function
-        # This mimics: patches = patchify(image, (16, 16, 3), 16)
-        # Then: patches = np.reshape(patches, (256, 768))
-        patch_size = config["patch_size"]  # 16
-        num_channels = config["num_channels"]  # 3
-        
-        # Get flattened patches: shape (256, 768) for 256x256 image with 16x16 patches
-        flat_patches = simple_patchify(image_normalized, patch_size, num_channels)
-        
-        # Add batch dimension: (1, 256, 768)
-        batch_patches = np.expand_dims(flat_patches, axis=0)
+        with timer.stage('patchify'):
+            # Normalize to 0-1 range for model input
+            image_normalized = original_image_array.astype(np.float32) / 255.0
+            
+            # Extract patches using the corrected patchify function
+            # This mimics: patches = patchify(image, (16, 16, 3), 16)
+            # Then: patches = np.reshape(patches, (256, 768))
+            patch_size = config["patch_size"]  # 16
+            num_channels = config["num_channels"]  # 3
+            
+            # Get flattened patches: shape (256, 768) for 256x256 image with 16x16 patches
+            flat_patches = simple_patchify(image_normalized, patch_size, num_channels)
+            
+            # Add batch dimension: (1, 256, 768)
+            batch_patches = np.expand_dims(flat_patches, axis=0)
         
         return batch_patches, original_image_array
         
@@ -81,6 +99,16 @@ def process_image_for_model(image_file, config):
         raise ValueError(f"Error processing image: {str(e)}")
 
 
+def preprocess_image_bytes(image_bytes, config, timer=NULL_TIMER):
+    """
+    process_image_for_model for raw upload bytes (picklable, for worker pools).
+    
+    Returns:
+        tuple: (processed_image, original_image_array) as numpy arrays
+    """
+    return process_image_for_model(BytesIO(image_bytes), config, timer)
+
+
 def postprocess_segmentation(prediction, config):
     """
     Convert model prediction to segmentation mask image.
@@ -126,6 +154,18 @@ def postprocess_segmentation(prediction, config):
         raise ValueError(f"Error postprocessing segmentation: {str(e)}")
 
 
+def postprocess_and_encode(prediction, config, timer=NULL_TIMER):
+    """
+    Postprocess a model prediction and PNG-encode the resulting mask.
+    
+    Returns:
+        tuple: (segmentation_mask, mask_png_bytes)
+    """
+    with timer.stage('postprocess'):
+        segmentation_mask = postprocess_segmentation(prediction, config)
+    return segmentation_mask, image_to_png_bytes(segmentation_mask, timer)
+
+
 def create_comparison_image(original_image, mask, config):
     """
     Create a side-by-side comparison image for visualization.
@@ -165,6 +205,41 @@ def create_comparison_image(original_image, mask, config):
         raise ValueError(f"Error creating comparison image: {str(e)}")
 
 
+def image_to_png_bytes(image_array, timer=NULL_TIMER):
+    """
+    Encode a numpy array image as PNG.
+    
+    Args:
+        image_array: Numpy array representing image (uint8 or float32)
+        timer: StageTimer receiving the encode duration
+        
+    Returns:
+        PNG file content as bytes
+    """
+    with timer.stage('encode'):
+        try:
+            # Ensure uint8
+            if image_array.dtype != np.uint8:
+                if np.max(image_array) <= 1.0:
+                    image_array = (np.clip(image_array, 0, 1) * 255).astype(np.uint8)
+                else:
+                    image_array = np.clip(image_array, 0, 255).astype(np.uint8)
+            
+            # Convert to PIL Image
+            if len(image_array.shape) == 2:  # Grayscale
+                pil_image = Image.fromarray(image_array, mode='L')
+            else:  # RGB
+                pil_image = Image.fromarray(image_array, mode='RGB')
+            
+            # Save to bytes buffer
+            buffer = BytesIO()
+            pil_image.save(buffer, format='PNG')
+            return buffer.getvalue()
+            
+        except Exception as e:
+            raise ValueError(f"Error encoding image as PNG: {str(e)}")
+
+
 def image_to_base64(image_array):
     """
     Convert numpy array image to base64 string for API response.
@@ -176,29 +251,13 @@ def image_to_base64(image_array):
         Image as base64 encoded string
     """
     try:
-        # Ensure uint8
-        if image_array.dtype != np.uint8:
-            if np.max(image_array) <= 1.0:
-                image_array = (np.clip(image_array, 0, 1) * 255).astype(np.uint8)
-            else:
-                image_array = np.clip(image_array, 0, 255).astype(np.uint8)
-        
-        # Convert to PIL Image
-        if len(image_array.shape) == 2:  # Grayscale
-            pil_image = Image.fromarray(image_array, mode='L')
-        else:  # RGB
-            pil_image = Image.fromarray(image_array, mode='RGB')
-        
-        # Save to bytes buffer
-        buffer = BytesIO()
-        pil_image.save(buffer, format='PNG')
-        buffer.seek(0)
-        
-        # Encode to base64
-        image_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
-        
-        return image_base64
-        
+        return base64.b64encode(image_to_png_bytes(image_array)).decode('utf-8')
     except Exception as e:
         raise ValueError(f"Error converting image to base64: {str(e)}")
 
+
+def render_comparison_png(original_image, mask, config, timer=NULL_TIMER):
+    """Side-by-side comparison image encoded as PNG bytes"""
+    with timer.stage('compose'):
+        comparison = create_comparison_image(original_image, mask, config)
+    return image_to_png_bytes(comparison, timer)
@@ -0,0 +1,155 @@
+"""
+Inference backends for the brain tumor segmentation model.
+
+The Keras model can be exported (see the export_brain_tumor_model command) to
+ONNX or TFLite, which have far less per-call overhead than Keras predict()
+for the small CPU batches we serve. Every backend exposes the same
+predict(batch) -> array interface.
+
+BRAIN_TUMOR_BACKENDS lists the backends in order of preference; the first one
+whose runtime is installed and whose model file exists is used. The default
+order (onnx, tflite, keras) is fastest first on CPU; run
+check_brain_tumor_backends to measure it on the serving hardware.
+"""
+import importlib.util
+import logging
+import os
+import threading
+
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Model files per backend, relative to BASE_DIR
+BACKEND_MODEL_PATHS = {
+    'onnx': os.path.join('models', 'model.onnx'),
+    'tflite': os.path.join('models', 'model.tflite'),
+    'keras': os.path.join('models', 'model.keras'),
+}
+
+
+def model_path(backend_name):
+    return os.path.join(settings.BASE_DIR, BACKEND_MODEL_PATHS[backend_name])
+
+
+def runtime_available(backend_name):
+    """Whether the runtime for a backend is installed (without importing it)"""
+    if backend_name == 'onnx':
+        return importlib.util.find_spec('onnxruntime') is not None
+    if backend_name == 'tflite':
+        return (
+            importlib.util.find_spec('tflite_runtime') is not None
+            or importlib.util.find_spec('tensorflow') is not None
+        )
+    return importlib.util.find_spec('tensorflow') is not None
+
+
+def available_backends():
+    """Backends from BRAIN_TUMOR_BACKENDS that can be used here, in preference order"""
+    return [
+        name for name in settings.BRAIN_TUMOR_BACKENDS
+        if name in BACKEND_MODEL_PATHS and runtime_available(name) and os.path.exists(model_path(name))
+    ]
+
+
+def select_backend():
+    """Name of the backend to serve with, or None if none is usable"""
+    backends = available_backends()
+    return backends[0] if backends else None
+
+
+def load_keras_model(path=None):
+    """Load the Keras UNETR model"""
+    import tensorflow as tf
+
+    path = path or model_path('keras')
+    try:
+        # The model may have been trained with dice loss/coef custom objects
+        return tf.keras.models.load_model(
+            path,
+            custom_objects={
+                'dice_loss': lambda y_true, y_pred: y_true,  # Placeholder
+                'dice_coef': lambda y_true, y_pred: y_true,  # Placeholder
+            }
+        )
+    except Exception as e:
+        logger.info("Loading with custom objects failed (%s), trying standard load", e)
+        return tf.keras.models.load_model(path)
+
+
+class KerasBackend:
+    name = 'keras'
+
+    def __init__(self, path=None):
+        self.model = load_keras_model(path)
+
+    def predict(self, batch):
+        return self.model.predict(batch, verbose=0)
+
+
+class TFLiteBackend:
+    name = 'tflite'
+
+    def __init__(self, path=None, num_threads=None):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+
+        self.interpreter = Interpreter(
+            model_path=path or model_path('tflite'),
+            num_threads=num_threads or os.cpu_count()
+        )
+        self.interpreter.allocate_tensors()
+        self.input_index = self.interpreter.get_input_details()[0]['index']
+        self.output_index = self.interpreter.get_output_details()[0]['index']
+        self.input_shape = tuple(self.interpreter.get_input_details()[0]['shape'])
+        # An interpreter must not be invoked from several threads at once
+        self.lock = threading.Lock()
+
+    def predict(self, batch):
+        batch = np.ascontiguousarray(batch, dtype=np.float32)
+        with self.lock:
+            if batch.shape != self.input_shape:
+                self.interpreter.resize_tensor_input(self.input_index, batch.shape)
+                self.interpreter.allocate_tensors()
+                self.input_shape = batch.shape
+            self.interpreter.set_tensor(self.input_index, batch)
+            self.interpreter.invoke()
+            return self.interpreter.get_tensor(self.output_index).copy()
+
+
+class ONNXBackend:
+    name = 'onnx'
+
+    def __init__(self, path=None, num_threads=None):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(
+            path or model_path('onnx'),
+            sess_options=options,
+            providers=['CPUExecutionProvider']
+        )
+        self.input_name = self.session.get_inputs()[0].name
+
+    def predict(self, batch):
+        return self.session.run(None, {self.input_name: np.asarray(batch, dtype=np.float32)})[0]
+
+
+BACKENDS = {
+    'keras': KerasBackend,
+    'tflite': TFLiteBackend,
+    'onnx': ONNXBackend,
+}
+
+
+def load_backend(name, path=None):
+    """Instantiate a backend by name"""
+    if name == 'keras':
+        return KerasBackend(path)
+    return BACKENDS[name](path, num_threads=settings.BRAIN_TUMOR_INFERENCE_THREADS or None)
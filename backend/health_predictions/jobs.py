@@ -0,0 +1,188 @@
+"""
+Asynchronous segmentation jobs.
+
+Jobs are rows in the SegmentationJob table, so no external broker is needed.
+By default each web process runs them on a local thread pool of
+SEGMENTATION_JOB_WORKERS threads, fed when the creating transaction commits.
+With SEGMENTATION_JOBS_IN_PROCESS disabled, jobs are left queued for the
+process_segmentation_jobs management command instead; that command also picks
+up jobs orphaned by a restarted web process.
+
+A job is claimed with a conditional UPDATE (queued -> running), so several
+workers never run the same job. Cancellation flips the status to cancelled;
+a running job notices at its next progress update and stops.
+
+Every progress update also stamps heartbeat_at. A running job whose heartbeat
+is older than SEGMENTATION_JOB_STALE_AFTER seconds lost its worker (process
+killed or restarted) and is failed by fail_stale_jobs(), which runs before
+new jobs are enqueued and before the command processes the queue. Stale jobs
+are not requeued: a job that crashes its worker would crash the next one.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .middleware import request_id_context
+from .models import SegmentationJob
+from .segmentation import segment_image
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class JobCancelled(Exception):
+    """Raised inside a running job once it has been cancelled"""
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.SEGMENTATION_JOB_WORKERS,
+                    thread_name_prefix='segmentation-job'
+                )
+    return _executor
+
+
+def enqueue_job(job):
+    """Schedule a newly created job on the local worker pool (if enabled)"""
+    if settings.SEGMENTATION_JOBS_IN_PROCESS:
+        transaction.on_commit(lambda: _submit(job.pk))
+
+
+def _submit(job_id):
+    fail_stale_jobs()
+    _get_executor().submit(run_job, job_id)
+
+
+def claim_job(job_id):
+    """
+    Atomically move a job from queued to running.
+
+    Returns:
+        True if this call claimed the job
+    """
+    now = timezone.now()
+    return SegmentationJob.objects.filter(pk=job_id, status='queued').update(
+        status='running',
+        started_at=now,
+        heartbeat_at=now
+    ) == 1
+
+
+def run_job(job_id):
+    """
+    Claim and run one job.
+
+    Returns:
+        False if the job was no longer queued, True once it has been run
+    """
+    try:
+        if not claim_job(job_id):
+            return False
+        job = SegmentationJob.objects.select_related('created_by').get(pk=job_id)
+        running = SegmentationJob.objects.filter(pk=job_id, status='running')
+
+        def progress(percent):
+            if not running.update(progress=percent, heartbeat_at=timezone.now()):
+                raise JobCancelled()
+
+        try:
+            with job.image.open('rb') as image_file:
+                image_bytes = image_file.read()
+            progress(10)
+
+            # Correlate the job's logs and stage timings with its id
+            with request_id_context(f"job-{job_id}"):
+                result, _, _, _ = segment_image(image_bytes, job.created_by, progress)
+            running.update(status='completed', result=result, progress=100, finished_at=timezone.now())
+        except JobCancelled:
+            logger.info("Segmentation job %s cancelled while running", job_id)
+        except Exception as e:
+            logger.exception("Segmentation job %s failed", job_id)
+            running.update(status='failed', error=str(e), finished_at=timezone.now())
+        finally:
+            _discard_image(job)
+        return True
+    finally:
+        # Worker threads must not keep their database connection open
+        connection.close()
+
+
+def cancel_job(job):
+    """
+    Cancel a queued or running job.
+
+    Returns:
+        True if the job was cancelled, False if it had already finished
+    """
+    jobs = SegmentationJob.objects.filter(pk=job.pk)
+    now = timezone.now()
+    if jobs.filter(status='queued').update(status='cancelled', finished_at=now):
+        # No worker will pick it up any more
+        _discard_image(job)
+        return True
+    # Claimed in the meantime or earlier: the worker stops and cleans up itself
+    return jobs.filter(status='running').update(status='cancelled', finished_at=now) == 1
+
+
+def fail_stale_jobs():
+    """
+    Fail the running jobs whose worker stopped sending progress updates.
+
+    Returns:
+        Number of jobs failed
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.SEGMENTATION_JOB_STALE_AFTER)
+    # Jobs claimed before heartbeats were recorded only have started_at
+    stale = SegmentationJob.objects.filter(
+        Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff),
+        status='running'
+    )
+    failed = 0
+    for job in stale.only('pk', 'image'):
+        # Conditional again: the worker may have resumed since the SELECT
+        if stale.filter(pk=job.pk).update(
+            status='failed',
+            error="The worker running the job stopped",
+            finished_at=timezone.now()
+        ):
+            logger.warning(
+                "Segmentation job %s failed: no progress for %s seconds",
+                job.pk, settings.SEGMENTATION_JOB_STALE_AFTER
+            )
+            _discard_image(job)
+            failed += 1
+    return failed
+
+
+def process_queued_jobs(limit=None):
+    """
+    Run queued jobs in the calling thread, oldest first (after failing the
+    stale running ones).
+
+    Returns:
+        Number of jobs processed
+    """
+    fail_stale_jobs()
+    job_ids = SegmentationJob.objects.filter(status='queued').order_by('created_at').values_list('pk', flat=True)
+    if limit:
+        job_ids = job_ids[:limit]
+
+    return sum(run_job(job_id) for job_id in list(job_ids))
+
+
+def _discard_image(job):
+    if job.image:
+        job.image.delete(save=False)
+        SegmentationJob.objects.filter(pk=job.pk).update(image='')
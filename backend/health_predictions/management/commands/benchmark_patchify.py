@@ -0,0 +1,108 @@
+"""
+Check and benchmark image_utils.simple_patchify.
+
+The vectorized simple_patchify is compared bit-for-bit with the original
+per-patch loop implementation on random images (float32 and float64, single and
+batched, sizes that do not divide evenly) and, when present, on the sample MRIs
+in media/brain_tumor_originals. The command fails on any mismatch, then reports
+the time per call of both implementations.
+
+Usage:
+    python manage.py benchmark_patchify
+    python manage.py benchmark_patchify --image-size 256 --patch-size 16 --batch 8 --repeat 200
+"""
+import os
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from health_predictions.image_utils import simple_patchify, process_image_for_model
+from health_predictions.segmentation import BRAIN_TUMOR_CONFIG
+
+
+def reference_patchify(image, patch_size, num_channels=3):
+    """The original per-patch loop implementation of simple_patchify"""
+    h, w, c = image.shape
+    num_patches_h = h // patch_size
+    num_patches_w = w // patch_size
+
+    patches = []
+    for i in range(num_patches_h):
+        for j in range(num_patches_w):
+            patch = image[i*patch_size:(i+1)*patch_size, j*patch_size:(j+1)*patch_size, :]
+            patches.append(patch.reshape(-1))
+
+    return np.array(patches, dtype=np.float32)
+
+
+class Command(BaseCommand):
+    help = "Verify simple_patchify against the reference loop and measure its speed"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--image-size', type=int, default=BRAIN_TUMOR_CONFIG['image_size'])
+        parser.add_argument('--patch-size', type=int, default=BRAIN_TUMOR_CONFIG['patch_size'])
+        parser.add_argument('--batch', type=int, default=8, help="Images per batched call")
+        parser.add_argument('--repeat', type=int, default=100, help="Timed calls per implementation")
+
+    def handle(self, *args, **options):
+        size = options['image_size']
+        patch_size = options['patch_size']
+        rng = np.random.default_rng(0)
+
+        checked = self._check(rng, size, patch_size)
+        self.stdout.write(self.style.SUCCESS(f"OK: {checked} inputs identical to the reference implementation"))
+
+        image = rng.random((size, size, 3), dtype=np.float32)
+        batch = rng.random((options['batch'], size, size, 3), dtype=np.float32)
+        repeat = options['repeat']
+
+        reference = self._time(lambda: reference_patchify(image, patch_size), repeat)
+        vectorized = self._time(lambda: simple_patchify(image, patch_size), repeat)
+        batch_reference = self._time(lambda: [reference_patchify(x, patch_size) for x in batch], repeat)
+        batch_vectorized = self._time(lambda: simple_patchify(batch, patch_size), repeat)
+
+        self.stdout.write(f"{'input':>22} {'reference ms':>13} {'vectorized ms':>14} {'speedup':>8}")
+        for label, before, after in (
+            (f"({size}, {size}, 3)", reference, vectorized),
+            (f"({options['batch']}, {size}, {size}, 3)", batch_reference, batch_vectorized),
+        ):
+            self.stdout.write(f"{label:>22} {before:>13.3f} {after:>14.3f} {before / after:>7.1f}x")
+
+    def _check(self, rng, size, patch_size):
+        inputs = [
+            rng.random((size, size, 3), dtype=np.float32),
+            rng.random((size, size, 3)),  # float64
+            rng.random((size + patch_size // 2, size + 3, 3), dtype=np.float32),  # uneven
+            rng.random((size, size, 1), dtype=np.float32),
+        ]
+
+        directory = os.path.join(settings.MEDIA_ROOT, 'brain_tumor_originals')
+        if os.path.isdir(directory):
+            for name in sorted(os.listdir(directory)):
+                with open(os.path.join(directory, name), 'rb') as image_file:
+                    try:
+                        _, original = process_image_for_model(image_file, BRAIN_TUMOR_CONFIG)
+                    except ValueError:
+                        continue
+                inputs.append(original.astype(np.float32) / 255.0)
+
+        for index, image in enumerate(inputs):
+            expected = reference_patchify(image, patch_size)
+            if not np.array_equal(simple_patchify(image, patch_size), expected):
+                raise CommandError(f"Mismatch on input {index} with shape {image.shape}")
+
+        batch = np.stack([inputs[0], inputs[0] * 0.5, inputs[0] ** 2])
+        expected = np.stack([reference_patchify(image, patch_size) for image in batch])
+        if not np.array_equal(simple_patchify(batch, patch_size), expected):
+            raise CommandError("Mismatch on batched input")
+
+        return len(inputs) + len(batch)
+
+    def _time(self, fn, repeat):
+        fn()
+        started = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        return (time.perf_counter() - started) / repeat * 1000
@@ -0,0 +1,118 @@
+"""
+Benchmark brain tumor segmentation throughput with and without micro-batching.
+
+For each number of concurrent clients, every client sends --requests inference
+calls back to back; the command reports throughput, median/p95 latency and the
+average batch size the micro-batcher achieved. Inputs are the sample MRIs in
+media/brain_tumor_originals. GPUs are hidden so results reflect CPU serving.
+
+Usage:
+    python manage.py benchmark_segmentation
+    python manage.py benchmark_segmentation --clients 1 4 16 --requests 8 --max-batch-size 16
+"""
+import os
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from health_predictions.batching import MicroBatcher
+from health_predictions.image_utils import process_image_for_model
+from health_predictions.model_registry import get_brain_tumor_model
+from health_predictions.segmentation import BRAIN_TUMOR_CONFIG
+
+
+class Command(BaseCommand):
+    help = "Measure segmentation throughput at several client concurrencies, batched vs unbatched"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--clients', type=int, nargs='+', default=[1, 4, 16],
+            help="Concurrent client counts"
+        )
+        parser.add_argument('--requests', type=int, default=8, help="Requests per client")
+        parser.add_argument(
+            '--max-batch-size', type=int, default=settings.SEGMENTATION_MAX_BATCH_SIZE,
+            help="Micro-batcher max batch size"
+        )
+        parser.add_argument(
+            '--max-wait-ms', type=float, default=settings.SEGMENTATION_MAX_WAIT_MS,
+            help="Micro-batcher max wait in milliseconds"
+        )
+
+    def handle(self, *args, **options):
+        # Hide GPUs before TensorFlow is imported (on first model load)
+        os.environ.setdefault('CUDA_VISIBLE_DEVICES', '-1')
+        model = get_brain_tumor_model()
+        if model is None:
+            raise CommandError("Brain tumor segmentation model not available")
+
+        inputs = self._load_inputs(BRAIN_TUMOR_CONFIG)
+
+        def direct(batch):
+            return model.predict(batch)
+
+        # Warm up so graph tracing is not measured
+        direct(inputs[0])
+
+        self.stdout.write(
+            f"{'clients':>8} {'mode':>10} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'avg batch':>10}"
+        )
+        for clients in options['clients']:
+            for mode in ('direct', 'batched'):
+                batcher = None
+                if mode == 'batched':
+                    batcher = MicroBatcher(
+                        direct,
+                        max_batch_size=options['max_batch_size'],
+                        max_wait=options['max_wait_ms'] / 1000
+                    )
+                    call = batcher.predict
+                else:
+                    call = direct
+
+                elapsed, latencies = self._run(call, inputs, clients, options['requests'])
+                avg_batch = batcher.stats()['avg_batch_size'] if batcher else 1
+                self.stdout.write(
+                    f"{clients:>8} {mode:>10} {len(latencies) / elapsed:>8.2f} "
+                    f"{np.percentile(latencies, 50):>9.1f} {np.percentile(latencies, 95):>9.1f} "
+                    f"{avg_batch:>10}"
+                )
+
+    def _load_inputs(self, config):
+        directory = os.path.join(settings.MEDIA_ROOT, 'brain_tumor_originals')
+        names = sorted(os.listdir(directory)) if os.path.isdir(directory) else []
+        inputs = []
+        for name in names:
+            with open(os.path.join(directory, name), 'rb') as image_file:
+                try:
+                    inputs.append(process_image_for_model(image_file, config)[0])
+                except ValueError:
+                    continue
+        if not inputs:
+            raise CommandError(f"No readable sample images in {directory}")
+        return inputs
+
+    def _run(self, call, inputs, clients, requests_per_client):
+        latencies = []
+        lock = threading.Lock()
+        barrier = threading.Barrier(clients + 1)
+
+        def client(offset):
+            barrier.wait()
+            for i in range(requests_per_client):
+                started = time.perf_counter()
+                call(inputs[(offset + i) % len(inputs)])
+                with lock:
+                    latencies.append((time.perf_counter() - started) * 1000)
+
+        threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        started = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - started, latencies
@@ -0,0 +1,100 @@
+"""
+Accuracy parity and latency of the brain tumor inference backends.
+
+Every available backend is run on the sample images in
+media/brain_tumor_originals and its thresholded mask compared with the Keras
+model's (Dice coefficient). The command fails if any backend's lowest Dice is
+below --min-dice. It then reports median latency per call at each batch size,
+so the fastest backend can be put first in BRAIN_TUMOR_BACKENDS.
+
+Usage:
+    python manage.py check_brain_tumor_backends
+    python manage.py check_brain_tumor_backends --backends tflite --path models/model.tflite --min-dice 0.97
+"""
+import os
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from health_predictions.image_utils import process_image_for_model, postprocess_segmentation
+from health_predictions.inference_backends import BACKENDS, available_backends, load_backend
+from health_predictions.mask_encoding import binarize, dice_coefficient
+from health_predictions.segmentation import BRAIN_TUMOR_CONFIG
+
+
+class Command(BaseCommand):
+    help = "Compare inference backends with the Keras model (Dice) and measure their latency"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--backends', nargs='+', choices=list(BACKENDS),
+            help="Backends to check (default: all available)"
+        )
+        parser.add_argument('--path', help="Model file, when checking a single backend")
+        parser.add_argument('--min-dice', type=float, default=0.98, help="Lowest acceptable Dice")
+        parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 8])
+        parser.add_argument('--repeat', type=int, default=10, help="Timed calls per batch size")
+
+    def handle(self, *args, **options):
+        names = options['backends'] or available_backends()
+        if options['path'] and len(names) != 1:
+            raise CommandError("--path needs exactly one backend")
+        if not names:
+            raise CommandError("No inference backend available")
+
+        inputs = self._load_inputs()
+        try:
+            reference = load_backend('keras')
+        except Exception as e:
+            raise CommandError(f"Keras reference model not available: {e}")
+        expected = [self._mask(reference.predict(x)) for x in inputs]
+
+        self.stdout.write(f"{'backend':>8} {'min dice':>9} {'mean dice':>10} " + " ".join(
+            f"{f'b={size} ms':>10}" for size in options['batch_sizes']
+        ))
+        failed = []
+        for name in names:
+            backend = reference if name == 'keras' and not options['path'] else load_backend(name, options['path'])
+
+            scores = [dice_coefficient(self._mask(backend.predict(x)), mask) for x, mask in zip(inputs, expected)]
+            latencies = [
+                self._latency(backend, inputs, size, options['repeat'])
+                for size in options['batch_sizes']
+            ]
+            self.stdout.write(f"{name:>8} {min(scores):>9.4f} {np.mean(scores):>10.4f} " + " ".join(
+                f"{latency:>10.2f}" for latency in latencies
+            ))
+            if min(scores) < options['min_dice']:
+                failed.append(name)
+
+        if failed:
+            raise CommandError(f"Dice below {options['min_dice']} for: {', '.join(failed)}")
+        self.stdout.write(self.style.SUCCESS(f"OK: all backends within Dice {options['min_dice']} of Keras"))
+
+    def _load_inputs(self):
+        directory = os.path.join(settings.MEDIA_ROOT, 'brain_tumor_originals')
+        inputs = []
+        for name in sorted(os.listdir(directory)) if os.path.isdir(directory) else []:
+            with open(os.path.join(directory, name), 'rb') as image_file:
+                try:
+                    inputs.append(process_image_for_model(image_file, BRAIN_TUMOR_CONFIG)[0])
+                except ValueError:
+                    continue
+        if not inputs:
+            raise CommandError(f"No readable sample images in {directory}")
+        return inputs
+
+    def _mask(self, prediction):
+        return binarize(postprocess_segmentation(prediction, BRAIN_TUMOR_CONFIG))
+
+    def _latency(self, backend, inputs, batch_size, repeat):
+        batch = np.concatenate([inputs[i % len(inputs)] for i in range(batch_size)], axis=0)
+        backend.predict(batch)  # warm-up (graph tracing, tensor allocation)
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            backend.predict(batch)
+            timings.append((time.perf_counter() - started) * 1000)
+        return float(np.median(timings))
@@ -0,0 +1,77 @@
+"""
+Parity and latency of the compiled heart disease predictor.
+
+The model's parameters are extracted with heart.compile_model and its
+probabilities compared with the scikit-learn model's predict_proba on every
+combination of heart.GRID_LEVELS, plus a random sample with continuous
+features drawn across their whole range. The command fails if any probability
+differs by more than --tolerance or any predicted class differs. It then
+reports the latency of a single-row prediction through scikit-learn, the
+compiled evaluator and the prediction cache.
+
+Usage:
+    python manage.py check_heart_predictor
+    python manage.py check_heart_predictor --sample 100000 --tolerance 1e-12
+"""
+import os
+import time
+
+import joblib
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from health_predictions.heart import (
+    PARITY_TOLERANCE, HeartPredictor, check_parity, compile_model, feature_grid, predict_heart_disease
+)
+from health_predictions.model_registry import HEART_MODEL_PATH
+
+
+class Command(BaseCommand):
+    help = "Check the compiled heart disease predictor against scikit-learn and time both"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sample', type=int, default=20000, help="Random rows checked besides the grid")
+        parser.add_argument('--tolerance', type=float, default=PARITY_TOLERANCE)
+        parser.add_argument('--repeat', type=int, default=2000, help="Timed single-row predictions")
+
+    def handle(self, *args, **options):
+        path = os.path.join(settings.BASE_DIR, HEART_MODEL_PATH)
+        if not os.path.exists(path):
+            raise CommandError(f"Heart disease model not found at {path}")
+        model = joblib.load(path)
+
+        compiled = compile_model(model)
+        if compiled is None:
+            raise CommandError(f"No compiled evaluator for {type(model).__name__}; it is served with scikit-learn")
+
+        failed = False
+        for label, features in (
+            ('grid', feature_grid()),
+            ('sample', feature_grid(sample=options['sample'])),
+        ):
+            max_difference, mismatches = check_parity(model, compiled, features)
+            ok = max_difference <= options['tolerance'] and not mismatches
+            failed = failed or not ok
+            self.stdout.write(
+                f"{label:>6}: {len(features)} rows, max |dp| {max_difference:.3g}, "
+                f"{mismatches} class mismatches {'OK' if ok else 'FAILED'}"
+            )
+
+        row = feature_grid(sample=1)
+        uncached = HeartPredictor(model, cache_size=0)
+        cached = HeartPredictor(model)
+        timings = {
+            'sklearn': lambda: predict_heart_disease(model, row),
+            f"compiled ({compiled.kind})": lambda: uncached.predict(row),
+            'cached': lambda: cached.predict(row),
+        }
+        for label, predict_fn in timings.items():
+            predict_fn()
+            started = time.perf_counter()
+            for _ in range(options['repeat']):
+                predict_fn()
+            elapsed = (time.perf_counter() - started) / options['repeat']
+            self.stdout.write(f"{label:>30}: {elapsed * 1e6:8.1f} us/prediction")
+
+        if failed:
+            raise CommandError("Compiled predictor does not match scikit-learn")
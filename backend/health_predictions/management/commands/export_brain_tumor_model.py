@@ -0,0 +1,93 @@
+"""
+Export the Keras brain tumor model for a faster inference backend.
+
+Writes models/model.tflite (TensorFlow Lite) or models/model.onnx (ONNX, needs
+tf2onnx), optionally with dynamic-range int8 quantization of the weights, then
+runs the accuracy-parity check against the Keras model on the sample images.
+The exported model is picked up automatically according to BRAIN_TUMOR_BACKENDS.
+
+Usage:
+    python manage.py export_brain_tumor_model
+    python manage.py export_brain_tumor_model --format onnx --quantize
+"""
+import os
+import tempfile
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from health_predictions.inference_backends import load_keras_model, model_path
+from health_predictions.segmentation import BRAIN_TUMOR_CONFIG
+
+
+class Command(BaseCommand):
+    help = "Convert models/model.keras to TFLite or ONNX, optionally int8-quantized"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=['tflite', 'onnx'], default='tflite')
+        parser.add_argument(
+            '--quantize', action='store_true',
+            help="Dynamic-range int8 quantization of the weights"
+        )
+        parser.add_argument('--output', help="Output path (default: models/model.<format>)")
+        parser.add_argument('--skip-check', action='store_true', help="Do not run the parity check")
+
+    def handle(self, *args, **options):
+        keras_path = model_path('keras')
+        if not os.path.exists(keras_path):
+            raise CommandError(f"Keras model not found at {keras_path}")
+
+        try:
+            model = load_keras_model(keras_path)
+        except ImportError:
+            raise CommandError("TensorFlow is required to export the model")
+
+        output = options['output'] or model_path(options['format'])
+        if options['format'] == 'tflite':
+            self._export_tflite(model, output, options['quantize'])
+        else:
+            self._export_onnx(model, output, options['quantize'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {output} ({os.path.getsize(output) / 1024 / 1024:.1f} MB)"
+        ))
+
+        if not options['skip_check']:
+            call_command('check_brain_tumor_backends', backends=[options['format']], path=output)
+
+    def _export_tflite(self, model, output, quantize):
+        import tensorflow as tf
+
+        converter = tf.lite.TFLiteConverter.from_keras_model(model)
+        if quantize:
+            # Weights stored as int8, activations computed in float
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        # Fall back to TensorFlow kernels for ops without a TFLite builtin
+        converter.target_spec.supported_ops = [
+            tf.lite.OpsSet.TFLITE_BUILTINS,
+            tf.lite.OpsSet.SELECT_TF_OPS,
+        ]
+        with open(output, 'wb') as model_file:
+            model_file.write(converter.convert())
+
+    def _export_onnx(self, model, output, quantize):
+        import tensorflow as tf
+        try:
+            import tf2onnx
+        except ImportError:
+            raise CommandError("tf2onnx is required for ONNX export (pip install tf2onnx)")
+
+        num_patches = (BRAIN_TUMOR_CONFIG['image_size'] // BRAIN_TUMOR_CONFIG['patch_size']) ** 2
+        patch_dim = BRAIN_TUMOR_CONFIG['patch_size'] ** 2 * BRAIN_TUMOR_CONFIG['num_channels']
+        signature = [tf.TensorSpec((None, num_patches, patch_dim), tf.float32, name='patches')]
+
+        if not quantize:
+            tf2onnx.convert.from_keras(model, input_signature=signature, opset=17, output_path=output)
+            return
+
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        with tempfile.TemporaryDirectory() as directory:
+            float_path = os.path.join(directory, 'model.onnx')
+            tf2onnx.convert.from_keras(model, input_signature=signature, opset=17, output_path=float_path)
+            quantize_dynamic(float_path, output, weight_type=QuantType.QInt8)
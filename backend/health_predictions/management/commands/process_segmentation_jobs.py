@@ -0,0 +1,37 @@
+"""
+Run queued segmentation jobs.
+
+Use it as the job worker when SEGMENTATION_JOBS_IN_PROCESS is disabled, or
+once after a restart to finish jobs whose web process went away before
+running them. Several workers can run side by side: each job is claimed
+atomically. Running jobs whose worker died are failed first (see
+health_predictions/jobs.py).
+
+Usage:
+    python manage.py process_segmentation_jobs
+    python manage.py process_segmentation_jobs --loop --interval 2
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from health_predictions.jobs import process_queued_jobs
+
+
+class Command(BaseCommand):
+    help = "Run queued segmentation jobs (once, or continuously with --loop)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Keep polling for new jobs")
+        parser.add_argument('--interval', type=float, default=2, help="Seconds between polls with --loop")
+        parser.add_argument('--limit', type=int, default=None, help="Maximum jobs per poll")
+
+    def handle(self, *args, **options):
+        while True:
+            processed = process_queued_jobs(limit=options['limit'])
+            if processed:
+                self.stdout.write(f"Processed {processed} job(s)")
+            if not options['loop']:
+                break
+            if not processed:
+                time.sleep(options['interval'])
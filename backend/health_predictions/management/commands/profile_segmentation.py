@@ -0,0 +1,133 @@
+"""
+Per-stage time split of the segmentation pipeline, per CPU pool mode.
+
+Runs the segment pipeline (without the result store) on the sample images in
+media/brain_tumor_originals with several concurrent clients, once per
+SEGMENTATION_CPU_POOL mode, and reports the mean wall time per stage as seen
+by a request, its share of the request time and the overall throughput.
+'none' is the inline, pre-pool behaviour.
+
+Stages:
+    preprocess  decode, resize, normalize and patchify the upload
+    inference   model call (through the micro-batcher when enabled)
+    postprocess postprocess the prediction and PNG-encode the mask
+    original    wait for the original's PNG encode (overlaps inference)
+    comparison  render and PNG-encode the comparison image
+
+Usage:
+    python manage.py profile_segmentation
+    python manage.py profile_segmentation --pools none process --clients 8 --requests 4
+"""
+import os
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from health_predictions import cpu_pool
+from health_predictions.image_utils import (
+    preprocess_image_bytes,
+    postprocess_and_encode,
+    image_to_png_bytes,
+    render_comparison_png,
+)
+from health_predictions.model_registry import get_brain_tumor_model
+from health_predictions.segmentation import BRAIN_TUMOR_CONFIG, run_segmentation_model
+
+STAGES = ['preprocess', 'inference', 'postprocess', 'original', 'comparison']
+
+
+class Command(BaseCommand):
+    help = "Report the per-stage time split of the segmentation pipeline for each CPU pool mode"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pools', nargs='+', choices=['none', 'thread', 'process'],
+            default=['none', 'thread', 'process']
+        )
+        parser.add_argument('--clients', type=int, default=4, help="Concurrent clients")
+        parser.add_argument('--requests', type=int, default=4, help="Requests per client")
+        parser.add_argument('--workers', type=int, default=0, help="Pool workers (default: CPU count)")
+
+    def handle(self, *args, **options):
+        if get_brain_tumor_model() is None:
+            raise CommandError("Brain tumor segmentation model not available")
+
+        images = self._load_images()
+        self.stdout.write(
+            f"{'pool':>8} {'req/s':>7} " + " ".join(f"{stage:>17}" for stage in STAGES)
+        )
+
+        for pool in options['pools']:
+            with override_settings(SEGMENTATION_CPU_POOL=pool, SEGMENTATION_CPU_WORKERS=options['workers']):
+                cpu_pool.shutdown_pool()
+                # Warm up the pool workers and the model
+                self._run_pipeline(images[0], defaultdict(float))
+                elapsed, totals, count = self._run_clients(images, options['clients'], options['requests'])
+                cpu_pool.shutdown_pool()
+
+            request_time = sum(totals.values())
+            self.stdout.write(f"{pool:>8} {count / elapsed:>7.2f} " + " ".join(
+                f"{totals[stage] / count * 1000:>8.1f} ms {totals[stage] / request_time * 100:>4.0f}%"
+                for stage in STAGES
+            ))
+
+    def _load_images(self):
+        directory = os.path.join(settings.MEDIA_ROOT, 'brain_tumor_originals')
+        images = []
+        for name in sorted(os.listdir(directory)) if os.path.isdir(directory) else []:
+            with open(os.path.join(directory, name), 'rb') as image_file:
+                images.append(image_file.read())
+        if not images:
+            raise CommandError(f"No sample images in {directory}")
+        return images
+
+    def _run_pipeline(self, image_bytes, timings):
+        started = time.perf_counter()
+        processed_image, original = cpu_pool.run(preprocess_image_bytes, image_bytes, BRAIN_TUMOR_CONFIG)
+        preprocessed = time.perf_counter()
+
+        original_png = cpu_pool.submit(image_to_png_bytes, original)
+        prediction = run_segmentation_model(processed_image)
+        inferred = time.perf_counter()
+
+        mask, _ = cpu_pool.run(postprocess_and_encode, prediction, BRAIN_TUMOR_CONFIG)
+        postprocessed = time.perf_counter()
+
+        original_png.result()
+        encoded = time.perf_counter()
+
+        cpu_pool.run(render_comparison_png, original, mask, BRAIN_TUMOR_CONFIG)
+        finished = time.perf_counter()
+
+        timings['preprocess'] += preprocessed - started
+        timings['inference'] += inferred - preprocessed
+        timings['postprocess'] += postprocessed - inferred
+        timings['original'] += encoded - postprocessed
+        timings['comparison'] += finished - encoded
+
+    def _run_clients(self, images, clients, requests_per_client):
+        totals = defaultdict(float)
+        lock = threading.Lock()
+        barrier = threading.Barrier(clients + 1)
+
+        def client(offset):
+            timings = defaultdict(float)
+            barrier.wait()
+            for i in range(requests_per_client):
+                self._run_pipeline(images[(offset + i) % len(images)], timings)
+            with lock:
+                for stage, value in timings.items():
+                    totals[stage] += value
+
+        threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        started = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - started, totals, clients * requests_per_client
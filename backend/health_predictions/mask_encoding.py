@@ -0,0 +1,83 @@
+"""
+Compact encodings for segmentation masks.
+
+The model outputs a probability per pixel; for transport the mask is
+thresholded to a binary mask and sent either run-length encoded or bit-packed,
+which is a fraction of the size of a base64 PNG and needs no image decoder on
+the client.
+"""
+import base64
+
+import numpy as np
+
+
+MASK_THRESHOLD = 0.5
+
+
+def binarize(mask, threshold=MASK_THRESHOLD):
+    """
+    Threshold a segmentation mask.
+
+    Args:
+        mask: uint8 mask (0-255) as returned by postprocess_segmentation
+        threshold: Probability above which a pixel is tumor
+
+    Returns:
+        Boolean array of the same shape
+    """
+    return mask >= threshold * 255
+
+
+def encode_rle(binary_mask):
+    """
+    Run-length encode a binary mask in row-major order.
+
+    Returns:
+        Dictionary {'size': [h, w], 'counts': [...]} where counts alternate
+        between runs of 0s and 1s, starting with 0s (a leading 0 count means
+        the first pixel is 1).
+    """
+    flat = binary_mask.reshape(-1).astype(np.int8)
+    # Positions where the value changes, plus both ends
+    changes = np.flatnonzero(np.diff(flat)) + 1
+    boundaries = np.concatenate(([0], changes, [flat.size]))
+    counts = np.diff(boundaries)
+    if flat.size and flat[0] == 1:
+        counts = np.concatenate(([0], counts))
+    return {'size': list(binary_mask.shape), 'counts': counts.tolist()}
+
+
+def decode_rle(rle):
+    """Inverse of encode_rle"""
+    counts = np.asarray(rle['counts'], dtype=np.int64)
+    values = np.arange(len(counts)) % 2 == 1
+    return np.repeat(values, counts).reshape(rle['size'])
+
+
+def encode_bitpacked(binary_mask):
+    """
+    Pack a binary mask to one bit per pixel (row-major, most significant bit first).
+
+    Returns:
+        Dictionary {'size': [h, w], 'data': <base64 string>}
+    """
+    packed = np.packbits(binary_mask.reshape(-1))
+    return {
+        'size': list(binary_mask.shape),
+        'data': base64.b64encode(packed.tobytes()).decode('ascii'),
+    }
+
+
+def decode_bitpacked(packed):
+    """Inverse of encode_bitpacked"""
+    size = packed['size']
+    bits = np.unpackbits(np.frombuffer(base64.b64decode(packed['data']), dtype=np.uint8))
+    return bits[:int(np.prod(size))].astype(bool).reshape(size)
+
+
+def dice_coefficient(mask_a, mask_b):
+    """Dice similarity of two binary masks (1.0 when both are empty)"""
+    total = int(mask_a.sum()) + int(mask_b.sum())
+    if total == 0:
+        return 1.0
+    return 2.0 * int(np.logical_and(mask_a, mask_b).sum()) / total
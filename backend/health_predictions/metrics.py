@@ -0,0 +1,179 @@
+"""
+In-process latency metrics for the prediction pipelines.
+
+Each pipeline run is split into named stages (decode, resize, patchify,
+inference, postprocess, compose, encode for segmentation; validate, features,
+predict, save for heart disease). A StageTimer collects their durations where
+the work happens. This can be a cpu_pool worker, so timed_call returns the
+durations alongside the result. The caller then passes them to
+metrics.record(), which:
+
+    - adds them to a per-(pipeline, stage) histogram of the last WINDOW
+      observations, from which p50/p95/p99 are computed
+    - logs one line per run with the request id (see middleware.py)
+
+render_prometheus() exposes the histograms as Prometheus summaries (served by
+the metrics/ endpoint). Metrics are per process: with several web workers,
+each reports its own.
+
+This module only depends on NumPy so that it can be imported by process
+pool workers.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+
+import numpy as np
+
+from .middleware import get_request_id
+
+logger = logging.getLogger(__name__)
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Observations kept per (pipeline, stage) for the quantiles
+WINDOW = 1024
+
+METRIC_NAME = 'health_predictions_stage_duration_seconds'
+
+
+class StageTimer:
+    """Wall-clock durations of named stages, summed when a stage repeats"""
+
+    def __init__(self):
+        self.durations = {}
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def add(self, name, seconds):
+        self.durations[name] = self.durations.get(name, 0.0) + seconds
+
+    def update(self, durations):
+        for name, seconds in durations.items():
+            self.add(name, seconds)
+
+
+class _NullTimer:
+    def stage(self, name):
+        return nullcontext()
+
+
+# Default timer of the instrumented functions: records nothing
+NULL_TIMER = _NullTimer()
+
+
+def timed_call(fn, *args):
+    """
+    Call fn(*args, timer=StageTimer()) (picklable, for cpu_pool).
+
+    Returns:
+        Tuple (result, durations)
+    """
+    timer = StageTimer()
+    result = fn(*args, timer=timer)
+    return result, timer.durations
+
+
+class LatencyHistogram:
+    """Count and sum of all observations, quantiles of the last `window`"""
+
+    def __init__(self, window=WINDOW):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+        self.sum += seconds
+
+
+class MetricsRegistry:
+    """Latency histograms by (pipeline, stage)"""
+
+    def __init__(self, window=WINDOW):
+        self.window = window
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, pipeline, stage, seconds):
+        with self._lock:
+            histogram = self._histograms.get((pipeline, stage))
+            if histogram is None:
+                histogram = self._histograms[(pipeline, stage)] = LatencyHistogram(self.window)
+            histogram.observe(seconds)
+
+    def record(self, pipeline, durations):
+        """
+        Record the stage durations of one pipeline run and log them.
+
+        Args:
+            pipeline: Pipeline name (e.g. 'segmentation')
+            durations: Dictionary of stage name -> seconds
+        """
+        for stage, seconds in durations.items():
+            self.observe(pipeline, stage, seconds)
+
+        logger.info(
+            "%s stage timings: %s", pipeline,
+            " ".join(f"{stage}_ms={seconds * 1000:.1f}" for stage, seconds in durations.items()),
+            extra={
+                'pipeline': pipeline,
+                'request_id': get_request_id(),
+                'durations_ms': {stage: round(seconds * 1000, 3) for stage, seconds in durations.items()},
+            }
+        )
+
+    def snapshot(self):
+        """
+        Returns:
+            Dictionary pipeline -> stage -> {count, sum, p50, p95, p99}, in seconds
+        """
+        with self._lock:
+            series = [
+                (pipeline, stage, histogram.count, histogram.sum, list(histogram.samples))
+                for (pipeline, stage), histogram in sorted(self._histograms.items())
+            ]
+
+        snapshot = {}
+        for pipeline, stage, count, total, samples in series:
+            values = np.quantile(samples, QUANTILES) if samples else [float('nan')] * len(QUANTILES)
+            snapshot.setdefault(pipeline, {})[stage] = {
+                'count': count,
+                'sum': total,
+                **{f"p{round(quantile * 100)}": float(value) for quantile, value in zip(QUANTILES, values)},
+            }
+        return snapshot
+
+    def render_prometheus(self):
+        """The histograms in the Prometheus text exposition format (as summaries)"""
+        lines = [
+            f"# HELP {METRIC_NAME} Duration of the prediction pipeline stages",
+            f"# TYPE {METRIC_NAME} summary",
+        ]
+        for pipeline, stages in self.snapshot().items():
+            for stage, values in stages.items():
+                labels = f'pipeline="{pipeline}",stage="{stage}"'
+                for quantile in QUANTILES:
+                    lines.append(
+                        f'{METRIC_NAME}{{{labels},quantile="{quantile}"}} '
+                        f"{values[f'p{round(quantile * 100)}']:.6g}"
+                    )
+                lines.append(f"{METRIC_NAME}_sum{{{labels}}} {values['sum']:.6g}")
+                lines.append(f"{METRIC_NAME}_count{{{labels}}} {values['count']}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+
+metrics = MetricsRegistry()
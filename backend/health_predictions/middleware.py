@@ -0,0 +1,62 @@
+"""
+Request id correlation.
+
+RequestIDMiddleware gives every request an id: the client's X-Request-ID
+header if it is a plausible id, a new UUID otherwise. The id is returned in
+the X-Request-ID response header and stored in a context variable for the
+duration of the request. RequestIDFilter adds it to log records (as
+%(request_id)s), so the stage timings and errors logged while handling a
+request can be matched with it.
+"""
+import contextvars
+import logging
+import re
+import uuid
+from contextlib import contextmanager
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+
+# Accepted client-supplied ids
+_REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9._:-]{1,128}$')
+
+_request_id = contextvars.ContextVar('request_id', default=None)
+
+
+def get_request_id():
+    """Id of the request being handled, or None outside a request"""
+    return _request_id.get()
+
+
+@contextmanager
+def request_id_context(request_id):
+    """Set the current request id for the duration of the block"""
+    token = _request_id.set(request_id)
+    try:
+        yield request_id
+    finally:
+        _request_id.reset(token)
+
+
+class RequestIDMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request_id = request.META.get('HTTP_X_REQUEST_ID', '')
+        if not _REQUEST_ID_PATTERN.match(request_id):
+            request_id = uuid.uuid4().hex
+        request.request_id = request_id
+
+        with request_id_context(request_id):
+            response = self.get_response(request)
+        response[REQUEST_ID_HEADER] = request_id
+        return response
+
+
+class RequestIDFilter(logging.Filter):
+    """Add the current request id (or '-') to log records as request_id"""
+
+    def filter(self, record):
+        if getattr(record, 'request_id', None) is None:
+            record.request_id = get_request_id() or '-'
+        return True
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.7 on 2026-10-17 04:00
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('health_predictions', '0005_remove_doctorstats_doctor_delete_activitylog_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SegmentationResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(help_text='SHA-256 of the uploaded image bytes and the model version', max_length=64, unique=True)),
+                ('model_version', models.CharField(help_text='Version of the model that produced the mask', max_length=64)),
+                ('original_image', models.ImageField(help_text='Resized original image', upload_to='brain_tumor_originals/')),
+                ('segmentation_mask', models.ImageField(help_text='Segmentation mask (0-255)', upload_to='brain_tumor_segmentations/')),
+                ('processing_time', models.FloatField(default=0, help_text='Time taken to compute the result (seconds)')),
+                ('hit_count', models.PositiveIntegerField(default=0, help_text='Number of times the result was served from cache')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_accessed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='segmentation_results', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Segmentation Result',
+                'verbose_name_plural': 'Segmentation Results',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 04:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('health_predictions', '0007_segmentationjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='segmentationjob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, help_text='Last progress update of the worker running the job', null=True),
+        ),
+    ]
@@ -0,0 +1,246 @@
+"""
+Lazy, thread-safe registry of the prediction models.
+
+Nothing is loaded at import time: TensorFlow and the model files are only
+touched the first time a model is requested, so management commands, migrations
+and non-ML workers start as fast as plain Django. Concurrent first requests for
+the same model wait on a per-model lock and share a single load. A failed load
+is remembered (and reported by status()) instead of being retried on every
+request; reload() clears it.
+
+Web workers can load models eagerly at startup by listing them in
+ML_WARMUP_MODELS: the WSGI and ASGI entry points call start_warm_up(), so
+migrate, shell, tests and other management commands never load them.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+
+from .heart import HeartPredictor
+from .inference_backends import select_backend, load_backend, model_path
+
+logger = logging.getLogger(__name__)
+
+HEART_MODEL = 'heart'
+BRAIN_TUMOR_MODEL = 'brain_tumor'
+
+# Model file, relative to BASE_DIR (brain tumor model files: see inference_backends.py)
+HEART_MODEL_PATH = os.path.join('models', 'heart_dicease_2.pkl')
+
+
+class ModelUnavailable(Exception):
+    """Raised by a loader when its model cannot be loaded"""
+
+
+class _Entry:
+    __slots__ = ('loader', 'versioner', 'lock', 'model', 'loading', 'loaded', 'error', 'load_time', 'version')
+
+    def __init__(self, loader, versioner):
+        self.loader = loader
+        self.versioner = versioner
+        self.version = None
+        self.lock = threading.Lock()
+        self.model = None
+        self.loading = False
+        self.loaded = False
+        self.error = None
+        self.load_time = None
+
+
+class ModelRegistry:
+    """Named model loaders whose results are loaded once, on first use"""
+
+    def __init__(self):
+        self._entries = {}
+
+    def register(self, name, loader, versioner=None):
+        """
+        Register a model.
+
+        Args:
+            name: Model name
+            loader: Zero-argument callable returning the model
+            versioner: Zero-argument callable returning a version string that
+                changes whenever the model's outputs may change
+        """
+        self._entries[name] = _Entry(loader, versioner)
+
+    def get(self, name):
+        """
+        Return a model, loading it on first use.
+
+        Returns:
+            The model, or None if it could not be loaded
+        """
+        entry = self._entries[name]
+        if entry.loaded or entry.error is not None:
+            return entry.model
+
+        with entry.lock:
+            # Another thread may have loaded it while we were waiting
+            if not entry.loaded and entry.error is None:
+                self._load(name, entry)
+        return entry.model
+
+    def _load(self, name, entry):
+        started = time.perf_counter()
+        entry.loading = True
+        try:
+            entry.model = entry.loader()
+            entry.loaded = True
+            entry.load_time = time.perf_counter() - started
+            logger.info("Loaded %s model in %.2fs", name, entry.load_time)
+        except Exception as e:
+            entry.error = f"{type(e).__name__}: {e}"
+            if isinstance(e, ModelUnavailable):
+                logger.warning("%s model unavailable: %s", name, e)
+            else:
+                logger.exception("Error loading %s model", name)
+        finally:
+            entry.loading = False
+
+    def reload(self, name):
+        """Forget a loaded (or failed) model so the next get() loads it again"""
+        entry = self._entries[name]
+        with entry.lock:
+            entry.model = None
+            entry.loaded = False
+            entry.error = None
+            entry.load_time = None
+            entry.version = None
+
+    def version(self, name):
+        """Version of a model, computed once (default: 'unversioned')"""
+        entry = self._entries[name]
+        if entry.version is None:
+            entry.version = entry.versioner() if entry.versioner else 'unversioned'
+        return entry.version
+
+    def warm_up(self, names=None):
+        """Load the given models (default: all registered models) now"""
+        for name in names or list(self._entries):
+            self.get(name)
+
+    def status(self):
+        """Loading state of every registered model"""
+        return {
+            name: {
+                'loading': entry.loading,
+                'loaded': entry.loaded,
+                'error': entry.error,
+                'load_time': round(entry.load_time, 3) if entry.load_time is not None else None,
+            }
+            for name, entry in self._entries.items()
+        }
+
+    def __contains__(self, name):
+        return name in self._entries
+
+
+def file_digest(path, length=16):
+    """Truncated SHA-256 of a file's content"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as model_file:
+        for chunk in iter(lambda: model_file.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:length]
+
+
+def load_heart_model():
+    """
+    Load the scikit-learn heart disease classifier, wrapped in a HeartPredictor
+    (prediction cache and compiled evaluator, see heart.py).
+    """
+    import joblib
+
+    path = os.path.join(settings.BASE_DIR, HEART_MODEL_PATH)
+    if not os.path.exists(path):
+        raise ModelUnavailable(f"Heart disease model not found at {path}")
+    return HeartPredictor(
+        joblib.load(path),
+        compiled=settings.HEART_COMPILED_PREDICTOR,
+        cache_size=settings.HEART_PREDICTION_CACHE_SIZE
+    )
+
+
+def load_brain_tumor_model():
+    """
+    Load the brain tumor segmentation model with the preferred available
+    backend (see inference_backends.py).
+    """
+    backend_name = select_backend()
+    if backend_name is None:
+        raise ModelUnavailable(
+            "No brain tumor model backend available "
+            f"(tried {', '.join(settings.BRAIN_TUMOR_BACKENDS)}; model files in models/)"
+        )
+
+    backend = load_backend(backend_name)
+    logger.info("Brain tumor model served with the %s backend", backend_name)
+    return backend
+
+
+def brain_tumor_model_version():
+    """
+    BRAIN_TUMOR_MODEL_VERSION if set, otherwise the backend name and a digest
+    of its model file (an exported or quantized model gets its own version).
+
+    A configured version longer than SegmentationResult.model_version allows
+    is shortened to a prefix and a digest of the whole value, so distinct
+    versions stay distinct.
+    """
+    from .models import SegmentationResult
+
+    version = settings.BRAIN_TUMOR_MODEL_VERSION
+    if not version:
+        backend_name = select_backend() or 'keras'
+        return f"{backend_name}-{file_digest(model_path(backend_name))}"
+
+    max_length = SegmentationResult._meta.get_field('model_version').max_length
+    if len(version) > max_length:
+        digest = hashlib.sha256(version.encode('utf-8')).hexdigest()[:16]
+        version = f"{version[:max_length - len(digest) - 1]}-{digest}"
+    return version
+
+
+registry = ModelRegistry()
+registry.register(HEART_MODEL, load_heart_model)
+registry.register(BRAIN_TUMOR_MODEL, load_brain_tumor_model, brain_tumor_model_version)
+
+
+def get_heart_model():
+    return registry.get(HEART_MODEL)
+
+
+def get_brain_tumor_model():
+    return registry.get(BRAIN_TUMOR_MODEL)
+
+
+def get_brain_tumor_model_version():
+    return registry.version(BRAIN_TUMOR_MODEL)
+
+
+def start_warm_up():
+    """
+    Load the ML_WARMUP_MODELS in a background thread, so boot is not delayed.
+
+    Called by the WSGI and ASGI entry points only (runserver included, in the
+    serving process rather than the autoreloader).
+
+    Returns:
+        The warm-up thread, or None if no model is to be warmed up
+    """
+    if not settings.ML_WARMUP_MODELS:
+        return None
+    thread = threading.Thread(
+        target=registry.warm_up,
+        args=(settings.ML_WARMUP_MODELS,),
+        name='model-warm-up',
+        daemon=True
+    )
+    thread.start()
+    return thread
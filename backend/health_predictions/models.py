@@ -1,3 +1,5 @@
+import uuid
+
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.utils import timezone
@@ -76,3 +78,96 @@ class HeartDiseasePrediction(models.Model):
         prediction_text = "Disease" if self.prediction == 1 else "No Disease"
         return f"{self.patient.get_full_name()} - {prediction_text} ({self.created_at.date()})"
 
+
+
+class SegmentationResult(models.Model):
+    """
+    Brain tumor segmentation result, stored once per distinct upload.
+    
+    Results are keyed by a hash of the uploaded image bytes and the model
+    version, so re-uploading the same MRI is served from here without running
+    the model again.
+    """
+    
+    key = models.CharField(
+        max_length=64,
+        unique=True,
+        help_text="SHA-256 of the uploaded image bytes and the model version"
+    )
+    model_version = models.CharField(max_length=64, help_text="Version of the model that produced the mask")
+    original_image = models.ImageField(upload_to='brain_tumor_originals/', help_text="Resized original image")
+    segmentation_mask = models.ImageField(upload_to='brain_tumor_segmentations/', help_text="Segmentation mask (0-255)")
+    processing_time = models.FloatField(default=0, help_text="Time taken to compute the result (seconds)")
+    hit_count = models.PositiveIntegerField(default=0, help_text="Number of times the result was served from cache")
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='segmentation_results'
+    )
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_accessed_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "Segmentation Result"
+        verbose_name_plural = "Segmentation Results"
+    
+    def __str__(self):
+        return f"{self.key[:12]} ({self.model_version}, {self.created_at.date()})"
+
+
+class SegmentationJob(models.Model):
+    """Asynchronous brain tumor segmentation request"""
+    
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+        ('cancelled', 'Cancelled'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='segmentation_jobs'
+    )
+    image = models.FileField(
+        upload_to='segmentation_jobs/',
+        blank=True,
+        help_text="Uploaded image, removed once the job has finished"
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    progress = models.PositiveSmallIntegerField(default=0, help_text="Progress in percent")
+    result = models.ForeignKey(
+        SegmentationResult,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='jobs'
+    )
+    error = models.TextField(blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="Last progress update of the worker running the job"
+    )
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+        verbose_name = "Segmentation Job"
+        verbose_name_plural = "Segmentation Jobs"
+    
+    def __str__(self):
+        return f"{self.id} ({self.get_status_display()})"
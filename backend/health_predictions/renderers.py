@@ -0,0 +1,25 @@
+import json
+
+from rest_framework.renderers import BaseRenderer
+
+
+class PNGRenderer(BaseRenderer):
+    """
+    Render PNG bytes as-is, for clients that send ``Accept: image/png``.
+
+    Anything else (error responses) is rendered as JSON with a JSON content
+    type, so errors stay readable whatever the client asked for.
+    """
+    media_type = 'image/png'
+    format = 'png'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, bytes):
+            return data
+
+        response = (renderer_context or {}).get('response')
+        if response is not None:
+            response['Content-Type'] = 'application/json'
+        return json.dumps(data).encode('utf-8')
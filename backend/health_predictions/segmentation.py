@@ -0,0 +1,140 @@
+"""
+Brain tumor segmentation pipeline.
+
+Shared by the synchronous segment endpoint and the asynchronous job workers:
+looks up the content-addressed result store first and only runs preprocess →
+inference → postprocess on a miss. The CPU-bound stages run in the pool from
+cpu_pool.py, inference in the micro-batcher. Stage durations are recorded in
+metrics.py.
+"""
+import logging
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+from . import cpu_pool
+from .batching import MicroBatcher
+from .image_utils import preprocess_image_bytes, postprocess_and_encode, image_to_png_bytes
+from .metrics import StageTimer, metrics, timed_call
+from .model_registry import get_brain_tumor_model, get_brain_tumor_model_version
+from .segmentation_results import segmentation_key, get_cached_result, store_segmentation_result
+
+logger = logging.getLogger(__name__)
+
+# Model configuration for brain tumor segmentation
+BRAIN_TUMOR_CONFIG = {
+    "image_size": 256,
+    "num_channels": 3,
+    "patch_size": 16,
+}
+
+ALLOWED_IMAGE_EXTENSIONS = ['jpg', 'jpeg', 'png', 'bmp', 'gif']
+
+_segmentation_batcher = None
+_segmentation_batcher_lock = threading.Lock()
+
+
+def get_segmentation_batcher():
+    """Return the shared micro-batcher wrapping the brain tumor model"""
+    global _segmentation_batcher
+    if _segmentation_batcher is None:
+        with _segmentation_batcher_lock:
+            if _segmentation_batcher is None:
+                _segmentation_batcher = MicroBatcher(
+                    lambda batch: get_brain_tumor_model().predict(batch),
+                    max_batch_size=settings.SEGMENTATION_MAX_BATCH_SIZE,
+                    max_wait=settings.SEGMENTATION_MAX_WAIT_MS / 1000
+                )
+    return _segmentation_batcher
+
+
+def run_segmentation_model(processed_image):
+    """Run the brain tumor model, batched with concurrent requests when enabled"""
+    if settings.SEGMENTATION_BATCHING:
+        return get_segmentation_batcher().predict(processed_image)
+    return get_brain_tumor_model().predict(processed_image)
+
+
+def segment_image(image_bytes, user=None, progress=None):
+    """
+    Segment an uploaded image, reusing the stored result for identical uploads.
+
+    Args:
+        image_bytes: Content of the uploaded image file
+        user: User the result is recorded for
+        progress: Optional callable receiving a percentage after each stage;
+            it may raise to abort the pipeline
+
+    Returns:
+        Tuple (result, cached, original_image, segmentation_mask). The arrays
+        are None when the result came from storage.
+
+    Raises:
+        ValueError: If the image cannot be processed
+    """
+    progress = progress or (lambda percent: None)
+    start_time = time.perf_counter()
+    timer = StageTimer()
+
+    with timer.stage('lookup'):
+        model_version = get_brain_tumor_model_version()
+        key = segmentation_key(image_bytes, model_version)
+        result = get_cached_result(key)
+    if result is not None:
+        timer.add('total', time.perf_counter() - start_time)
+        metrics.record('segmentation_cached', timer.durations)
+        progress(100)
+        return result, True, None, None
+
+    # Decode, resize, normalize and patchify in the CPU pool
+    (processed_image, original_image_resized), durations = cpu_pool.run(
+        timed_call,
+        preprocess_image_bytes,
+        image_bytes,
+        BRAIN_TUMOR_CONFIG
+    )
+    timer.update(durations)
+    progress(20)
+
+    # The original is PNG-encoded for storage while the model runs
+    original_png = cpu_pool.submit(timed_call, image_to_png_bytes, original_image_resized)
+
+    # Run segmentation (including any wait for the micro-batch)
+    with timer.stage('inference'):
+        prediction = run_segmentation_model(processed_image)
+    progress(70)
+
+    logger.debug(
+        "Prediction statistics: min=%.4f, max=%.4f, mean=%.4f",
+        float(np.min(prediction)), float(np.max(prediction)), float(np.mean(prediction))
+    )
+
+    # Postprocess segmentation and encode the mask
+    (segmentation_mask, mask_png), durations = cpu_pool.run(
+        timed_call,
+        postprocess_and_encode,
+        prediction,
+        BRAIN_TUMOR_CONFIG
+    )
+    timer.update(durations)
+    progress(90)
+
+    original_png, durations = original_png.result()
+    timer.update(durations)
+
+    processing_time = time.perf_counter() - start_time
+    with timer.stage('store'):
+        result = store_segmentation_result(
+            key,
+            model_version,
+            original_png,
+            mask_png,
+            processing_time=processing_time,
+            user=user
+        )
+    timer.add('total', time.perf_counter() - start_time)
+    metrics.record('segmentation', timer.durations)
+    progress(100)
+    return result, False, original_image_resized, segmentation_mask
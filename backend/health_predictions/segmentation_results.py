@@ -0,0 +1,105 @@
+"""
+Content-addressed storage of segmentation results.
+
+A result is keyed by the SHA-256 of the uploaded image bytes and the model
+version, and stored once (a SegmentationResult row plus two PNG files named
+after the key). Re-uploading the same MRI is served from storage without
+running the model; a new model version produces new keys, so stale results are
+never served.
+
+The stored original and mask also let derived images (the side-by-side
+comparison) be rendered only when a client asks for them.
+"""
+import hashlib
+from io import BytesIO
+
+import numpy as np
+from django.core.files.base import ContentFile
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from PIL import Image
+
+from .models import SegmentationResult
+
+
+def segmentation_key(image_bytes, model_version):
+    """SHA-256 of the uploaded image bytes and the model version"""
+    digest = hashlib.sha256(image_bytes)
+    digest.update(b'\0' + model_version.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def read_result_file(field):
+    """Content of a stored PNG file"""
+    with field.open('rb') as png_file:
+        return png_file.read()
+
+
+def _read_png(field):
+    return np.array(Image.open(BytesIO(read_result_file(field))))
+
+
+def load_result_images(result):
+    """
+    Read a stored result back as arrays.
+
+    Returns:
+        Tuple (original_image, segmentation_mask) as uint8 arrays
+    """
+    return _read_png(result.original_image), _read_png(result.segmentation_mask)
+
+
+def get_cached_result(key):
+    """
+    Return the stored result for a key, counting the cache hit.
+
+    Returns:
+        SegmentationResult or None
+    """
+    result = SegmentationResult.objects.filter(key=key).first()
+    if result is not None:
+        now = timezone.now()
+        SegmentationResult.objects.filter(pk=result.pk).update(
+            hit_count=F('hit_count') + 1,
+            last_accessed_at=now
+        )
+        result.hit_count += 1
+        result.last_accessed_at = now
+    return result
+
+
+def store_segmentation_result(key, model_version, original_png, mask_png, processing_time, user=None):
+    """
+    Store a computed result (once per key).
+
+    Args:
+        key: Key from segmentation_key
+        model_version: Model version the key was computed with
+        original_png, mask_png: PNG-encoded resized original and mask
+        processing_time: Seconds spent computing the result
+        user: User the result was computed for
+
+    When the same image was stored concurrently by another request, the files
+    written here are removed and the existing result is returned.
+
+    Returns:
+        SegmentationResult
+    """
+    result = SegmentationResult(
+        key=key,
+        model_version=model_version,
+        processing_time=processing_time,
+        created_by=user
+    )
+    result.original_image.save(f"{key}.png", ContentFile(original_png), save=False)
+    result.segmentation_mask.save(f"{key}.png", ContentFile(mask_png), save=False)
+
+    try:
+        with transaction.atomic():
+            result.save()
+    except IntegrityError:
+        result.original_image.delete(save=False)
+        result.segmentation_mask.delete(save=False)
+        return SegmentationResult.objects.get(key=key)
+    return result
@@ -1,6 +1,8 @@
+from django.db.models import Exists, OuterRef, Q
 from rest_framework import serializers
-from .models import HeartDiseasePrediction
+from .models import HeartDiseasePrediction, SegmentationJob
 from accounts.models import User
+from patients.models import Patient
 
 
 class HeartDiseasePredictionSerializer(serializers.ModelSerializer):
@@ -46,3 +48,78 @@ class HeartDiseasePredictionInputSerializer(serializers.Serializer):
             )
         return value
 
+
+
+class HeartDiseasePredictionBatchRowSerializer(HeartDiseasePredictionInputSerializer):
+    """One row of a batch prediction; doctors and admins name the patient per row"""
+    patient = serializers.IntegerField(required=False)
+
+
+class HeartDiseasePredictionBatchSerializer(serializers.Serializer):
+    """Serializer for receiving a batch of prediction rows"""
+    MAX_ROWS = 5000
+    
+    rows = HeartDiseasePredictionBatchRowSerializer(many=True, allow_empty=False)
+    
+    def validate_rows(self, rows):
+        if len(rows) > self.MAX_ROWS:
+            raise serializers.ValidationError(f"A batch cannot contain more than {self.MAX_ROWS} rows.")
+        return rows
+    
+    def validate(self, data):
+        """Resolve the patient of every row with a single query"""
+        user = self.context['request'].user
+        rows = data['rows']
+        
+        if user.user_type == 'patient':
+            # Patients can only screen themselves
+            for row in rows:
+                row['patient'] = user
+            return data
+        
+        missing = [index for index, row in enumerate(rows) if row.get('patient') is None]
+        if missing:
+            raise serializers.ValidationError({
+                'rows': f"Patient is required for every row (missing in rows {missing[:10]})."
+            })
+        
+        patient_ids = {row['patient'] for row in rows}
+        patients = User.objects.filter(id__in=patient_ids, user_type='patient')
+        if user.user_type != 'admin':
+            # Doctors can only screen the patients they follow: accounts
+            # linked (by email) to one of their Patient records
+            patients = patients.annotate(followed=Exists(
+                Patient.objects.filter(
+                    Q(doctor=user) | Q(primary_doctor=user),
+                    email=OuterRef('email')
+                ).exclude(email='')
+            ))
+        patients = patients.in_bulk()
+        unknown = sorted(patient_ids - set(patients))
+        if unknown:
+            raise serializers.ValidationError({
+                'rows': f"Unknown patients: {unknown[:10]}"
+            })
+        
+        not_followed = sorted(pk for pk, patient in patients.items() if not getattr(patient, 'followed', True))
+        if not_followed:
+            raise serializers.ValidationError({
+                'rows': f"You are not allowed to screen patients {not_followed[:10]}"
+            })
+        
+        for row in rows:
+            row['patient'] = patients[row['patient']]
+        return data
+
+
+class SegmentationJobSerializer(serializers.ModelSerializer):
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+    result_id = serializers.CharField(source='result.key', read_only=True, default=None)
+    
+    class Meta:
+        model = SegmentationJob
+        fields = [
+            'id', 'status', 'status_display', 'progress', 'error', 'result_id',
+            'created_at', 'started_at', 'finished_at'
+        ]
+        read_only_fields = fields
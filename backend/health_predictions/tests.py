@@ -0,0 +1,285 @@
+import importlib
+import sys
+import threading
+import time
+from datetime import date
+from unittest import mock
+
+import numpy as np
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import MinMaxScaler, StandardScaler
+from sklearn.tree import DecisionTreeClassifier
+
+from patients.models import Patient
+
+from . import model_registry, views
+from .heart import FEATURE_NAMES, PARITY_TOLERANCE, HeartPredictor, feature_grid, predict_heart_disease
+from .model_registry import ModelRegistry
+from .models import HeartDiseasePrediction
+from .serializers import HeartDiseasePredictionBatchSerializer
+
+User = get_user_model()
+
+
+def create_user(username, user_type, **fields):
+    return User.objects.create_user(
+        username=username, email=f'{username}@example.com', password='pass',
+        first_name='Test', last_name=username.title(), user_type=user_type, **fields
+    )
+
+
+class ModelWarmUpTests(APITestCase):
+    """The readiness probe follows the warm-up of the ML_WARMUP_MODELS"""
+
+    def setUp(self):
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+        self.registry = ModelRegistry()
+        self.registry.register('slow', self.release.wait)
+        for module in (model_registry, views):
+            patcher = mock.patch.object(module, 'registry', self.registry)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def readiness(self):
+        response = self.client.get(reverse('health_predictions:model-readiness'))
+        return response.status_code, response.data['ready'], response.data['warming']
+
+    @override_settings(ML_WARMUP_MODELS=['slow'])
+    def test_warming_then_ready(self):
+        self.assertEqual(self.readiness(), (503, False, False))
+
+        thread = model_registry.start_warm_up()
+        deadline = time.monotonic() + 5
+        while not self.registry.status()['slow']['loading'] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.readiness(), (503, False, True))
+
+        self.release.set()
+        thread.join(timeout=5)
+        self.assertEqual(self.readiness(), (200, True, False))
+
+    @override_settings(ML_WARMUP_MODELS=[])
+    def test_nothing_to_warm_up(self):
+        self.assertIsNone(model_registry.start_warm_up())
+
+
+class WarmUpEntryPointTests(SimpleTestCase):
+    """Only the WSGI/ASGI entry points warm up the models"""
+
+    def test_not_started_by_app_loading(self):
+        self.assertNotIn('model-warm-up', [thread.name for thread in threading.enumerate()])
+
+    def test_started_by_wsgi_and_asgi(self):
+        for name in ('medical_platform.wsgi', 'medical_platform.asgi'):
+            sys.modules.pop(name, None)
+            with self.subTest(name), mock.patch.object(model_registry, 'start_warm_up') as start_warm_up:
+                importlib.import_module(name)
+            start_warm_up.assert_called_once_with()
+
+
+class PredictionMetricsAccessTests(APITestCase):
+    """The metrics need METRICS_TOKEN or admin credentials, outside DEBUG"""
+
+    def metrics(self, authorization=None):
+        headers = {'HTTP_AUTHORIZATION': authorization} if authorization else {}
+        return self.client.get(reverse('health_predictions:prediction-metrics'), **headers).status_code
+
+    def bearer(self, user):
+        return f'Bearer {RefreshToken.for_user(user).access_token}'
+
+    @override_settings(METRICS_TOKEN='', DEBUG=False)
+    def test_no_token_configured(self):
+        self.assertEqual(self.metrics(), 403)
+        self.assertEqual(self.metrics('Bearer '), 403)
+        self.assertEqual(self.metrics(self.bearer(create_user('patient', 'patient'))), 403)
+        self.assertEqual(self.metrics(self.bearer(create_user('admin', 'admin'))), 200)
+        self.assertEqual(self.metrics(self.bearer(create_user('staff', 'doctor', is_staff=True))), 200)
+
+    @override_settings(METRICS_TOKEN='', DEBUG=True)
+    def test_open_in_debug(self):
+        self.assertEqual(self.metrics(), 200)
+
+    @override_settings(METRICS_TOKEN='s3cret', DEBUG=True)
+    def test_token(self):
+        self.assertEqual(self.metrics(), 403)
+        self.assertEqual(self.metrics('Bearer wrong'), 403)
+        self.assertEqual(self.metrics('Bearer s3cret'), 200)
+        self.assertEqual(self.metrics(self.bearer(create_user('admin', 'admin'))), 200)
+
+
+FEATURES = {
+    'age': 54, 'sex': 1, 'cp': 0, 'trestbps': 130, 'chol': 246, 'fbs': 0, 'restecg': 1,
+    'thalach': 150, 'exang': 0, 'oldpeak': 1.0, 'slope': 1, 'ca': 0, 'thal': 3,
+}
+
+
+class FakeHeartModel:
+    """Predicts disease for rows with a high cholesterol"""
+
+    def predict(self, features):
+        predictions = (features[:, FEATURE_NAMES.index('chol')] > 300).astype(int)
+        return predictions, np.full(len(features), 0.9)
+
+
+class PredictBatchTests(APITestCase):
+    """predict_batch validates every row before running the model once"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = create_user('doctor', 'doctor')
+        cls.followed = create_user('followed', 'patient')
+        cls.other = create_user('other', 'patient')
+        Patient.objects.create(
+            first_name='Test', last_name='Followed', email=cls.followed.email, phone='0612345678',
+            date_of_birth=date(1970, 1, 1), gender='M', address='Tunis', doctor=cls.doctor,
+            emergency_contact_name='Contact', emergency_contact_phone='0612345679',
+            emergency_contact_relation='Frère'
+        )
+
+    def setUp(self):
+        self.client.force_authenticate(self.doctor)
+        patcher = mock.patch.object(views, 'get_heart_model', return_value=FakeHeartModel())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def predict_batch(self, data, format='json'):
+        return self.client.post(reverse('health_predictions:prediction-predict-batch'), data, format=format)
+
+    def rows(self, count=1, patient=None, **features):
+        return [{'patient': (patient or self.followed).id, **FEATURES, **features} for _ in range(count)]
+
+    def csv_file(self, text):
+        return SimpleUploadedFile('cohort.csv', text.encode() if isinstance(text, str) else text, 'text/csv')
+
+    def test_json(self):
+        response = self.predict_batch({'rows': self.rows(2) + self.rows(chol=320)})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['summary'], {'total': 3, 'disease_present': 1, 'no_disease': 2})
+        self.assertEqual(
+            [row['prediction'] for row in response.data['predictions']], [0, 0, 1]
+        )
+        self.assertEqual(HeartDiseasePrediction.objects.filter(patient=self.followed).count(), 3)
+
+    def test_csv(self):
+        header = ['patient', *FEATURE_NAMES]
+        lines = [','.join(header)] + [
+            ','.join(str(row[name]) for name in header) for row in self.rows(2, chol=310)
+        ]
+        response = self.predict_batch({'file': self.csv_file('\n'.join(lines))}, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['summary']['disease_present'], 2)
+
+    def test_patient_screens_themselves(self):
+        self.client.force_authenticate(self.other)
+        rows = [{**FEATURES} for _ in range(2)]
+        response = self.predict_batch({'rows': rows})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(HeartDiseasePrediction.objects.filter(patient=self.other).count(), 2)
+
+    def test_malformed_csv(self):
+        for content in (b'\xff\xfeage,sex\n\x00\x81', 'age,sex\n54,1\n', 'patient,age\n1,"54'):
+            with self.subTest(content=content):
+                response = self.predict_batch({'file': self.csv_file(content)}, format='multipart')
+                self.assertEqual(response.status_code, 400)
+        self.assertFalse(HeartDiseasePrediction.objects.exists())
+
+    def test_invalid_patients(self):
+        missing = [{**FEATURES}]
+        unknown = self.rows(patient=self.followed) + [{**FEATURES, 'patient': 999999}]
+        not_followed = self.rows(patient=self.followed) + self.rows(patient=self.other)
+        for rows in (missing, unknown, not_followed):
+            response = self.predict_batch({'rows': rows})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('rows', response.data)
+        self.assertFalse(HeartDiseasePrediction.objects.exists())
+
+    def test_batch_size(self):
+        self.assertEqual(self.predict_batch({'rows': []}).status_code, 400)
+        with mock.patch.object(HeartDiseasePredictionBatchSerializer, 'MAX_ROWS', 3):
+            self.assertEqual(self.predict_batch({'rows': self.rows(3)}).status_code, 201)
+            self.assertEqual(self.predict_batch({'rows': self.rows(4)}).status_code, 400)
+
+    def test_model_unavailable(self):
+        with mock.patch.object(views, 'get_heart_model', return_value=None):
+            self.assertEqual(self.predict_batch({'rows': self.rows()}).status_code, 503)
+
+
+def train(model, rows=400, seed=0):
+    """Fit a classifier on sampled features with a made-up label"""
+    features = feature_grid(sample=rows, seed=seed)
+    columns = {name: features[:, index] for index, name in enumerate(FEATURE_NAMES)}
+    labels = ((columns['chol'] > 300) ^ (columns['thalach'] < 120) | (columns['cp'] == 3)).astype(int)
+    return model.fit(features, labels)
+
+
+class HeartPredictorTests(SimpleTestCase):
+    """The compiled evaluator and the prediction cache give scikit-learn's results"""
+
+    def models(self):
+        return {
+            'logistic_regression': train(make_pipeline(StandardScaler(), LogisticRegression(max_iter=1000))),
+            'min_max_logistic_regression': train(make_pipeline(MinMaxScaler(), LogisticRegression(max_iter=1000))),
+            'decision_tree': train(DecisionTreeClassifier(max_depth=6, random_state=0)),
+            'random_forest': train(RandomForestClassifier(n_estimators=20, max_depth=6, random_state=0)),
+        }
+
+    def test_compiled_matches_predict_proba(self):
+        features = feature_grid(sample=1000, seed=1)
+        for name, model in self.models().items():
+            with self.subTest(name):
+                predictor = HeartPredictor(model, cache_size=0)
+                self.assertIsNotNone(predictor.compiled)
+                self.assertTrue(predictor.stats()['evaluator'].startswith('compiled_'))
+                np.testing.assert_allclose(
+                    predictor.compiled.predict_proba(features), model.predict_proba(features),
+                    rtol=0, atol=PARITY_TOLERANCE
+                )
+                predictions, confidences = predictor.predict(features)
+                expected_predictions, expected_confidences = predict_heart_disease(model, features)
+                np.testing.assert_array_equal(predictions, expected_predictions)
+                np.testing.assert_allclose(confidences, expected_confidences, rtol=0, atol=PARITY_TOLERANCE)
+
+    def test_unsupported_model(self):
+        model = train(KNeighborsClassifier())
+        predictor = HeartPredictor(model, cache_size=0)
+        self.assertIsNone(predictor.compiled)
+        features = feature_grid(sample=50, seed=1)
+        np.testing.assert_array_equal(predictor.predict(features)[0], predict_heart_disease(model, features)[0])
+
+    def test_cache_hit(self):
+        predictor = HeartPredictor(train(LogisticRegression(max_iter=1000)), cache_size=100)
+        features = feature_grid(sample=3, seed=2)
+        first = predictor.predict(features)
+
+        with mock.patch.object(predictor, '_predict_uncached') as predict_uncached:
+            again = predictor.predict(features[[1, 1, 0]])
+        predict_uncached.assert_not_called()
+        np.testing.assert_array_equal(again[0], first[0][[1, 1, 0]])
+        np.testing.assert_array_equal(again[1], first[1][[1, 1, 0]])
+        self.assertEqual(
+            {key: predictor.stats()['cache'][key] for key in ('size', 'hits', 'misses')},
+            {'size': 3, 'hits': 2, 'misses': 3}
+        )
+
+    def test_cache_eviction(self):
+        predictor = HeartPredictor(train(LogisticRegression(max_iter=1000)), cache_size=2)
+        features = feature_grid(sample=3, seed=2)
+        for row in (0, 1, 0, 2):
+            predictor.predict(features[[row]])
+        # Row 1 was the least recently used
+        with mock.patch.object(predictor, '_predict_uncached', wraps=predictor._predict_uncached) as predict_uncached:
+            predictor.predict(features[[0, 2]])
+            predict_uncached.assert_not_called()
+            predictor.predict(features[[1]])
+            predict_uncached.assert_called_once()
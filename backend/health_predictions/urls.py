@@ -7,8 +7,11 @@ app_name = 'health_predictions'
 router = DefaultRouter()
 router.register(r'predictions', views.HeartDiseasePredictionViewSet, basename='prediction')
 router.register(r'segmentation', views.BrainTumorSegmentationViewSet, basename='segmentation')
+router.register(r'segmentation-jobs', views.SegmentationJobViewSet, basename='segmentation-job')
 
 urlpatterns = [
+    path('ready/', views.model_readiness, name='model-readiness'),
+    path('metrics/', views.prediction_metrics, name='prediction-metrics'),
     path('', include(router.urls)),
 ]
 
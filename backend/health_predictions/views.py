@@ -1,105 +1,156 @@
-import joblib
 from rest_framework import viewsets, status
-from rest_framework.decorators import action
+from rest_framework.decorators import action, api_view, authentication_classes, permission_classes
+from rest_framework.exceptions import AuthenticationFailed, NotFound
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
 from django.conf import settings
-import os
-import warnings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.http import HttpResponse
+from django.urls import reverse
+import base64
+import csv
+import hmac
+import io
+import logging
 import time
 
-from .models import HeartDiseasePrediction
-from .serializers import HeartDiseasePredictionSerializer, HeartDiseasePredictionInputSerializer
-from .image_utils import process_image_for_model, postprocess_segmentation, create_comparison_image, image_to_base64
+from .models import HeartDiseasePrediction, SegmentationResult, SegmentationJob
+from .serializers import (
+    HeartDiseasePredictionSerializer,
+    HeartDiseasePredictionInputSerializer,
+    HeartDiseasePredictionBatchSerializer,
+    SegmentationJobSerializer,
+)
+from .heart import FEATURE_NAMES, features_to_matrix
+from .model_registry import registry, get_heart_model, get_brain_tumor_model
+from . import cpu_pool
+from .image_utils import image_to_base64, render_comparison_png
+from .mask_encoding import binarize, encode_rle, encode_bitpacked
+from .metrics import StageTimer, metrics, timed_call
+from .renderers import PNGRenderer
+from .segmentation_results import load_result_images, read_result_file
+from .segmentation import (
+    BRAIN_TUMOR_CONFIG,
+    ALLOWED_IMAGE_EXTENSIONS,
+    get_segmentation_batcher,
+    segment_image,
+)
+from .jobs import enqueue_job, cancel_job
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
+logger = logging.getLogger(__name__)
 
-# Try to import pandas for heart disease prediction
-try:
-    import pandas as pd
-    PANDAS_AVAILABLE = True
-except ImportError:
-    print("Warning: Pandas not available. Heart disease prediction will not work.")
-    PANDAS_AVAILABLE = False
+MASK_FORMATS = ('png', 'rle', 'bitpacked')
 
-# Try to import numpy for heart disease prediction
-try:
-    import numpy as np
-    NUMPY_AVAILABLE = True
-except ImportError:
-    print("Warning: NumPy not available. Heart disease prediction will not work.")
-    NUMPY_AVAILABLE = False
 
-# Try to import tensorflow for brain tumor segmentation
-try:
-    import tensorflow as tf
-    TENSORFLOW_AVAILABLE = True
-    print("✓ TensorFlow imported successfully")
-except ImportError as e:
-    print(f"✗ TensorFlow import failed: {e}")
-    TENSORFLOW_AVAILABLE = False
+def encode_mask(segmentation_mask, mask_format):
+    """Encode a uint8 segmentation mask for a JSON response"""
+    if mask_format == 'rle':
+        return encode_rle(binarize(segmentation_mask))
+    if mask_format == 'bitpacked':
+        return encode_bitpacked(binarize(segmentation_mask))
+    return image_to_base64(segmentation_mask)
 
-# Load the pre-trained heart disease model
-MODEL_PATH = os.path.join(settings.BASE_DIR, 'models', 'heart_dicease_2.pkl')
-try:
-    heart_model = joblib.load(MODEL_PATH) if (NUMPY_AVAILABLE and PANDAS_AVAILABLE) else None
-except Exception as e:
-    print(f"Warning: Could not load heart disease model at {MODEL_PATH}: {e}")
-    heart_model = None
 
-# Load the pre-trained brain tumor segmentation model
-BRAIN_TUMOR_MODEL_PATH = os.path.join(settings.BASE_DIR, 'models', 'model.keras')
-brain_tumor_model = None
+def get_segmentation_options(request):
+    """
+    Read the segmentation response options from the query string.
+    
+    Returns:
+        Tuple (options, error_response); options is None when invalid
+    """
+    mask_format = request.query_params.get('mask_format', 'png').lower()
+    if mask_format not in MASK_FORMATS:
+        return None, Response(
+            {"error": f"Invalid mask_format. Allowed values: {', '.join(MASK_FORMATS)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    return {
+        'mask_format': mask_format,
+        'include_original': request.query_params.get('include_original', 'true').lower() == 'true',
+        'include_comparison': request.query_params.get('include_comparison', 'true').lower() == 'true',
+    }, None
 
-print(f"\n=== Brain Tumor Model Loading ===")
-print(f"TensorFlow Available: {TENSORFLOW_AVAILABLE}")
-print(f"Model Path: {BRAIN_TUMOR_MODEL_PATH}")
-print(f"Model Exists: {os.path.exists(BRAIN_TUMOR_MODEL_PATH)}")
 
-try:
-    if TENSORFLOW_AVAILABLE and os.path.exists(BRAIN_TUMOR_MODEL_PATH):
-        print(f"Attempting to load model from {BRAIN_TUMOR_MODEL_PATH}...")
-        # Try loading with custom_objects for dice loss/coef if the model was trained with them
-        try:
-            brain_tumor_model = tf.keras.models.load_model(
-                BRAIN_TUMOR_MODEL_PATH,
-                custom_objects={
-                    'dice_loss': lambda y_true, y_pred: y_true,  # Placeholder
-                    'dice_coef': lambda y_true, y_pred: y_true,  # Placeholder
-                }
-            )
-        except Exception as custom_obj_error:
-            print(f"Loading with custom objects failed ({custom_obj_error}), trying standard load...")
-            brain_tumor_model = tf.keras.models.load_model(BRAIN_TUMOR_MODEL_PATH)
-        
-        if brain_tumor_model is not None:
-            print(f"✓ Brain tumor model loaded successfully!")
-            print(f"  Model input shape: {brain_tumor_model.input_shape}")
-            print(f"  Model output shape: {brain_tumor_model.output_shape}")
-        else:
-            print(f"✗ Model loaded but is None")
-    else:
-        brain_tumor_model = None
-        if not TENSORFLOW_AVAILABLE:
-            print("✗ TensorFlow not available. Brain tumor segmentation will not work.")
-        else:
-            print(f"✗ Brain tumor model not found at {BRAIN_TUMOR_MODEL_PATH}")
-except Exception as e:
-    print(f"✗ Error loading brain tumor model: {type(e).__name__}: {e}")
-    import traceback
-    print(traceback.format_exc())
-    brain_tumor_model = None
+def get_uploaded_image(request):
+    """
+    Return the uploaded MRI image after checking model availability and file type.
+    
+    Returns:
+        Tuple (image_file, error_response)
+    """
+    if get_brain_tumor_model() is None:
+        return None, Response(
+            {"error": "Brain tumor segmentation model not available"},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+    
+    # Check if image file is provided
+    if 'image' not in request.FILES:
+        return None, Response(
+            {"error": "No image file provided. Please upload an image file."},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    image_file = request.FILES['image']
+    
+    # Validate file type
+    file_ext = image_file.name.split('.')[-1].lower()
+    if file_ext not in ALLOWED_IMAGE_EXTENSIONS:
+        return None, Response(
+            {"error": f"Invalid file type. Allowed types: {', '.join(ALLOWED_IMAGE_EXTENSIONS)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    return image_file, None
 
-print(f"=== Loading Complete ===\n")
 
-# Model configuration for brain tumor segmentation
-BRAIN_TUMOR_CONFIG = {
-    "image_size": 256,
-    "num_channels": 3,
-    "patch_size": 16,
-}
+def segmentation_payload(request, result, options, original_image=None, segmentation_mask=None):
+    """
+    JSON representation of a segmentation result.
+    
+    Args:
+        request: Current request (for absolute URLs)
+        result: SegmentationResult
+        options: Options from get_segmentation_options
+        original_image, segmentation_mask: Arrays when they are already in
+            memory; otherwise they are read back from storage if needed
+    """
+    timer = StageTimer()
+    if segmentation_mask is None and (options['mask_format'] != 'png' or options['include_comparison']):
+        with timer.stage('load'):
+            original_image, segmentation_mask = load_result_images(result)
+    
+    if options['mask_format'] == 'png':
+        # The stored PNG is served as-is
+        mask_data = base64.b64encode(read_result_file(result.segmentation_mask)).decode('utf-8')
+    else:
+        with timer.stage('encode'):
+            mask_data = encode_mask(segmentation_mask, options['mask_format'])
+    
+    data = {
+        "result_id": result.key,
+        "mask_format": options['mask_format'],
+        "segmentation_mask": mask_data,
+        "comparison_url": request.build_absolute_uri(
+            reverse('health_predictions:segmentation-comparison', args=[result.key])
+        ),
+        "image_size": BRAIN_TUMOR_CONFIG["image_size"]
+    }
+    if options['include_original']:
+        data["original_image"] = base64.b64encode(read_result_file(result.original_image)).decode('utf-8')
+    if options['include_comparison']:
+        comparison_png, durations = cpu_pool.run(
+            timed_call, render_comparison_png, original_image, segmentation_mask, BRAIN_TUMOR_CONFIG
+        )
+        timer.update(durations)
+        data["comparison_image"] = base64.b64encode(comparison_png).decode('utf-8')
+    if timer.durations:
+        metrics.record('segmentation_response', timer.durations)
+    return data
 
 
 class HeartDiseasePredictionViewSet(viewsets.ModelViewSet):
@@ -141,95 +192,56 @@ class HeartDiseasePredictionViewSet(viewsets.ModelViewSet):
             "thal": <1, 3, 6, or 7>
         }
         """
-        if heart_model is None or not (NUMPY_AVAILABLE and PANDAS_AVAILABLE):
+        heart_model = get_heart_model()
+        if heart_model is None:
             return Response(
                 {"error": "Model not available"},
                 status=status.HTTP_503_SERVICE_UNAVAILABLE
             )
         
+        start_time = time.perf_counter()
+        timer = StageTimer()
+        
         # Validate input data
-        input_serializer = HeartDiseasePredictionInputSerializer(data=request.data)
-        if not input_serializer.is_valid():
+        with timer.stage('validate'):
+            input_serializer = HeartDiseasePredictionInputSerializer(data=request.data)
+            valid = input_serializer.is_valid()
+        if not valid:
             return Response(input_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
         validated_data = input_serializer.validated_data
         
-        # Prepare features as a DataFrame with proper column names
-        # Feature names must match what the model was trained with
-        feature_names = ['age', 'sex', 'cp', 'trestbps', 'chol', 'fbs', 'restecg', 
-                         'thalach', 'exang', 'oldpeak', 'slope', 'ca', 'thal']
-        
-        features_dict = {
-            'age': [validated_data['age']],
-            'sex': [validated_data['sex']],
-            'cp': [validated_data['cp']],
-            'trestbps': [validated_data['trestbps']],
-            'chol': [validated_data['chol']],
-            'fbs': [validated_data['fbs']],
-            'restecg': [validated_data['restecg']],
-            'thalach': [validated_data['thalach']],
-            'exang': [validated_data['exang']],
-            'oldpeak': [validated_data['oldpeak']],
-            'slope': [validated_data['slope']],
-            'ca': [validated_data['ca']],
-            'thal': [validated_data['thal']]
-        }
-        
-        # Create DataFrame with feature names
-        features_df = pd.DataFrame(features_dict)
-        
         try:
-            # Suppress the sklearn warning about feature names
-            with warnings.catch_warnings():
-                warnings.simplefilter("ignore")
-                # Make prediction - pass as numpy array in correct order
-                features_array = np.array([[
-                    validated_data['age'],
-                    validated_data['sex'],
-                    validated_data['cp'],
-                    validated_data['trestbps'],
-                    validated_data['chol'],
-                    validated_data['fbs'],
-                    validated_data['restecg'],
-                    validated_data['thalach'],
-                    validated_data['exang'],
-                    validated_data['oldpeak'],
-                    validated_data['slope'],
-                    validated_data['ca'],
-                    validated_data['thal']
-                ]], dtype=np.float64)
-                
-                prediction_result = heart_model.predict(features_array)
-                prediction = int(prediction_result[0])
-                
-                # Get prediction probability
-                if hasattr(heart_model, 'predict_proba'):
-                    proba = heart_model.predict_proba(features_array)[0]
-                    # proba[0] = probability of class 0 (no disease)
-                    # proba[1] = probability of class 1 (disease)
-                    confidence = float(proba[prediction])
-                else:
-                    confidence = 1.0 if prediction == 1 else 0.0
+            with timer.stage('features'):
+                features = features_to_matrix([validated_data])
+            with timer.stage('predict'):
+                predictions, confidences = heart_model.predict(features)
+            prediction = int(predictions[0])
+            confidence = float(confidences[0])
             
             # Save prediction to database
-            heart_prediction = HeartDiseasePrediction.objects.create(
-                patient=request.user,
-                age=validated_data['age'],
-                sex=validated_data['sex'],
-                cp=validated_data['cp'],
-                trestbps=validated_data['trestbps'],
-                chol=validated_data['chol'],
-                fbs=validated_data['fbs'],
-                restecg=validated_data['restecg'],
-                thalach=validated_data['thalach'],
-                exang=validated_data['exang'],
-                oldpeak=validated_data['oldpeak'],
-                slope=validated_data['slope'],
-                ca=validated_data['ca'],
-                thal=validated_data['thal'],
-                prediction=prediction,
-                confidence=confidence
-            )
+            with timer.stage('save'):
+                heart_prediction = HeartDiseasePrediction.objects.create(
+                    patient=request.user,
+                    age=validated_data['age'],
+                    sex=validated_data['sex'],
+                    cp=validated_data['cp'],
+                    trestbps=validated_data['trestbps'],
+                    chol=validated_data['chol'],
+                    fbs=validated_data['fbs'],
+                    restecg=validated_data['restecg'],
+                    thalach=validated_data['thalach'],
+                    exang=validated_data['exang'],
+                    oldpeak=validated_data['oldpeak'],
+                    slope=validated_data['slope'],
+                    ca=validated_data['ca'],
+                    thal=validated_data['thal'],
+                    prediction=prediction,
+                    confidence=confidence
+                )
+            
+            timer.add('total', time.perf_counter() - start_time)
+            metrics.record('heart', timer.durations)
             
             # Serialize and return the result
             serializer = HeartDiseasePredictionSerializer(heart_prediction)
@@ -245,6 +257,136 @@ class HeartDiseasePredictionViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
     
+    @action(detail=False, methods=['post'])
+    def predict_batch(self, request):
+        """
+        Make predictions for a whole cohort in one request.
+        
+        Expected payload, either JSON:
+        {
+            "rows": [
+                {"patient": <int>, "age": <int>, ..., "thal": <1, 3, 6, or 7>},
+                ...
+            ]
+        }
+        or multipart/form-data with a 'file' field containing a CSV file whose
+        header holds the 13 feature names (and a 'patient' column).
+        
+        Patients can only submit rows for themselves; doctors and admins must
+        give the patient of every row, and doctors can only name the patients
+        they follow (see HeartDiseasePredictionBatchSerializer). All rows are validated before anything
+        is predicted, and the model runs once over the whole matrix.
+        """
+        heart_model = get_heart_model()
+        if heart_model is None:
+            return Response(
+                {"error": "Model not available"},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+        
+        start_time = time.perf_counter()
+        timer = StageTimer()
+        
+        if 'file' in request.FILES:
+            try:
+                with timer.stage('parse'):
+                    rows = self._read_csv_rows(request.FILES['file'])
+            except (UnicodeDecodeError, csv.Error) as e:
+                return Response(
+                    {"error": f"Invalid CSV file: {str(e)}"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        else:
+            rows = request.data.get('rows')
+        
+        with timer.stage('validate'):
+            input_serializer = HeartDiseasePredictionBatchSerializer(
+                data={'rows': rows},
+                context={'request': request}
+            )
+            valid = input_serializer.is_valid()
+        if not valid:
+            return Response(input_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        rows = input_serializer.validated_data['rows']
+        
+        try:
+            with timer.stage('features'):
+                features = features_to_matrix(rows)
+            with timer.stage('predict'):
+                predictions, confidences = heart_model.predict(features)
+            
+            with timer.stage('save'):
+                heart_predictions = HeartDiseasePrediction.objects.bulk_create([
+                    HeartDiseasePrediction(
+                        patient=row['patient'],
+                        prediction=int(prediction),
+                        confidence=float(confidence),
+                        **{name: row[name] for name in FEATURE_NAMES}
+                    )
+                    for row, prediction, confidence in zip(rows, predictions, confidences)
+                ], batch_size=500)
+        except Exception as e:
+            return Response(
+                {"error": f"Prediction failed: {str(e)}"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+        
+        timer.add('total', time.perf_counter() - start_time)
+        metrics.record('heart_batch', timer.durations)
+        
+        positives = int(predictions.sum())
+        return Response({
+            "success": True,
+            "message": "Predictions completed successfully",
+            "summary": {
+                "total": len(heart_predictions),
+                "disease_present": positives,
+                "no_disease": len(heart_predictions) - positives,
+            },
+            # bulk_create only sets primary keys on backends that return them
+            "predictions": [
+                {
+                    "id": heart_prediction.id,
+                    "patient": heart_prediction.patient_id,
+                    "prediction": heart_prediction.prediction,
+                    "confidence": heart_prediction.confidence,
+                }
+                for heart_prediction in heart_predictions
+            ]
+        }, status=status.HTTP_201_CREATED)
+    
+    @action(detail=False, methods=['get'])
+    def serving_stats(self, request):
+        """Evaluator in use and prediction cache hit rate (admin only)"""
+        if request.user.user_type != 'admin':
+            return Response(
+                {"error": "Only admins can view serving statistics"},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        heart_model = get_heart_model()
+        if heart_model is None:
+            return Response(
+                {"error": "Model not available"},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+        return Response(heart_model.stats())
+    
+    @staticmethod
+    def _read_csv_rows(csv_file):
+        """Read an uploaded CSV file into a list of row dictionaries"""
+        text = io.TextIOWrapper(csv_file, encoding='utf-8-sig')
+        rows = []
+        for row in csv.DictReader(text):
+            # Drop empty cells so optional columns (patient) stay optional
+            rows.append({
+                key.strip(): value.strip()
+                for key, value in row.items()
+                if key and value not in (None, '')
+            })
+        return rows
+    
     @action(detail=False, methods=['get'])
     def my_predictions(self, request):
         """Get all predictions for the current patient"""
@@ -257,6 +399,7 @@ class BrainTumorSegmentationViewSet(viewsets.ViewSet):
     """ViewSet for brain tumor segmentation from RMI/MRI images"""
     permission_classes = [IsAuthenticated]
     parser_classes = (MultiPartParser, FormParser)
+    renderer_classes = [JSONRenderer, PNGRenderer]
     
     @action(detail=False, methods=['post'])
     def segment(self, request):
@@ -266,81 +409,61 @@ class BrainTumorSegmentationViewSet(viewsets.ViewSet):
         Expected request:
         - multipart/form-data with 'image' field containing the MRI image file
         
+        Query parameters (JSON responses):
+        - mask_format: png (default, base64 PNG), rle or bitpacked (thresholded
+          binary mask, see mask_encoding.py)
+        - include_original: false to leave out the resized original image
+        - include_comparison: false to leave out the comparison image; it can
+          be fetched later from comparison_url
+        
+        Clients sending "Accept: image/png" (or ?format=png) receive the mask
+        as a raw PNG instead, with the result id and timing in headers.
+        
+        Results are stored per image content and model version; uploading the
+        same image again returns the stored result without running the model.
+        
         Returns:
-        - segmentation_mask: Base64 encoded segmentation result
-        - comparison_image: Base64 encoded side-by-side comparison
+        - result_id: Content key of the stored result
+        - cached: Whether the result was served from storage
+        - segmentation_mask: Segmentation result in the requested format
+        - original_image: Base64 encoded resized original (optional)
+        - comparison_image: Base64 encoded side-by-side comparison (optional)
+        - comparison_url: URL rendering the comparison on demand
         - processing_time: Time taken for segmentation
         """
-        if brain_tumor_model is None or not TENSORFLOW_AVAILABLE:
-            return Response(
-                {"error": "Brain tumor segmentation model not available"},
-                status=status.HTTP_503_SERVICE_UNAVAILABLE
-            )
-        
-        # Check if image file is provided
-        if 'image' not in request.FILES:
-            return Response(
-                {"error": "No image file provided. Please upload an image file."},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        image_file = request.FILES['image']
+        options, error_response = get_segmentation_options(request)
+        if error_response is not None:
+            return error_response
         
-        # Validate file type
-        allowed_extensions = ['jpg', 'jpeg', 'png', 'bmp', 'gif']
-        file_ext = image_file.name.split('.')[-1].lower()
-        if file_ext not in allowed_extensions:
-            return Response(
-                {"error": f"Invalid file type. Allowed types: {', '.join(allowed_extensions)}"},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        image_file, error_response = get_uploaded_image(request)
+        if error_response is not None:
+            return error_response
         
         try:
             start_time = time.time()
             
-            # Process image - simple resize and normalize
-            processed_image, original_image_resized = process_image_for_model(
-                image_file, 
-                BRAIN_TUMOR_CONFIG
-            )
-            
-            # Run segmentation
-            prediction = brain_tumor_model.predict(processed_image, verbose=0)
-            
-            # Debug: Log prediction statistics
-            pred_min = float(np.min(prediction))
-            pred_max = float(np.max(prediction))
-            pred_mean = float(np.mean(prediction))
-            print(f"Prediction statistics: min={pred_min:.4f}, max={pred_max:.4f}, mean={pred_mean:.4f}")
-            
-            # Postprocess segmentation
-            segmentation_mask = postprocess_segmentation(
-                prediction, 
-                BRAIN_TUMOR_CONFIG
-            )
-            
-            # Create comparison image
-            comparison_image = create_comparison_image(
-                original_image_resized, 
-                segmentation_mask, 
-                BRAIN_TUMOR_CONFIG
+            result, cached, original_image_resized, segmentation_mask = segment_image(
+                image_file.read(),
+                user=request.user
             )
             
-            # Convert images to base64 for JSON response
-            mask_base64 = image_to_base64(segmentation_mask)
-            comparison_base64 = image_to_base64(comparison_image)
-            original_base64 = image_to_base64(original_image_resized)
-            
-            processing_time = time.time() - start_time
+            if request.accepted_renderer.format == 'png':
+                comparison_url = request.build_absolute_uri(
+                    reverse('health_predictions:segmentation-comparison', args=[result.key])
+                )
+                return Response(read_result_file(result.segmentation_mask), headers={
+                    'X-Segmentation-Id': result.key,
+                    'X-Segmentation-Cached': 'true' if cached else 'false',
+                    'X-Processing-Time': f"{time.time() - start_time:.2f}",
+                    'Link': f'<{comparison_url}>; rel="comparison"',
+                })
             
             return Response({
                 "success": True,
                 "message": "Segmentation completed successfully",
-                "original_image": original_base64,
-                "segmentation_mask": mask_base64,
-                "comparison_image": comparison_base64,
-                "processing_time": round(processing_time, 2),
-                "image_size": BRAIN_TUMOR_CONFIG["image_size"]
+                "cached": cached,
+                **segmentation_payload(request, result, options, original_image_resized, segmentation_mask),
+                "processing_time": round(time.time() - start_time, 2)
             }, status=status.HTTP_200_OK)
         
         except ValueError as e:
@@ -349,14 +472,203 @@ class BrainTumorSegmentationViewSet(viewsets.ViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         except Exception as e:
-            import traceback
-            print(f"Segmentation error: {traceback.format_exc()}")
+            logger.exception("Segmentation failed")
             return Response(
                 {"error": f"Segmentation failed: {str(e)}"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+    
+    @action(detail=True, methods=['get'], renderer_classes=[PNGRenderer, JSONRenderer])
+    def comparison(self, request, pk=None):
+        """
+        Side-by-side comparison (original | mask) of a segmentation result.
+        
+        Rendered on demand from the stored result; returned as a PNG image, or
+        as base64 in JSON for clients that only accept application/json.
+        """
+        result = SegmentationResult.objects.filter(key=pk).first()
+        if result is None:
+            return Response(
+                {"error": "Segmentation result not found"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        timer = StageTimer()
+        with timer.stage('load'):
+            original_image, segmentation_mask = load_result_images(result)
+        comparison_png, durations = cpu_pool.run(
+            timed_call, render_comparison_png, original_image, segmentation_mask, BRAIN_TUMOR_CONFIG
+        )
+        timer.update(durations)
+        metrics.record('segmentation_response', timer.durations)
+        if request.accepted_renderer.format == 'png':
+            return Response(comparison_png)
+        return Response({"comparison_image": base64.b64encode(comparison_png).decode('utf-8')})
+    
+    @action(detail=False, methods=['get'])
+    def batching_stats(self, request):
+        """Batch-size and queue-latency metrics of the segmentation micro-batcher (admin only)"""
+        if request.user.user_type != 'admin':
+            return Response(
+                {"error": "Only admins can view batching statistics"},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        return Response({
+            "enabled": settings.SEGMENTATION_BATCHING,
+            **get_segmentation_batcher().stats()
+        })
 
 
 
+class SegmentationJobViewSet(viewsets.ViewSet):
+    """
+    Asynchronous brain tumor segmentation.
+    
+    POST enqueues a job and returns immediately with its id; GET on the job
+    reports status and progress, and includes the result (same shape and
+    query parameters as segment) once completed.
+    """
+    permission_classes = [IsAuthenticated]
+    parser_classes = (MultiPartParser, FormParser)
+    
+    def get_queryset(self):
+        """Users only see their own jobs; admins see all"""
+        user = self.request.user
+        jobs = SegmentationJob.objects.select_related('result')
+        if user.user_type == 'admin':
+            return jobs
+        return jobs.filter(created_by=user)
+    
+    def get_job(self, pk):
+        try:
+            return self.get_queryset().get(pk=pk)
+        except (SegmentationJob.DoesNotExist, DjangoValidationError):
+            raise NotFound("Segmentation job not found")
+    
+    def list(self, request):
+        """Most recent jobs of the current user"""
+        jobs = self.get_queryset()[:50]
+        return Response(SegmentationJobSerializer(jobs, many=True).data)
+    
+    def create(self, request):
+        """Enqueue a segmentation job for the uploaded 'image' file"""
+        image_file, error_response = get_uploaded_image(request)
+        if error_response is not None:
+            return error_response
+        
+        job = SegmentationJob.objects.create(created_by=request.user, image=image_file)
+        enqueue_job(job)
+        
+        return Response({
+            **SegmentationJobSerializer(job).data,
+            "status_url": request.build_absolute_uri(
+                reverse('health_predictions:segmentation-job-detail', args=[job.pk])
+            )
+        }, status=status.HTTP_202_ACCEPTED)
+    
+    def retrieve(self, request, pk=None):
+        """Job status and progress, plus the result once completed"""
+        options, error_response = get_segmentation_options(request)
+        if error_response is not None:
+            return error_response
+        
+        job = self.get_job(pk)
+        data = SegmentationJobSerializer(job).data
+        if job.status == 'completed' and job.result is not None:
+            data['result'] = segmentation_payload(request, job.result, options)
+        return Response(data)
+    
+    @action(detail=True, methods=['post'])
+    def cancel(self, request, pk=None):
+        """Cancel a queued or running job"""
+        job = self.get_job(pk)
+        if not cancel_job(job):
+            job.refresh_from_db(fields=['status'])
+            return Response(
+                {"error": f"Job already {job.get_status_display().lower()}"},
+                status=status.HTTP_409_CONFLICT
+            )
+        
+        job.refresh_from_db()
+        return Response(SegmentationJobSerializer(job).data)
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def model_readiness(request):
+    """
+    Readiness probe for the prediction models.
+    
+    Returns 200 once every model listed in ML_WARMUP_MODELS (or in the
+    ?models=heart,brain_tumor query parameter) is loaded, 503 otherwise;
+    warming is true while one of them is being loaded.
+    Models are never loaded by this endpoint.
+    """
+    required = request.GET.get('models')
+    required = required.split(',') if required else settings.ML_WARMUP_MODELS
+    
+    unknown = [name for name in required if name not in registry]
+    if unknown:
+        return Response(
+            {"error": f"Unknown models: {', '.join(unknown)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    models = registry.status()
+    ready = all(models[name]['loaded'] for name in required)
+    warming = any(models[name]['loading'] for name in required)
+    return Response(
+        {"ready": ready, "warming": warming, "required": required, "models": models},
+        status=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE
+    )
 
 
+def metrics_access_allowed(request):
+    """
+    Whether a request may read the prediction metrics.
+    
+    Scrapers send METRICS_TOKEN as a bearer token; admins may also read them
+    with their own credentials. Without a token the metrics are open in DEBUG
+    only.
+    
+    Returns:
+        True if the request is allowed
+    """
+    token = settings.METRICS_TOKEN
+    if token and hmac.compare_digest(request.META.get('HTTP_AUTHORIZATION', ''), f"Bearer {token}"):
+        return True
+    if not token and settings.DEBUG:
+        return True
+    
+    for authenticator in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+        try:
+            user_auth = authenticator().authenticate(request)
+        except AuthenticationFailed:
+            continue
+        if user_auth and (user_auth[0].is_staff or user_auth[0].user_type == 'admin'):
+            return True
+    return False
+
+
+@api_view(['GET'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def prediction_metrics(request):
+    """
+    Stage latency metrics of the prediction pipelines, in the Prometheus text
+    format (see metrics.py).
+    
+    Scrapers must send METRICS_TOKEN as a bearer token
+    ("Authorization: Bearer <token>"); see metrics_access_allowed.
+    """
+    if not metrics_access_allowed(request):
+        return Response(
+            {"error": "Invalid metrics token" if settings.METRICS_TOKEN
+             else "Metrics are restricted to admins until METRICS_TOKEN is set"},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    
+    return HttpResponse(
+        metrics.render_prometheus(),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
@@ -63,6 +63,7 @@ LOCAL_APPS = [
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 
 MIDDLEWARE = [
+    'health_predictions.middleware.RequestIDMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -105,6 +106,122 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# Local memory by default; point CACHE_BACKEND/CACHE_LOCATION at a shared
+# backend (Redis, Memcached, database) when running several workers.
+
+CACHE_BACKEND = config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache')
+
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': config('CACHE_LOCATION', default='medical-platform'),
+    }
+}
+
+if CACHE_BACKEND.endswith('LocMemCache'):
+    # The availability cache stores one entry per doctor and day
+    CACHES['default']['OPTIONS'] = {'MAX_ENTRIES': config('CACHE_MAX_ENTRIES', default=10000, cast=int)}
+
+# Availability cache (see appointments/availability_cache.py). On a local
+# memory backend it is only used when the site runs in a single process
+# (runserver, one worker): invalidations would not reach the other workers
+AVAILABILITY_CACHE_ALIAS = config('AVAILABILITY_CACHE_ALIAS', default='default')
+AVAILABILITY_CACHE_TIMEOUT = config('AVAILABILITY_CACHE_TIMEOUT', default=60 * 60, cast=int)
+AVAILABILITY_CACHE_ALLOW_LOCAL = config('AVAILABILITY_CACHE_ALLOW_LOCAL', default=DEBUG, cast=bool)
+
+# Serve doctor/admin appointment statistics from the AppointmentDailyStats roll-up
+APPOINTMENT_STATS_USE_ROLLUP = config('APPOINTMENT_STATS_USE_ROLLUP', default=False, cast=bool)
+
+# Patient search index backend (see patients/search.py): auto uses SQLite FTS5
+# when available, prefix uses the token table on any database
+PATIENT_SEARCH_BACKEND = config('PATIENT_SEARCH_BACKEND', default='auto')
+
+# Cache of the doctor dashboard patient statistics (see patients/stats.py);
+# 0 disables it
+PATIENT_STATS_CACHE_ALIAS = config('PATIENT_STATS_CACHE_ALIAS', default='default')
+PATIENT_STATS_CACHE_TIMEOUT = config('PATIENT_STATS_CACHE_TIMEOUT', default=60, cast=int)
+
+# Heart disease model serving (see health_predictions/heart.py): evaluate the
+# model from its extracted parameters, and cache predictions by feature vector
+HEART_COMPILED_PREDICTOR = config('HEART_COMPILED_PREDICTOR', default=True, cast=bool)
+HEART_PREDICTION_CACHE_SIZE = config('HEART_PREDICTION_CACHE_SIZE', default=10000, cast=int)
+
+# Brain tumor segmentation micro-batching (see health_predictions/batching.py)
+SEGMENTATION_BATCHING = config('SEGMENTATION_BATCHING', default=True, cast=bool)
+SEGMENTATION_MAX_BATCH_SIZE = config('SEGMENTATION_MAX_BATCH_SIZE', default=8, cast=int)
+SEGMENTATION_MAX_WAIT_MS = config('SEGMENTATION_MAX_WAIT_MS', default=5, cast=float)
+# Brain tumor inference backends in order of preference (see
+# health_predictions/inference_backends.py); the first usable one is served
+BRAIN_TUMOR_BACKENDS = [name for name in config('BRAIN_TUMOR_BACKENDS', default='onnx,tflite,keras').split(',') if name]
+# Intra-op threads for the ONNX Runtime / TFLite backends (0: runtime default)
+BRAIN_TUMOR_INFERENCE_THREADS = config('BRAIN_TUMOR_INFERENCE_THREADS', default=0, cast=int)
+
+# Version recorded with (and keying) stored segmentation results; defaults to
+# the serving backend and a digest of its model file. Values over 64 characters
+# are shortened (see health_predictions/model_registry.py)
+BRAIN_TUMOR_MODEL_VERSION = config('BRAIN_TUMOR_MODEL_VERSION', default='')
+
+# Asynchronous segmentation jobs (see health_predictions/jobs.py): run them on a
+# local thread pool, or leave them to `manage.py process_segmentation_jobs`
+SEGMENTATION_JOBS_IN_PROCESS = config('SEGMENTATION_JOBS_IN_PROCESS', default=True, cast=bool)
+SEGMENTATION_JOB_WORKERS = config('SEGMENTATION_JOB_WORKERS', default=2, cast=int)
+# A running job without progress update for this many seconds is failed: its
+# worker process died
+SEGMENTATION_JOB_STALE_AFTER = config('SEGMENTATION_JOB_STALE_AFTER', default=900, cast=int)
+
+# Pool for the CPU-bound segmentation stages (decode/resize, postprocess, PNG
+# encoding): thread, process or none (see health_predictions/cpu_pool.py)
+SEGMENTATION_CPU_POOL = config('SEGMENTATION_CPU_POOL', default='thread')
+SEGMENTATION_CPU_WORKERS = config('SEGMENTATION_CPU_WORKERS', default=0, cast=int)
+
+# Prediction models to load at startup instead of on first use (see
+# health_predictions/model_registry.py), e.g. ML_WARMUP_MODELS=heart,brain_tumor
+ML_WARMUP_MODELS = [name for name in config('ML_WARMUP_MODELS', default='').split(',') if name]
+
+# Bearer token required to scrape /api/health-predictions/metrics/. Admins can
+# always read the metrics; if empty, nobody else can, except with DEBUG on
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+# Console logging; every record carries the id of the request it was logged
+# for (see health_predictions/middleware.py)
+LOG_LEVEL = config('LOG_LEVEL', default='INFO')
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'request_id': {
+            '()': 'health_predictions.middleware.RequestIDFilter',
+        },
+    },
+    'formatters': {
+        'default': {
+            'format': '%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s',
+        },
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'filters': ['request_id'],
+            'formatter': 'default',
+        },
+    },
+    'root': {
+        'handlers': ['console'],
+        'level': LOG_LEVEL,
+    },
+    'loggers': {
+        # Replaces Django's own console handler, which would log twice
+        'django': {
+            'handlers': ['console'],
+            'level': LOG_LEVEL,
+            'propagate': False,
+        },
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
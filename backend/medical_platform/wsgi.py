@@ -13,4 +13,9 @@ from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'medical_platform.settings')
 
-application = get_wsgi_application()
\ No newline at end of file
+application = get_wsgi_application()
+
+# Load the ML_WARMUP_MODELS in the serving process only (not in management commands)
+from health_predictions.model_registry import start_warm_up  # noqa: E402
+
+start_warm_up()
\ No newline at end of file
@@ -0,0 +1,40 @@
+"""
+Complete the active medications whose end date has passed.
+
+Reads derive this status at query time (see patients/medicaments.py); this
+job stores it, for all patients in one UPDATE. Run it daily from cron, or
+keep it running with --loop: it then checks every --interval seconds and
+runs once each new day.
+
+Usage:
+    python manage.py expire_medicaments
+    python manage.py expire_medicaments --loop --interval 300
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from patients.medicaments import expire_medicaments
+
+
+class Command(BaseCommand):
+    help = "Complete expired medications (once, or daily with --loop)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Keep running, once per day")
+        parser.add_argument('--interval', type=float, default=300, help="Seconds between date checks with --loop")
+
+    def handle(self, *args, **options):
+        last_run = None
+        while True:
+            today = timezone.localdate()
+            if today != last_run:
+                close_old_connections()
+                completed = expire_medicaments(today)
+                last_run = today
+                self.stdout.write(f"{today}: completed {completed} expired medication(s)")
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,27 @@
+"""
+Rebuild the patient search index from the patients table.
+
+The index is maintained by signals on Patient; use this command to repair it
+after raw SQL or queryset.update() changes, or after switching databases.
+
+Usage:
+    python manage.py rebuild_patient_search_index
+    python manage.py rebuild_patient_search_index --doctor 5 --doctor 7
+"""
+from django.core.management.base import BaseCommand
+
+from patients.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = "Recompute the patient search index"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--doctor', type=int, action='append', dest='doctors',
+            help="Only rebuild this doctor's patients (repeatable)"
+        )
+
+    def handle(self, *args, **options):
+        indexed = rebuild_search_index(options['doctors'])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} patients"))
@@ -0,0 +1,29 @@
+"""
+Rebuild the longitudinal vital signs (PatientVitalSign) from medical records,
+consultation vital signs and the consultations' vital_signs JSON.
+
+The table is maintained by signals and was backfilled by migration 0008;
+run this command to repair it after raw SQL or queryset.update() changes, or
+after a patient user changed their email.
+
+Usage:
+    python manage.py rebuild_patient_vitals
+    python manage.py rebuild_patient_vitals --patient 12 --patient 15
+"""
+from django.core.management.base import BaseCommand
+
+from patients.vitals import rebuild_vitals
+
+
+class Command(BaseCommand):
+    help = "Recompute the patients' longitudinal vital signs"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--patient', type=int, action='append', dest='patients',
+            help="Only rebuild this patient's vital signs (repeatable)"
+        )
+
+    def handle(self, *args, **options):
+        written = rebuild_vitals(options['patients'])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} vital sign entries"))
@@ -0,0 +1,63 @@
+"""
+Medication expiry.
+
+An active medication whose end date has passed is completed. The stored
+status is updated for all patients at once by a daily maintenance job
+(`python manage.py expire_medicaments --loop`, see expire_medicaments()), so
+read endpoints never write. Until the job has run, reads derive the status at
+query time: with_current_status() annotates the queryset with current_status,
+which the serializer returns as the status and the ?status= filter matches.
+"""
+import django_filters
+from django.db.models import Case, CharField, F, Q, Value, When
+from django.utils import timezone
+
+from .models import Medicament
+
+
+def _expired(today):
+    """Q matching the active medications whose end date has passed"""
+    return Q(status='active', end_date__lt=today)
+
+
+def with_current_status(queryset, today=None):
+    """Annotate a Medicament queryset with current_status, expired ones as 'completed'"""
+    today = today or timezone.localdate()
+    return queryset.annotate(
+        current_status=Case(
+            When(_expired(today), then=Value('completed')),
+            default=F('status'),
+            output_field=CharField()
+        )
+    )
+
+
+def current_status(medicament, today=None):
+    """Status of a medication, from the annotation when the queryset has it"""
+    annotated = getattr(medicament, 'current_status', None)
+    if annotated is not None:
+        return annotated
+    today = today or timezone.localdate()
+    if medicament.status == 'active' and medicament.end_date and medicament.end_date < today:
+        return 'completed'
+    return medicament.status
+
+
+def expire_medicaments(today=None):
+    """
+    Complete every expired active medication, in one UPDATE.
+
+    Returns:
+        Number of medications completed
+    """
+    today = today or timezone.localdate()
+    return Medicament.objects.filter(_expired(today)).update(status='completed', updated_at=timezone.now())
+
+
+class MedicamentFilter(django_filters.FilterSet):
+    """?status= matches the current status (querysets from with_current_status())"""
+    status = django_filters.ChoiceFilter(field_name='current_status', choices=Medicament.STATUS_CHOICES)
+
+    class Meta:
+        model = Medicament
+        fields = ['patient', 'doctor', 'status']
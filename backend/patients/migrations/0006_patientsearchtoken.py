@@ -0,0 +1,114 @@
+# Generated by Django 4.2.7 on 2026-10-17 04:13
+
+import re
+import unicodedata
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.utils import OperationalError
+import django.db.models.deletion
+
+# Frozen copy of the index format of patients/search.py at this migration:
+# the live module may change without this migration changing with it.
+FTS_TABLE = 'patients_search_fts'
+FTS_COLUMNS = ['last_name', 'first_name', 'email', 'phone']
+MIN_PHONE_DIGITS = 4
+MAX_TOKEN_LENGTH = 64
+
+_LIGATURES = str.maketrans({'œ': 'oe', 'æ': 'ae', 'ß': 'ss', 'ø': 'o', 'đ': 'd', 'ł': 'l'})
+_WORD = re.compile(r'[a-z0-9]+')
+
+
+def words(text):
+    """Accent-folded words of a text"""
+    text = unicodedata.normalize('NFKD', (text or '').lower().translate(_LIGATURES))
+    return _WORD.findall(''.join(char for char in text if not unicodedata.combining(char)))
+
+
+def phone_tokens(phone):
+    """Every suffix of the phone number's digits with at least MIN_PHONE_DIGITS digits"""
+    digits = re.sub(r'\D', '', phone or '')
+    if digits.startswith('00'):
+        digits = digits[2:]
+    return [digits[start:] for start in range(len(digits) - MIN_PHONE_DIGITS + 1)]
+
+
+def index_terms(first_name, last_name, email, phone):
+    """Indexed words of a patient, per FTS column"""
+    return {
+        'last_name': words(last_name),
+        'first_name': words(first_name),
+        'email': words(email),
+        'phone': phone_tokens(phone),
+    }
+
+
+def create_fts_table(apps, schema_editor):
+    """Create the FTS5 search table where SQLite supports it"""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    try:
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(doctor, {', '.join(FTS_COLUMNS)}, prefix='2 3')"
+        )
+    except OperationalError:
+        # SQLite built without FTS5: searches use the token index only
+        pass
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+def backfill_search_index(apps, schema_editor):
+    Patient = apps.get_model('patients', 'Patient')
+    PatientSearchToken = apps.get_model('patients', 'PatientSearchToken')
+    connection = schema_editor.connection
+    fts = connection.vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names()
+
+    patients = Patient.objects.filter(is_active=True, doctor__isnull=False)
+    tokens = []
+    rows = []
+    for patient in patients.iterator():
+        terms = index_terms(patient.first_name, patient.last_name, patient.email, patient.phone)
+        tokens.extend(
+            PatientSearchToken(patient_id=patient.id, doctor_id=patient.doctor_id, token=token[:MAX_TOKEN_LENGTH])
+            for token in sorted({token for column in terms.values() for token in column})
+        )
+        rows.append((patient.id, f"d{patient.doctor_id}", *(' '.join(terms[column]) for column in FTS_COLUMNS)))
+
+    PatientSearchToken.objects.bulk_create(tokens, batch_size=1000)
+    if fts and rows:
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} (rowid, doctor, {', '.join(FTS_COLUMNS)}) "
+                f"VALUES (%s, %s{', %s' * len(FTS_COLUMNS)})",
+                rows
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('patients', '0005_remove_medicament_duration_medicament_duration_days'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PatientSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=64)),
+                ('doctor', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='patients.patient')),
+            ],
+            options={
+                'db_table': 'patients_search_token',
+                'indexes': [models.Index(fields=['doctor', 'token'], name='patients_se_doctor__87e3e2_idx')],
+            },
+        ),
+        migrations.RunPython(create_fts_table, drop_fts_table),
+        migrations.RunPython(backfill_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 4.2.7 on 2026-10-17 04:27
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('patients', '0006_patientsearchtoken'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PatientVitalSign',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('medical_record', 'Dossier médical'), ('consultation_vitals', 'Constantes de consultation'), ('consultation', 'Consultation')], max_length=20, verbose_name='Source')),
+                ('source_id', models.PositiveBigIntegerField(verbose_name='Identifiant source')),
+                ('recorded_at', models.DateTimeField(verbose_name='Date de mesure')),
+                ('systolic_bp', models.PositiveIntegerField(blank=True, null=True, verbose_name='Tension systolique (mmHg)')),
+                ('diastolic_bp', models.PositiveIntegerField(blank=True, null=True, verbose_name='Tension diastolique (mmHg)')),
+                ('heart_rate', models.PositiveIntegerField(blank=True, null=True, verbose_name='Fréquence cardiaque (bpm)')),
+                ('temperature', models.DecimalField(blank=True, decimal_places=1, max_digits=4, null=True, verbose_name='Température (°C)')),
+                ('respiratory_rate', models.PositiveIntegerField(blank=True, null=True, verbose_name='Fréquence respiratoire (bpm)')),
+                ('oxygen_saturation', models.PositiveIntegerField(blank=True, null=True, verbose_name='Saturation en oxygène (%)')),
+                ('weight', models.DecimalField(blank=True, decimal_places=1, max_digits=5, null=True, verbose_name='Poids (kg)')),
+                ('height', models.PositiveIntegerField(blank=True, null=True, verbose_name='Taille (cm)')),
+                ('waist_circumference', models.DecimalField(blank=True, decimal_places=1, max_digits=5, null=True, verbose_name='Tour de taille (cm)')),
+                ('bmi', models.DecimalField(blank=True, decimal_places=1, max_digits=4, null=True, verbose_name='IMC')),
+                ('patient', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='vital_signs', to='patients.patient', verbose_name='Patient')),
+                ('recorded_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Médecin')),
+            ],
+            options={
+                'verbose_name': 'Constante vitale',
+                'verbose_name_plural': 'Constantes vitales',
+                'db_table': 'patient_vital_signs',
+                'ordering': ['-recorded_at', '-id'],
+                'indexes': [models.Index(fields=['patient', '-recorded_at', '-id'], name='patient_vit_patient_4d7c9b_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='patientvitalsign',
+            constraint=models.UniqueConstraint(fields=('source', 'source_id', 'patient'), name='unique_patient_vital_sign_source'),
+        ),
+    ]
@@ -0,0 +1,77 @@
+from django.db import migrations
+
+from patients.vitals import BATCH_SIZE, VITAL_FIELDS, parse_consultation_vitals
+
+
+def backfill_vital_signs(apps, schema_editor):
+    """Copy the vitals recorded before PatientVitalSign existed (see patients/vitals.py)"""
+    Patient = apps.get_model('patients', 'Patient')
+    PatientMedicalRecord = apps.get_model('patients', 'PatientMedicalRecord')
+    PatientVitalSign = apps.get_model('patients', 'PatientVitalSign')
+    Consultation = apps.get_model('consultations', 'Consultation')
+    VitalSigns = apps.get_model('consultations', 'VitalSigns')
+
+    # Consultations are attached to the Patient records with the same email
+    patients_by_email = {}
+    for patient_id, email in Patient.objects.exclude(email__isnull=True).exclude(email='').values_list('id', 'email'):
+        patients_by_email.setdefault(email, []).append(patient_id)
+
+    rows = [
+        PatientVitalSign(
+            patient_id=record['patient_id'],
+            source='medical_record',
+            source_id=record['id'],
+            recorded_at=record['recorded_at'] or record['created_at'],
+            recorded_by_id=record['doctor_id'],
+            **{name: record[name] for name in VITAL_FIELDS}
+        )
+        for record in PatientMedicalRecord.objects.values(
+            'id', 'patient_id', 'doctor_id', 'recorded_at', 'created_at', *VITAL_FIELDS
+        ).iterator()
+    ]
+
+    fields = [name for name in VITAL_FIELDS if name != 'waist_circumference']
+    for row in VitalSigns.objects.values(
+        'id', 'recorded_at', 'recorded_by_id', 'consultation__appointment__patient__email', *fields
+    ).iterator():
+        for patient_id in patients_by_email.get(row['consultation__appointment__patient__email'], ()):
+            rows.append(PatientVitalSign(
+                patient_id=patient_id,
+                source='consultation_vitals',
+                source_id=row['id'],
+                recorded_at=row['recorded_at'],
+                recorded_by_id=row['recorded_by_id'],
+                **{name: row[name] for name in fields}
+            ))
+
+    for row in Consultation.objects.values(
+        'id', 'vital_signs', 'start_time', 'created_at', 'appointment__doctor_id', 'appointment__patient__email'
+    ).iterator():
+        values = parse_consultation_vitals(row['vital_signs'])
+        if not values:
+            continue
+        for patient_id in patients_by_email.get(row['appointment__patient__email'], ()):
+            rows.append(PatientVitalSign(
+                patient_id=patient_id,
+                source='consultation',
+                source_id=row['id'],
+                recorded_at=row['start_time'] or row['created_at'],
+                recorded_by_id=row['appointment__doctor_id'],
+                **values
+            ))
+
+    # Rows already written by the signals since 0007 are kept
+    PatientVitalSign.objects.bulk_create(rows, batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0007_patientvitalsign'),
+        ('consultations', '0001_initial'),
+        ('appointments', '0007_appointmentdailystats'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_vital_signs, migrations.RunPython.noop),
+    ]
@@ -89,6 +89,35 @@ class Patient(models.Model):
         )
 
 
+class PatientSearchToken(models.Model):
+    """
+    Search index entry: one accent-folded word (or phone number suffix) of an
+    active patient, under the patient's doctor (see patients/search.py).
+    """
+    patient = models.ForeignKey(
+        Patient,
+        on_delete=models.CASCADE,
+        related_name='search_tokens'
+    )
+    # Covered by the (doctor, token) index
+    doctor = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+',
+        db_index=False
+    )
+    token = models.CharField(max_length=64)
+    
+    class Meta:
+        db_table = 'patients_search_token'
+        indexes = [
+            models.Index(fields=['doctor', 'token']),
+        ]
+    
+    def __str__(self):
+        return f"{self.token} ({self.patient_id})"
+
+
 class PatientSpecialist(models.Model):
     """
     Represents the relationship between a patient and their specialist doctors.
@@ -286,6 +315,74 @@ class PatientMedicalRecord(models.Model):
         return f"Dossier médical - {self.patient.full_name} ({self.recorded_at.date() if self.recorded_at else 'N/A'})"
 
 
+class PatientVitalSign(models.Model):
+    """
+    One vital-signs measurement of a patient, from any of the places vitals
+    are recorded: a PatientMedicalRecord, a consultation's VitalSigns row or
+    its vital_signs JSON. Maintained by signals (see patients/vitals.py).
+    """
+    SOURCE_CHOICES = [
+        ('medical_record', 'Dossier médical'),
+        ('consultation_vitals', 'Constantes de consultation'),
+        ('consultation', 'Consultation'),
+    ]
+    
+    # Covered by the (patient, -recorded_at, -id) index
+    patient = models.ForeignKey(
+        Patient,
+        on_delete=models.CASCADE,
+        related_name='vital_signs',
+        db_index=False,
+        verbose_name='Patient'
+    )
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES, verbose_name='Source')
+    source_id = models.PositiveBigIntegerField(verbose_name='Identifiant source')
+    recorded_at = models.DateTimeField(verbose_name='Date de mesure')
+    recorded_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='+',
+        verbose_name='Médecin'
+    )
+    
+    # Copies of the source values: model rows are validated by their forms
+    # and serializers, the consultation JSON by vitals._field_value()
+    systolic_bp = models.PositiveIntegerField(null=True, blank=True, verbose_name='Tension systolique (mmHg)')
+    diastolic_bp = models.PositiveIntegerField(null=True, blank=True, verbose_name='Tension diastolique (mmHg)')
+    heart_rate = models.PositiveIntegerField(null=True, blank=True, verbose_name='Fréquence cardiaque (bpm)')
+    temperature = models.DecimalField(
+        max_digits=4, decimal_places=1, null=True, blank=True, verbose_name='Température (°C)'
+    )
+    respiratory_rate = models.PositiveIntegerField(null=True, blank=True, verbose_name='Fréquence respiratoire (bpm)')
+    oxygen_saturation = models.PositiveIntegerField(null=True, blank=True, verbose_name='Saturation en oxygène (%)')
+    weight = models.DecimalField(max_digits=5, decimal_places=1, null=True, blank=True, verbose_name='Poids (kg)')
+    height = models.PositiveIntegerField(null=True, blank=True, verbose_name='Taille (cm)')
+    waist_circumference = models.DecimalField(
+        max_digits=5, decimal_places=1, null=True, blank=True, verbose_name='Tour de taille (cm)'
+    )
+    bmi = models.DecimalField(max_digits=4, decimal_places=1, null=True, blank=True, verbose_name='IMC')
+    
+    class Meta:
+        db_table = 'patient_vital_signs'
+        verbose_name = 'Constante vitale'
+        verbose_name_plural = 'Constantes vitales'
+        ordering = ['-recorded_at', '-id']
+        indexes = [
+            # Histories are paged on (recorded_at, id)
+            models.Index(fields=['patient', '-recorded_at', '-id']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['source', 'source_id', 'patient'],
+                name='unique_patient_vital_sign_source'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"Constantes - {self.patient_id} ({self.get_source_display()}, {self.recorded_at})"
+
+
 class Medicament(models.Model):
     """
     Represents a medication prescribed to a patient.
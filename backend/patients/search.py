@@ -0,0 +1,323 @@
+"""
+Patient search index.
+
+Type-ahead search must not scan the patients table, so every active patient
+with a doctor is indexed under that doctor:
+
+- names and email are accent-folded, lower-cased and split into words, so
+  "Hélène" is found with "hel" and "Jean-Pierre" with "pierre"
+- the phone number is reduced to its digits and indexed by every suffix of at
+  least MIN_PHONE_DIGITS digits, so "+216 26 013 248", "0021626013248",
+  "26013248" and "013 248" all find the same patient
+
+Query words are matched as prefixes of indexed words and must all match. A
+query that looks like a phone number is matched as a single digit string.
+
+Two index structures are kept:
+    fts5    - the SQLite FTS5 table patients_search_fts (rowid = patient id,
+              created by migration 0006 when SQLite has FTS5), ranked by bm25
+              with last names weighted highest
+    prefix  - PatientSearchToken rows, one per (doctor, word); a prefix is a
+              range scan of the (doctor, token) index. Results are ranked by
+              the number of query words matching a whole word. Used on other
+              databases, or when PATIENT_SEARCH_BACKEND=prefix.
+
+The index is maintained by the signal handlers in signals.py. Run
+`python manage.py rebuild_patient_search_index` after changes that bypass
+them (queryset.update(), raw SQL).
+"""
+import re
+import unicodedata
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, Count, IntegerField, Max, Q, When
+from django.db.models.expressions import RawSQL
+from rest_framework.filters import SearchFilter
+
+FTS_TABLE = 'patients_search_fts'
+
+# Indexed columns of the FTS table and their bm25 weights
+FTS_COLUMNS = {
+    'last_name': 10.0,
+    'first_name': 5.0,
+    'email': 1.0,
+    'phone': 2.0,
+}
+
+# Shortest indexed phone suffix
+MIN_PHONE_DIGITS = 4
+
+# Longest stored token (PatientSearchToken.token)
+MAX_TOKEN_LENGTH = 64
+
+# Characters folded to more than one letter (not decomposed by NFKD)
+_LIGATURES = str.maketrans({'œ': 'oe', 'æ': 'ae', 'ß': 'ss', 'ø': 'o', 'đ': 'd', 'ł': 'l'})
+
+_WORD = re.compile(r'[a-z0-9]+')
+_PHONE_QUERY = re.compile(r'\+?[\d\s().\-/]+')
+
+
+def fold(text):
+    """Lower-case a text and strip its accents ("Hélène Lœb" -> "helene loeb")"""
+    text = unicodedata.normalize('NFKD', (text or '').lower().translate(_LIGATURES))
+    return ''.join(char for char in text if not unicodedata.combining(char))
+
+
+def words(text):
+    """Accent-folded words of a text"""
+    return _WORD.findall(fold(text))
+
+
+def phone_digits(phone):
+    """Digits of a phone number, without the international call prefix 00"""
+    digits = re.sub(r'\D', '', phone or '')
+    return digits[2:] if digits.startswith('00') else digits
+
+
+def phone_tokens(phone):
+    """Every suffix of the phone number's digits with at least MIN_PHONE_DIGITS digits"""
+    digits = phone_digits(phone)
+    return [digits[start:] for start in range(len(digits) - MIN_PHONE_DIGITS + 1)]
+
+
+def index_terms(first_name, last_name, email, phone):
+    """
+    Indexed words of a patient, per FTS column.
+
+    Returns:
+        Dictionary column name -> list of words
+    """
+    return {
+        'last_name': words(last_name),
+        'first_name': words(first_name),
+        'email': words(email),
+        'phone': phone_tokens(phone),
+    }
+
+
+def parse_query(query):
+    """
+    Terms of a search query.
+
+    Returns:
+        List of term groups: every group must match, through any of its
+        alternatives (prefixes)
+    """
+    query = (query or '').strip()
+    if _PHONE_QUERY.fullmatch(query):
+        digits = phone_digits(query)
+        if len(digits) >= 3:
+            # A national number typed with its trunk prefix 0 is indexed
+            # without it after the country code
+            alternatives = [digits]
+            if digits.startswith('0') and len(digits) > 3:
+                alternatives.append(digits[1:])
+            return [alternatives]
+    return [[word] for word in dict.fromkeys(words(query))]
+
+
+def fts_enabled():
+    """Whether searches use the FTS5 table"""
+    backend = getattr(settings, 'PATIENT_SEARCH_BACKEND', 'auto')
+    if backend == 'prefix':
+        return False
+    return _fts_table_exists()
+
+
+_fts_table = None
+
+
+def _fts_table_exists():
+    global _fts_table
+    if _fts_table is None:
+        _fts_table = connection.vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names()
+    return _fts_table
+
+
+def _fts_expression(doctor_id, groups):
+    """FTS5 MATCH expression restricted to a doctor's patients"""
+    terms = ' AND '.join(
+        '(' + ' OR '.join(f'"{term}"*' for term in alternatives) + ')'
+        for alternatives in groups
+    )
+    return f"doctor : d{doctor_id} AND {{{' '.join(FTS_COLUMNS)}}} : ({terms})"
+
+
+def _prefix_condition(term):
+    """Q matching the tokens that start with term (a range on the index)"""
+    return Q(token__gte=term, token__lt=term[:-1] + chr(ord(term[-1]) + 1))
+
+
+def _prefix_matches(doctor_id, groups):
+    """Ids of the matching patients (values queryset) with their exact-word count"""
+    from .models import PatientSearchToken
+
+    conditions = [
+        reduce(or_, (_prefix_condition(term) for term in alternatives))
+        for alternatives in groups
+    ]
+    exact = [term for alternatives in groups for term in alternatives]
+    return PatientSearchToken.objects.filter(
+        reduce(or_, conditions),
+        doctor_id=doctor_id
+    ).values('patient_id').annotate(
+        exact_matches=Count('id', filter=Q(token__in=exact)),
+        **{
+            f'group_{index}': Max(Case(When(condition, then=1), default=0, output_field=IntegerField()))
+            for index, condition in enumerate(conditions)
+        }
+    ).filter(**{f'group_{index}': 1 for index in range(len(conditions))})
+
+
+def search_patients(doctor_id, query, limit=None):
+    """
+    Search a doctor's active patients.
+
+    Args:
+        doctor_id: Id of the doctor whose patients are searched
+        query: Text typed by the user (names, email or phone number)
+        limit: Maximum number of results
+
+    Returns:
+        List of patient ids, best match first
+    """
+    groups = parse_query(query)
+    if not groups:
+        return []
+
+    if fts_enabled():
+        weights = ', '.join(str(weight) for weight in (0.0, *FTS_COLUMNS.values()))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+                f"ORDER BY bm25({FTS_TABLE}, {weights}), rowid LIMIT %s",
+                [_fts_expression(doctor_id, groups), -1 if limit is None else limit]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    matches = _prefix_matches(doctor_id, groups).order_by('-exact_matches', 'patient_id')
+    if limit is not None:
+        matches = matches[:limit]
+    return [match['patient_id'] for match in matches]
+
+
+def filter_patients(queryset, doctor_id, query):
+    """Restrict a Patient queryset to the search matches, keeping its ordering"""
+    groups = parse_query(query)
+    if not groups:
+        return queryset.none()
+
+    if fts_enabled():
+        return queryset.filter(id__in=RawSQL(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s",
+            [_fts_expression(doctor_id, groups)]
+        ))
+    return queryset.filter(id__in=_prefix_matches(doctor_id, groups).values('patient_id'))
+
+
+def _write_index(patients):
+    """Index (patient, terms) pairs that are not in the index"""
+    from .models import PatientSearchToken
+
+    if not patients:
+        return
+    with connection.cursor() as cursor:
+        # Rebuilds write ~10 tokens per patient: insert them without model instances
+        cursor.executemany(
+            f"INSERT INTO {PatientSearchToken._meta.db_table} (patient_id, doctor_id, token) VALUES (%s, %s, %s)",
+            [
+                (patient.id, patient.doctor_id, token[:MAX_TOKEN_LENGTH])
+                for patient, terms in patients
+                for token in sorted({token for column in terms.values() for token in column})
+            ]
+        )
+        if _fts_table_exists():
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} (rowid, doctor, {', '.join(FTS_COLUMNS)}) "
+                f"VALUES (%s, %s{', %s' * len(FTS_COLUMNS)})",
+                [
+                    (patient.id, f"d{patient.doctor_id}", *(' '.join(terms[column]) for column in FTS_COLUMNS))
+                    for patient, terms in patients
+                ]
+            )
+
+
+def unindex_patients(patient_ids):
+    """Remove patients from the index"""
+    from .models import PatientSearchToken
+
+    patient_ids = list(patient_ids)
+    PatientSearchToken.objects.filter(patient_id__in=patient_ids).delete()
+    if _fts_table_exists():
+        with connection.cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(pk,) for pk in patient_ids])
+
+
+def is_indexed(patient):
+    """Only active patients with a doctor are searchable"""
+    return patient.is_active and patient.doctor_id is not None
+
+
+def index_patient(patient):
+    """(Re-)index a patient after it was saved"""
+    with transaction.atomic():
+        unindex_patients([patient.id])
+        if is_indexed(patient):
+            _write_index([(patient, index_terms(patient.first_name, patient.last_name, patient.email, patient.phone))])
+
+
+def rebuild_search_index(doctor_ids=None):
+    """
+    Rebuild the index from the patients table.
+
+    Args:
+        doctor_ids: Only rebuild these doctors' patients (default: all)
+
+    Returns:
+        Number of indexed patients
+    """
+    from .models import Patient, PatientSearchToken
+
+    patients = Patient.objects.all()
+    if doctor_ids:
+        patients = patients.filter(doctor_id__in=doctor_ids)
+
+    indexed = 0
+    with transaction.atomic():
+        if doctor_ids:
+            # Including patients indexed under these doctors but since moved
+            unindex_patients(
+                set(patients.values_list('id', flat=True))
+                | set(PatientSearchToken.objects.filter(doctor_id__in=doctor_ids).values_list('patient_id', flat=True))
+            )
+        else:
+            PatientSearchToken.objects.all().delete()
+            if _fts_table_exists():
+                with connection.cursor() as cursor:
+                    cursor.execute(f"DELETE FROM {FTS_TABLE}")
+
+        batch = []
+        for patient in patients.filter(is_active=True, doctor__isnull=False).only(
+            'id', 'doctor_id', 'is_active', 'first_name', 'last_name', 'email', 'phone'
+        ).iterator(chunk_size=5000):
+            batch.append((patient, index_terms(patient.first_name, patient.last_name, patient.email, patient.phone)))
+            if len(batch) == 5000:
+                _write_index(batch)
+                indexed += len(batch)
+                batch = []
+        _write_index(batch)
+        indexed += len(batch)
+    return indexed
+
+
+class PatientSearchFilter(SearchFilter):
+    """?search= on the authenticated doctor's patients, through the search index"""
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '')
+        if not query.strip():
+            return queryset
+        return filter_patients(queryset, request.user.id, query)
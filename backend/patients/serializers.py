@@ -1,5 +1,6 @@
 from rest_framework import serializers
-from .models import Patient, PatientSpecialist, PatientMedicalRecord, Medicament
+from .models import Patient, PatientSpecialist, PatientMedicalRecord, PatientVitalSign, Medicament
+from .medicaments import current_status
 
 class PatientSerializer(serializers.ModelSerializer):
     age = serializers.ReadOnlyField()
@@ -239,6 +240,20 @@ class PatientMedicalRecordListSerializer(serializers.ModelSerializer):
 
 
 
+class PatientVitalSignSerializer(serializers.ModelSerializer):
+    recorded_by_name = serializers.CharField(source='recorded_by.full_name', read_only=True, default=None)
+    
+    class Meta:
+        model = PatientVitalSign
+        fields = [
+            'id', 'source', 'source_id', 'recorded_at', 'recorded_by', 'recorded_by_name',
+            'systolic_bp', 'diastolic_bp', 'heart_rate', 'temperature',
+            'respiratory_rate', 'oxygen_saturation', 'weight', 'height',
+            'waist_circumference', 'bmi'
+        ]
+        read_only_fields = fields
+
+
 class MedicamentSerializer(serializers.ModelSerializer):
     doctor_name = serializers.CharField(source='doctor.full_name', read_only=True)
     is_expired = serializers.BooleanField(read_only=True)
@@ -257,10 +272,16 @@ class MedicamentSerializer(serializers.ModelSerializer):
             'patient': {'required': False}  # Make patient optional, we'll set it automatically
         }
     
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # Expired medications read as completed before the daily job stores it
+        data['status'] = current_status(instance)
+        return data
+    
     def get_days_remaining(self, obj):
         """Calculate remaining days for active medications"""
         from datetime import date
-        if obj.end_date and obj.status == 'active':
+        if obj.end_date and current_status(obj) == 'active':
             remaining = (obj.end_date - date.today()).days
             return max(0, remaining)
         return None
@@ -0,0 +1,91 @@
+"""
+Signal handlers keeping the patient search index (search.py) and the
+longitudinal vital signs (vitals.py) in sync, and invalidating the cached
+dashboard statistics (stats.py).
+"""
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+
+from .models import Patient, PatientMedicalRecord
+from .search import index_patient, unindex_patients
+from .stats import invalidate_patient_statistics
+from .vitals import (
+    remove_source, sync_consultation, sync_consultation_vitals, sync_medical_record, sync_patient_consultations
+)
+
+
+@receiver(post_save, sender=Patient, dispatch_uid='patient_search_index_save')
+def update_search_index(sender, instance, raw=False, **kwargs):
+    if not raw:
+        index_patient(instance)
+
+
+@receiver(post_delete, sender=Patient, dispatch_uid='patient_search_index_delete')
+def remove_from_search_index(sender, instance, **kwargs):
+    unindex_patients([instance.id])
+
+
+@receiver(pre_save, sender=Patient, dispatch_uid='patient_pre_save')
+def remember_previous_values(sender, instance, **kwargs):
+    """Stored email and doctor, compared by the post_save handlers below"""
+    instance._previous_email = instance._previous_doctor_id = None
+    if instance.pk:
+        previous = Patient.objects.filter(pk=instance.pk).values_list('email', 'doctor_id').first()
+        if previous is not None:
+            instance._previous_email, instance._previous_doctor_id = previous
+
+
+@receiver(post_save, sender=Patient, dispatch_uid='patient_statistics_save')
+@receiver(post_delete, sender=Patient, dispatch_uid='patient_statistics_delete')
+def invalidate_statistics(sender, instance, **kwargs):
+    """
+    Creations and deactivations (and any other change) alter the doctor's
+    statistics, and a reassigned patient the previous doctor's too
+    """
+    invalidate_patient_statistics(instance.doctor_id)
+    previous_doctor_id = getattr(instance, '_previous_doctor_id', None)
+    if previous_doctor_id != instance.doctor_id:
+        invalidate_patient_statistics(previous_doctor_id)
+
+
+@receiver(post_save, sender=Patient, dispatch_uid='patient_vitals_save')
+def attach_consultation_vitals(sender, instance, created, raw=False, **kwargs):
+    """Consultations are attached to Patient records by email"""
+    if raw:
+        return
+    if created or instance.email != getattr(instance, '_previous_email', None):
+        sync_patient_consultations(instance)
+
+
+@receiver(post_save, sender=PatientMedicalRecord, dispatch_uid='medical_record_vitals_save')
+def copy_medical_record_vitals(sender, instance, raw=False, **kwargs):
+    if not raw:
+        sync_medical_record(instance)
+
+
+@receiver(post_delete, sender=PatientMedicalRecord, dispatch_uid='medical_record_vitals_delete')
+def remove_medical_record_vitals(sender, instance, **kwargs):
+    remove_source('medical_record', [instance.id])
+
+
+# Lazy references: the patients app does not import consultations at load time
+@receiver(post_save, sender='consultations.Consultation', dispatch_uid='consultation_vitals_json_save')
+def copy_consultation_vitals_json(sender, instance, raw=False, **kwargs):
+    if not raw:
+        sync_consultation(instance)
+
+
+@receiver(post_delete, sender='consultations.Consultation', dispatch_uid='consultation_vitals_json_delete')
+def remove_consultation_vitals_json(sender, instance, **kwargs):
+    remove_source('consultation', [instance.id])
+
+
+@receiver(post_save, sender='consultations.VitalSigns', dispatch_uid='consultation_vitals_save')
+def copy_consultation_vitals(sender, instance, raw=False, **kwargs):
+    if not raw:
+        sync_consultation_vitals(instance)
+
+
+@receiver(post_delete, sender='consultations.VitalSigns', dispatch_uid='consultation_vitals_delete')
+def remove_consultation_vitals(sender, instance, **kwargs):
+    remove_source('consultation_vitals', [instance.id])
@@ -0,0 +1,152 @@
+"""
+Patient statistics for the doctor dashboard.
+
+All counters, the age buckets and the blood-group distribution are computed
+with conditional aggregation in a single query. Ages are not computed per row:
+a bucket [low, high) is the range of birth dates between the dates `high` and
+`low` years before today, so the comparison happens in SQL.
+
+Results are cached per doctor for PATIENT_STATS_CACHE_TIMEOUT seconds (0
+disables the cache) in the PATIENT_STATS_CACHE_ALIAS cache; the entry is
+dropped whenever one of the doctor's patients is saved or deleted (see
+signals.py).
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Count, Q, Value
+from django.db.models.functions import Replace, Upper
+from django.utils import timezone
+
+from .models import Patient
+
+# (label, lowest age, highest age excluded)
+AGE_BUCKETS = [
+    ('0-17', 0, 18),
+    ('18-29', 18, 30),
+    ('30-44', 30, 45),
+    ('45-59', 45, 60),
+    ('60-74', 60, 75),
+    ('75+', 75, None),
+]
+
+BLOOD_TYPES = ['A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-']
+
+RECENT_DAYS = 30
+
+
+def years_before(day, years):
+    """The same day `years` years earlier (28 February for 29 February)"""
+    try:
+        return day.replace(year=day.year - years)
+    except ValueError:
+        return day.replace(year=day.year - years, day=28)
+
+
+def _age_filter(low, high, today):
+    """Q matching the patients aged low (included) to high (excluded) today"""
+    condition = Q(date_of_birth__lte=years_before(today, low))
+    if high is not None:
+        condition &= Q(date_of_birth__gt=years_before(today, high))
+    return condition
+
+
+def compute_patient_statistics(doctor_id, today=None):
+    """
+    Dashboard statistics of a doctor's active patients, in one query.
+
+    Returns:
+        Dictionary with the total, per-gender and recent counts, the gender
+        percentages and the age and blood-type distributions
+    """
+    today = today or timezone.localdate()
+    age_filters = {
+        f'age_{index}': _age_filter(low, high, today)
+        for index, (_, low, high) in enumerate(AGE_BUCKETS)
+    }
+    blood_filters = {
+        f'blood_{index}': Q(blood_group=blood_type)
+        for index, blood_type in enumerate(BLOOD_TYPES)
+    }
+
+    counts = Patient.objects.filter(
+        doctor_id=doctor_id,
+        is_active=True
+    ).alias(
+        # Blood types are free text: compare them without case and spaces
+        blood_group=Upper(Replace('blood_type', Value(' '), Value('')))
+    ).aggregate(
+        total=Count('id'),
+        male=Count('id', filter=Q(gender='M')),
+        female=Count('id', filter=Q(gender='F')),
+        other=Count('id', filter=Q(gender='O')),
+        recent=Count('id', filter=Q(created_at__date__gte=today - timedelta(days=RECENT_DAYS))),
+        blood_unknown=Count('id', filter=Q(blood_type__isnull=True) | Q(blood_type='')),
+        **{name: Count('id', filter=condition) for name, condition in age_filters.items()},
+        **{name: Count('id', filter=condition) for name, condition in blood_filters.items()},
+    )
+
+    total = counts['total']
+    blood_type_distribution = {
+        blood_type: counts[f'blood_{index}'] for index, blood_type in enumerate(BLOOD_TYPES)
+    }
+    blood_type_distribution['other'] = total - sum(blood_type_distribution.values()) - counts['blood_unknown']
+    blood_type_distribution['unknown'] = counts['blood_unknown']
+
+    return {
+        'total_patients': total,
+        'male_patients': counts['male'],
+        'female_patients': counts['female'],
+        'other_patients': counts['other'],
+        'recent_patients': counts['recent'],
+        'gender_distribution': {
+            'male_percentage': (counts['male'] / total * 100) if total > 0 else 0,
+            'female_percentage': (counts['female'] / total * 100) if total > 0 else 0,
+        },
+        'age_distribution': {
+            label: counts[f'age_{index}'] for index, (label, _, _) in enumerate(AGE_BUCKETS)
+        },
+        'blood_type_distribution': blood_type_distribution,
+    }
+
+
+def _cache():
+    return caches[getattr(settings, 'PATIENT_STATS_CACHE_ALIAS', 'default')]
+
+
+def _timeout():
+    return getattr(settings, 'PATIENT_STATS_CACHE_TIMEOUT', 60)
+
+
+def _cache_key(doctor_id):
+    return f"patient_stats:{doctor_id}"
+
+
+def get_patient_statistics(doctor_id):
+    """compute_patient_statistics for today, through the cache when enabled"""
+    timeout = _timeout()
+    today = timezone.localdate()
+    if not timeout:
+        return compute_patient_statistics(doctor_id, today)
+
+    # Ages and "recent" depend on the day: entries from another day are stale
+    cached = _cache().get(_cache_key(doctor_id))
+    if cached is not None and cached['date'] == today.isoformat():
+        return cached['statistics']
+
+    statistics = compute_patient_statistics(doctor_id, today)
+    _cache().set(_cache_key(doctor_id), {'date': today.isoformat(), 'statistics': statistics}, timeout=timeout)
+    return statistics
+
+
+def invalidate_patient_statistics(doctor_id):
+    """
+    Drop a doctor's cached statistics, now and once the current transaction
+    commits (see appointments.availability_cache.invalidate_doctor_availability).
+    """
+    if doctor_id is None or not _timeout():
+        return
+    _cache().delete(_cache_key(doctor_id))
+    transaction.on_commit(lambda: _cache().delete(_cache_key(doctor_id)))
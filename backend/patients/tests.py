@@ -0,0 +1,532 @@
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+import importlib
+from unittest import mock
+
+from django.apps import apps
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from appointments.models import Appointment, TimeSlot
+from consultations.models import Consultation, VitalSigns
+
+from . import medicaments, search, stats, trends, vitals
+from .models import Medicament, Patient, PatientMedicalRecord, PatientSearchToken, PatientVitalSign
+
+User = get_user_model()
+
+
+def create_user(username, user_type='doctor', **fields):
+    fields = {'first_name': 'Test', 'last_name': username.title(), 'email': f'{username}@example.com', **fields}
+    return User.objects.create_user(username=username, password='pass', user_type=user_type, **fields)
+
+
+def create_patient(first_name='Jean', last_name='Dupont', **fields):
+    fields = {
+        'email': f'{first_name}.{last_name}@example.com'.lower(),
+        'phone': '0612345678',
+        'date_of_birth': date(1980, 1, 1),
+        'gender': 'M',
+        'address': '1 rue de la Paix',
+        'emergency_contact_name': 'Marie Dupont',
+        'emergency_contact_phone': '0698765432',
+        'emergency_contact_relation': 'Épouse',
+        **fields
+    }
+    return Patient.objects.create(first_name=first_name, last_name=last_name, **fields)
+
+
+def create_consultation(doctor, patient_user, start_time, vital_signs=None):
+    """A consultation of patient_user (attached to the Patient records with their email)"""
+    local = timezone.localtime(start_time)
+    slot = TimeSlot.objects.create(
+        doctor=doctor, date=local.date(), start_time=local.time(),
+        end_time=(local + timedelta(minutes=30)).time(), is_available=False
+    )
+    appointment = Appointment.objects.create(
+        patient=patient_user, doctor=doctor, time_slot=slot,
+        reason_for_visit='Contrôle', contact_phone='+33612345678'
+    )
+    return Consultation.objects.create(
+        appointment=appointment, start_time=start_time, vital_signs=vital_signs or {}
+    )
+
+
+class VitalTrendsTests(TestCase):
+    """Trends include the vitals of every source"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = create_user('doctor')
+        cls.patient = create_patient()
+        cls.patient_user = create_user('jean', 'patient', email=cls.patient.email)
+        cls.day = timezone.make_aware(datetime.combine(date(2026, 3, 2), time(9)))
+
+    def test_consultation_vitals(self):
+        PatientMedicalRecord.objects.create(
+            patient=self.patient, doctor=self.doctor, recorded_at=self.day, heart_rate=70, weight=Decimal('80.0')
+        )
+        consultation = create_consultation(
+            self.doctor, self.patient_user, self.day + timedelta(days=1), {'hr': 82, 'bp': '130/85'}
+        )
+        VitalSigns.objects.create(consultation=consultation, heart_rate=90, recorded_by=self.doctor)
+
+        timestamps, values = trends.load_series(self.patient.id, ['heart_rate', 'systolic_bp', 'weight'])
+        self.assertEqual(len(timestamps), 3)
+        self.assertEqual(timestamps[1], int((self.day + timedelta(days=1)).timestamp() * 1000))
+        self.assertEqual(values['heart_rate'].tolist(), [70.0, 82.0, 90.0])
+        self.assertEqual(values['systolic_bp'][1], 130.0)
+        self.assertEqual(values['weight'][0], 80.0)
+
+        payload = trends.vital_trends(self.patient.id, ['heart_rate'], start=self.day + timedelta(hours=1))
+        self.assertEqual(payload['measurements'], 2)
+        self.assertEqual(payload['series']['heart_rate']['avg'], [82.0, 90.0])
+
+    def test_other_patients_excluded(self):
+        other = create_patient('Paul', 'Martin')
+        create_consultation(self.doctor, create_user('paul', 'patient', email=other.email), self.day, {'hr': 60})
+        self.assertEqual(trends.vital_trends(self.patient.id)['measurements'], 0)
+        self.assertEqual(trends.vital_trends(other.id)['measurements'], 1)
+
+
+class SearchTokenizationTests(SimpleTestCase):
+    """Names and phone numbers are indexed and queried in a normalised form"""
+
+    def test_accents(self):
+        self.assertEqual(search.fold('Hélène LŒB Ærø'), 'helene loeb aero')
+        self.assertEqual(search.words('Éloïse Müller'), ['eloise', 'muller'])
+
+    def test_hyphens_and_apostrophes(self):
+        self.assertEqual(search.words("Jean-Pierre N'Diaye"), ['jean', 'pierre', 'n', 'diaye'])
+        self.assertEqual(search.words('jean.pierre@example.com'), ['jean', 'pierre', 'example', 'com'])
+
+    def test_phone_normalisation(self):
+        for phone in ('+216 26 013 248', '00216 26-013-248', '(216) 26.013.248'):
+            self.assertEqual(search.phone_digits(phone), '21626013248')
+        self.assertEqual(search.phone_tokens('26 013 248'), ['26013248', '6013248', '013248', '13248', '3248'])
+        self.assertEqual(search.phone_tokens('123'), [])
+
+    def test_parse_query(self):
+        self.assertEqual(search.parse_query("  Hélène hélène Dupont-Martin "), [['helene'], ['dupont'], ['martin']])
+        self.assertEqual(search.parse_query('+216 26 013 248'), [['21626013248']])
+        # The trunk prefix 0 may not be indexed
+        self.assertEqual(search.parse_query('026 013'), [['026013', '26013']])
+        # Too short for a phone number: a word
+        self.assertEqual(search.parse_query('26'), [['26']])
+        self.assertEqual(search.parse_query(" -'. "), [])
+
+
+class PatientSearchMixin:
+    """search_patients results, run against each index backend"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = create_user('doctor')
+        cls.other_doctor = create_user('other')
+        cls.helene = create_patient(
+            'Hélène', 'Dupont-Martin', email='hdm@example.com', phone='+216 26 013 248', doctor=cls.doctor
+        )
+        cls.jean_pierre = create_patient(
+            'Jean-Pierre', "N'Diaye", email='jpn@example.com', phone='0612345678', doctor=cls.doctor
+        )
+        cls.other_helene = create_patient('Helene', 'Dupont', email='h.dupont@example.com', doctor=cls.other_doctor)
+        cls.inactive = create_patient('Hélène', 'Durand', is_active=False, doctor=cls.doctor)
+
+    def search(self, query, doctor=None):
+        return search.search_patients((doctor or self.doctor).id, query)
+
+    def test_names(self):
+        for query in ('hel', 'HÉLÈNE', 'dupont', 'martin', 'dupont-mar', 'helene martin'):
+            with self.subTest(query=query):
+                self.assertEqual(self.search(query), [self.helene.id])
+        for query in ('pierre', 'jean pierre', "n'diaye", 'diaye', "n'd"):
+            with self.subTest(query=query):
+                self.assertEqual(self.search(query), [self.jean_pierre.id])
+        self.assertEqual(self.search('helene pierre'), [])
+        self.assertEqual(self.search('lene'), [])
+
+    def test_phone(self):
+        for query in ('+216 26 013 248', '0021626013248', '26013248', '013 248', '3248'):
+            with self.subTest(query=query):
+                self.assertEqual(self.search(query), [self.helene.id])
+        self.assertEqual(self.search('06 12 34'), [self.jean_pierre.id])
+
+    def test_doctor_and_active_only(self):
+        self.assertEqual(self.search('helene', self.other_doctor), [self.other_helene.id])
+        self.assertNotIn(self.inactive.id, self.search('durand'))
+
+    def test_filter_patients(self):
+        queryset = search.filter_patients(Patient.objects.order_by('id'), self.doctor.id, 'helene')
+        self.assertEqual(list(queryset), [self.helene])
+        self.assertFalse(search.filter_patients(Patient.objects.all(), self.doctor.id, ' ').exists())
+
+    def test_update_and_delete(self):
+        self.helene.last_name = 'Bernard'
+        self.helene.save()
+        self.assertEqual(self.search('dupont'), [])
+        self.assertEqual(self.search('bernard'), [self.helene.id])
+
+        self.helene.doctor = self.other_doctor
+        self.helene.save()
+        self.assertEqual(self.search('bernard'), [])
+        self.assertEqual(self.search('bernard', self.other_doctor), [self.helene.id])
+
+        self.helene.is_active = False
+        self.helene.save()
+        self.assertEqual(self.search('bernard', self.other_doctor), [])
+
+        self.jean_pierre.delete()
+        self.assertEqual(self.search('pierre'), [])
+        self.assertFalse(PatientSearchToken.objects.filter(patient_id=self.jean_pierre.id).exists())
+
+    def test_rebuild(self):
+        PatientSearchToken.objects.all().delete()
+        self.assertEqual(search.rebuild_search_index(), 3)
+        self.assertEqual(self.search('martin'), [self.helene.id])
+
+
+@override_settings(PATIENT_SEARCH_BACKEND='prefix')
+class PrefixPatientSearchTests(PatientSearchMixin, TestCase):
+
+    def test_ranking(self):
+        # Whole words before prefixes, whatever the ids
+        jeanne = create_patient('Jeanne', 'Abadie', doctor=self.doctor)
+        jean = create_patient('Jean', 'Moreau', doctor=self.doctor)
+        self.assertEqual(self.search('jean'), [self.jean_pierre.id, jean.id, jeanne.id])
+
+
+@override_settings(PATIENT_SEARCH_BACKEND='auto')
+class FTSPatientSearchTests(PatientSearchMixin, TestCase):
+
+    def setUp(self):
+        if not search.fts_enabled():
+            self.skipTest('SQLite without FTS5')
+
+    def test_ranking(self):
+        # Last names weigh more than first names, whatever the ids
+        first_name = create_patient('Martin', 'Abadie', doctor=self.doctor)
+        last_name = create_patient('Paul', 'Martin', doctor=self.doctor)
+        results = self.search('martin')
+        self.assertLess(results.index(last_name.id), results.index(first_name.id))
+
+    def test_same_results_as_prefix(self):
+        queries = ['hel', 'dupont martin', 'pierre', '013 248', 'jean', 'example', 'zzz']
+        fts = [set(self.search(query)) for query in queries]
+        with override_settings(PATIENT_SEARCH_BACKEND='prefix'):
+            self.assertEqual([set(self.search(query)) for query in queries], fts)
+
+
+class PatientStatisticsTests(TestCase):
+    """Dashboard statistics of a doctor's active patients"""
+    today = date(2026, 3, 15)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = create_user('doctor')
+        cls.other_doctor = create_user('other')
+
+    def add(self, date_of_birth, **fields):
+        index = Patient.objects.count()
+        fields = {'first_name': 'Patient', 'last_name': f'N{index}', 'doctor': self.doctor, **fields}
+        return create_patient(date_of_birth=date_of_birth, **fields)
+
+    def test_aggregation(self):
+        self.add(date(1980, 1, 1), gender='M', blood_type='A+')
+        self.add(date(1990, 1, 1), gender='F', blood_type=' ab- ')
+        self.add(date(1990, 1, 1), gender='F', blood_type='o+')
+        self.add(date(2000, 1, 1), gender='O', blood_type='inconnu')
+        self.add(date(2000, 1, 1), gender='M')
+        self.add(date(1980, 1, 1), is_active=False)
+        self.add(date(1980, 1, 1), doctor=self.other_doctor)
+
+        statistics = stats.compute_patient_statistics(self.doctor.id, self.today)
+        self.assertEqual(
+            {key: statistics[key] for key in ('total_patients', 'male_patients', 'female_patients', 'other_patients')},
+            {'total_patients': 5, 'male_patients': 2, 'female_patients': 2, 'other_patients': 1}
+        )
+        self.assertEqual(statistics['gender_distribution'], {'male_percentage': 40.0, 'female_percentage': 40.0})
+        blood_types = statistics['blood_type_distribution']
+        self.assertEqual((blood_types['A+'], blood_types['AB-'], blood_types['O+']), (1, 1, 1))
+        self.assertEqual((blood_types['other'], blood_types['unknown']), (1, 1))
+        self.assertEqual(sum(blood_types.values()), 5)
+
+        empty = stats.compute_patient_statistics(create_user('new').id, self.today)
+        self.assertEqual(empty['total_patients'], 0)
+        self.assertEqual(empty['gender_distribution'], {'male_percentage': 0, 'female_percentage': 0})
+
+    def test_recent(self):
+        self.add(date(1980, 1, 1))
+        Patient.objects.update(created_at=timezone.make_aware(datetime(2026, 2, 1)))
+        self.add(date(1980, 1, 1))
+        # Created RECENT_DAYS days ago or less
+        for today, recent in ((date(2026, 3, 3), 2), (date(2026, 3, 4), 1)):
+            statistics = stats.compute_patient_statistics(self.doctor.id, today)
+            self.assertEqual(statistics['recent_patients'], recent)
+
+    def test_age_buckets(self):
+        # Birthdays on the boundaries: 18 today, 18 tomorrow, 75 today, 75 tomorrow
+        for date_of_birth in (date(2008, 3, 15), date(2008, 3, 16), date(1951, 3, 15), date(1951, 3, 16),
+                              date(2026, 3, 15), date(1996, 3, 15), date(1996, 3, 16)):
+            self.add(date_of_birth)
+        self.assertEqual(
+            stats.compute_patient_statistics(self.doctor.id, self.today)['age_distribution'],
+            {'0-17': 2, '18-29': 2, '30-44': 1, '45-59': 0, '60-74': 1, '75+': 1}
+        )
+
+    def test_leap_day(self):
+        self.assertEqual(stats.years_before(date(2024, 2, 29), 1), date(2023, 2, 28))
+        self.assertEqual(stats.years_before(date(2024, 2, 29), 4), date(2020, 2, 29))
+
+
+@override_settings(PATIENT_STATS_CACHE_ALIAS='default', PATIENT_STATS_CACHE_TIMEOUT=60)
+class PatientStatisticsCacheTests(TestCase):
+    """Cached statistics are dropped when one of the doctor's patients changes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = create_user('doctor')
+        cls.other_doctor = create_user('other')
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def total(self, doctor):
+        return stats.get_patient_statistics(doctor.id)['total_patients']
+
+    def test_cached(self):
+        create_patient(doctor=self.doctor)
+        self.assertEqual(self.total(self.doctor), 1)
+        with mock.patch.object(stats, 'compute_patient_statistics') as compute:
+            self.assertEqual(self.total(self.doctor), 1)
+        compute.assert_not_called()
+
+    def test_creation_and_deletion(self):
+        self.assertEqual(self.total(self.doctor), 0)
+        patient = create_patient(doctor=self.doctor)
+        self.assertEqual(self.total(self.doctor), 1)
+        patient.delete()
+        self.assertEqual(self.total(self.doctor), 0)
+
+    def test_reassignment(self):
+        patient = create_patient(doctor=self.doctor)
+        self.assertEqual((self.total(self.doctor), self.total(self.other_doctor)), (1, 0))
+
+        patient.doctor = self.other_doctor
+        patient.save()
+        self.assertEqual((self.total(self.doctor), self.total(self.other_doctor)), (0, 1))
+
+        patient.doctor = self.doctor
+        patient.save()
+        self.assertEqual((self.total(self.doctor), self.total(self.other_doctor)), (1, 0))
+
+        patient.is_active = False
+        patient.save()
+        self.assertEqual((self.total(self.doctor), self.total(self.other_doctor)), (0, 0))
+
+    def test_stale_day(self):
+        create_patient(doctor=self.doctor)
+        self.total(self.doctor)
+        with mock.patch.object(stats.timezone, 'localdate', return_value=timezone.localdate() + timedelta(days=1)):
+            with mock.patch.object(stats, 'compute_patient_statistics', return_value={'total_patients': 1}) as compute:
+                self.total(self.doctor)
+        compute.assert_called_once()
+
+
+class ConsultationVitalsParsingTests(SimpleTestCase):
+    """The consultations' vital_signs JSON is free-form"""
+
+    def test_short_keys_and_blood_pressure(self):
+        self.assertEqual(
+            vitals.parse_consultation_vitals({'bp': '120/80', 'hr': 72, 'temp': 37.25, 'rr': '16', 'spo2': 98}),
+            {
+                'systolic_bp': 120, 'diastolic_bp': 80, 'heart_rate': 72,
+                'temperature': Decimal('37.2'), 'respiratory_rate': 16, 'oxygen_saturation': 98,
+            }
+        )
+
+    def test_text_values(self):
+        self.assertEqual(
+            vitals.parse_consultation_vitals({'heart_rate': '72 bpm', 'temperature': '38,5 °C', 'weight': '70kg'}),
+            {'heart_rate': 72, 'temperature': Decimal('38.5'), 'weight': Decimal('70.0')}
+        )
+
+    def test_invalid_values_dropped(self):
+        self.assertEqual(
+            vitals.parse_consultation_vitals({
+                'hr': 500, 'spo2': True, 'temp': 'normal', 'rr': -12, 'bp': '120', 'weight': None, 'notes': 'ok',
+            }),
+            {}
+        )
+        self.assertEqual(vitals.parse_consultation_vitals({'bp': '400/80'}), {'diastolic_bp': 80})
+        for data in (None, [], 'bp 120/80'):
+            self.assertEqual(vitals.parse_consultation_vitals(data), {})
+
+    def test_bmi(self):
+        self.assertEqual(vitals.parse_consultation_vitals({'weight': 80, 'height': 180})['bmi'], Decimal('24.7'))
+        self.assertEqual(vitals.parse_consultation_vitals({'weight': 80, 'height': 180, 'bmi': 25})['bmi'], Decimal('25.0'))
+        self.assertNotIn('bmi', vitals.parse_consultation_vitals({'weight': 80}))
+
+
+class VitalSignSyncTests(TestCase):
+    """The signals copy every vitals source into PatientVitalSign"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = create_user('doctor')
+        cls.patient = create_patient()
+        cls.patient_user = create_user('jean', 'patient', email=cls.patient.email)
+        cls.day = timezone.make_aware(datetime.combine(date(2026, 3, 2), time(9)))
+
+    def entries(self, **filters):
+        return list(PatientVitalSign.objects.filter(**filters).order_by('source', 'source_id').values_list(
+            'patient_id', 'source', 'heart_rate'
+        ))
+
+    def test_medical_record(self):
+        record = PatientMedicalRecord.objects.create(
+            patient=self.patient, doctor=self.doctor, recorded_at=self.day, heart_rate=70
+        )
+        self.assertEqual(self.entries(), [(self.patient.id, 'medical_record', 70)])
+        record.heart_rate = 75
+        record.save()
+        self.assertEqual(self.entries(), [(self.patient.id, 'medical_record', 75)])
+        record.delete()
+        self.assertEqual(self.entries(), [])
+
+    def test_consultation(self):
+        consultation = create_consultation(self.doctor, self.patient_user, self.day, {'hr': 80})
+        vital_signs = VitalSigns.objects.create(consultation=consultation, heart_rate=85)
+        self.assertEqual(self.entries(), [
+            (self.patient.id, 'consultation', 80), (self.patient.id, 'consultation_vitals', 85)
+        ])
+
+        consultation.vital_signs = {'notes': 'RAS'}
+        consultation.save()
+        vital_signs.heart_rate = 90
+        vital_signs.save()
+        self.assertEqual(self.entries(), [(self.patient.id, 'consultation_vitals', 90)])
+
+        vital_signs.delete()
+        self.assertEqual(self.entries(), [])
+
+    def test_patient_email_change(self):
+        create_consultation(self.doctor, self.patient_user, self.day, {'hr': 80})
+        other = create_patient('Paul', 'Martin')
+        self.assertEqual(self.entries(patient=other), [])
+
+        other.email = self.patient.email
+        other.save()
+        self.assertEqual(self.entries(patient=other), [(other.id, 'consultation', 80)])
+        self.patient.email = 'jean.dupont@example.org'
+        self.patient.save()
+        self.assertEqual(self.entries(patient=self.patient), [])
+
+    def test_backfill_migration(self):
+        PatientMedicalRecord.objects.create(patient=self.patient, recorded_at=self.day, heart_rate=70)
+        consultation = create_consultation(self.doctor, self.patient_user, self.day, {'hr': 80})
+        VitalSigns.objects.create(consultation=consultation, heart_rate=85)
+        expected = self.entries()
+        # Entries the signals wrote since 0007 are kept, the others backfilled
+        PatientVitalSign.objects.exclude(source='consultation').delete()
+
+        migration = importlib.import_module('patients.migrations.0008_backfill_patientvitalsign')
+        migration.backfill_vital_signs(apps, None)
+        self.assertEqual(self.entries(), expected)
+        self.assertEqual(len(expected), 3)
+
+
+class MedicamentStatusTests(APITestCase):
+    """Expired active medications read as completed until the daily job stores it"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = create_user('doctor')
+        cls.patient = create_patient(doctor=cls.doctor)
+        cls.today = timezone.localdate()
+        day = timedelta(days=1)
+        cls.medicaments = {
+            name: Medicament.objects.create(
+                patient=cls.patient, doctor=cls.doctor, name=name, dosage='500mg', frequency='2x/jour',
+                start_date=start, end_date=end, status=status
+            )
+            for name, start, end, status in (
+                ('ends_today', cls.today - 10 * day, cls.today, 'active'),
+                ('ended_yesterday', cls.today - 10 * day, cls.today - day, 'active'),
+                ('upcoming', cls.today + day, cls.today + 10 * day, 'active'),
+                ('no_end_date', cls.today - 100 * day, None, 'active'),
+                ('stopped', cls.today - 10 * day, cls.today - day, 'stopped'),
+            )
+        }
+
+    def statuses(self, today=None):
+        queryset = medicaments.with_current_status(Medicament.objects.all(), today)
+        return dict(queryset.values_list('name', 'current_status'))
+
+    def test_annotated_status(self):
+        expected = {
+            'ends_today': 'active', 'ended_yesterday': 'completed', 'upcoming': 'active',
+            'no_end_date': 'active', 'stopped': 'stopped',
+        }
+        self.assertEqual(self.statuses(), expected)
+        # The model method gives the same result without the annotation
+        self.assertEqual(
+            {name: medicaments.current_status(medicament) for name, medicament in self.medicaments.items()},
+            expected
+        )
+
+    def test_status_on_other_days(self):
+        self.assertEqual(self.statuses(self.today + timedelta(days=1))['ends_today'], 'completed')
+        self.assertEqual(self.statuses(self.today + timedelta(days=11))['upcoming'], 'completed')
+        self.assertEqual(self.statuses(self.today - timedelta(days=1))['ended_yesterday'], 'active')
+
+    def test_api_status_and_filter(self):
+        self.client.force_authenticate(self.doctor)
+        url = reverse('medicament_list_create')
+        results = self.client.get(url).data['results']
+        self.assertEqual({row['name']: row['status'] for row in results}['ended_yesterday'], 'completed')
+
+        for status, names in (('completed', ['ended_yesterday']), ('active', ['ends_today', 'no_end_date', 'upcoming'])):
+            results = self.client.get(url, {'status': status}).data['results']
+            self.assertEqual(sorted(row['name'] for row in results), names)
+        # Reads never write
+        self.assertEqual(Medicament.objects.get(name='ended_yesterday').status, 'active')
+
+    def test_expire(self):
+        self.assertEqual(medicaments.expire_medicaments(self.today), 1)
+        self.assertEqual(
+            dict(Medicament.objects.values_list('name', 'status')),
+            {
+                'ends_today': 'active', 'ended_yesterday': 'completed', 'upcoming': 'active',
+                'no_end_date': 'active', 'stopped': 'stopped',
+            }
+        )
+        self.assertEqual(medicaments.expire_medicaments(self.today), 0)
+        self.assertEqual(medicaments.expire_medicaments(self.today + timedelta(days=1)), 1)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('expire_medicaments', stdout=out)
+        self.assertEqual(out.getvalue().strip(), f"{self.today}: completed 1 expired medication(s)")
+        self.assertEqual(Medicament.objects.filter(status='completed').count(), 1)
+
+    def test_command_loop_runs_once_a_day(self):
+        days = [self.today, self.today, self.today + timedelta(days=1)]
+        out = StringIO()
+        with mock.patch('patients.management.commands.expire_medicaments.timezone.localdate', side_effect=days), \
+                mock.patch('patients.management.commands.expire_medicaments.time.sleep',
+                           side_effect=[None, None, KeyboardInterrupt]):
+            with self.assertRaises(KeyboardInterrupt):
+                call_command('expire_medicaments', loop=True, interval=0, stdout=out)
+        self.assertEqual(out.getvalue().splitlines(), [
+            f"{self.today}: completed 1 expired medication(s)",
+            f"{self.today + timedelta(days=1)}: completed 1 expired medication(s)",
+        ])
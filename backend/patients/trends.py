@@ -0,0 +1,277 @@
+"""
+Vital-sign trends of a patient.
+
+PatientVitalSign is the time series: one row per measurement, whether it was
+entered in a medical record or during a consultation (see vitals.py), read in
+recorded_at order through the (patient, -recorded_at, -id) index. Only the
+recorded_at column and the requested metrics are fetched, as plain numbers
+read from the cursor straight into NumPy arrays. The database converts
+recorded_at to epoch milliseconds and the decimals to floats: Django's
+per-value datetime and Decimal conversion would cost more than the query.
+
+The series are downsampled server side to at most `points` points, so a trend
+chart does not download every record:
+
+    minmax  - the range between the first and last measurement is cut into
+              `points` buckets of equal duration; every bucket gives the min,
+              max and average of each metric (spikes remain visible)
+    lttb    - Largest-Triangle-Three-Buckets: `points` actual measurements are
+              kept per metric, chosen to preserve the visual shape of the curve
+
+The payload is columnar (one array per column) with timestamps as Unix epoch
+milliseconds:
+
+    minmax: {"t": [...], "count": [...],
+             "series": {"heart_rate": {"min": [...], "max": [...], "avg": [...]}, ...}}
+    lttb:   {"series": {"heart_rate": {"t": [...], "value": [...]}, ...}}
+
+Empty buckets are left out, and a metric that was not measured in a bucket
+has null values there.
+"""
+from datetime import datetime, time, timedelta
+
+import numpy as np
+from django.db import connection
+from django.db.models import FloatField, Func
+from django.db.models.functions import Cast
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import PatientVitalSign
+
+
+class EpochMilliseconds(Func):
+    """Milliseconds since the Unix epoch of a datetime column, as a float"""
+    output_field = FloatField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        # Datetimes are stored as UTC text
+        return self.as_sql(
+            compiler, connection,
+            template="((julianday(%(expressions)s) - 2440587.5) * 86400000.0)", **extra_context
+        )
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection, template="(EXTRACT(EPOCH FROM %(expressions)s) * 1000.0)", **extra_context
+        )
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection, template="(UNIX_TIMESTAMP(%(expressions)s) * 1000.0)", **extra_context
+        )
+
+
+# Metric name -> PatientVitalSign field
+METRICS = {
+    'systolic_bp': 'systolic_bp',
+    'diastolic_bp': 'diastolic_bp',
+    'heart_rate': 'heart_rate',
+    'oxygen_saturation': 'oxygen_saturation',
+    'weight': 'weight',
+    'bmi': 'bmi',
+    'temperature': 'temperature',
+    'respiratory_rate': 'respiratory_rate',
+    'waist_circumference': 'waist_circumference',
+}
+
+# Returned when the request does not name any
+DEFAULT_METRICS = ['systolic_bp', 'diastolic_bp', 'heart_rate', 'oxygen_saturation', 'weight', 'bmi']
+
+MODES = ('minmax', 'lttb')
+
+DEFAULT_POINTS = 200
+MAX_POINTS = 2000
+
+
+def parse_bound(value, end=False):
+    """
+    Parse a range bound: an ISO 8601 datetime, or a date (whole day included).
+
+    Raises:
+        ValueError: If the value is neither
+    """
+    try:
+        day = parse_date(value)
+    except ValueError:
+        day = None
+    if day is not None:
+        moment = datetime.combine(day + timedelta(days=1) if end else day, time.min)
+    else:
+        moment = parse_datetime(value)
+        if moment is None:
+            raise ValueError(value)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def load_series(patient_id, metrics, start=None, end=None):
+    """
+    Measurements of a patient in [start, end), oldest first.
+
+    Returns:
+        Tuple (timestamps, values): epoch milliseconds (int64 array) and a
+        dictionary metric -> float array with NaN where it was not measured
+    """
+    records = PatientVitalSign.objects.filter(patient_id=patient_id)
+    if start is not None:
+        records = records.filter(recorded_at__gte=start)
+    if end is not None:
+        records = records.filter(recorded_at__lt=end)
+    sql, params = records.order_by('recorded_at', 'id').values_list(
+        EpochMilliseconds('recorded_at'),
+        *(Cast(METRICS[metric], FloatField()) for metric in metrics)
+    ).query.sql_with_params()
+    # Every column is already a number: skip the queryset's per-value converters
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    table = np.array(rows, dtype=object).reshape(len(rows), len(metrics) + 1)
+    table[np.equal(table, None)] = np.nan
+    table = table.astype(np.float64)
+    timestamps = np.round(table[:, 0]).astype(np.int64)
+    values = {metric: table[:, column] for column, metric in enumerate(metrics, start=1)}
+    return timestamps, values
+
+
+def _column(array, decimals=2):
+    """JSON-ready list of a float array, with None for NaN"""
+    return [None if np.isnan(value) else value for value in np.round(array, decimals).tolist()]
+
+
+def downsample_minmax(timestamps, values, points):
+    """
+    Min, max and average of every metric per bucket of equal duration.
+
+    Returns:
+        Dictionary with the bucket start times ("t"), the number of
+        measurements per bucket ("count") and the per-metric columns ("series")
+    """
+    if len(timestamps) <= points:
+        # Nothing to aggregate: one bucket per measurement
+        return {
+            't': timestamps.tolist(),
+            'count': [1] * len(timestamps),
+            'series': {
+                metric: {'min': _column(column), 'max': _column(column), 'avg': _column(column)}
+                for metric, column in values.items()
+            },
+        }
+
+    first, last = int(timestamps[0]), int(timestamps[-1])
+    width = max((last - first) / points, 1)
+    buckets = np.minimum(((timestamps - first) / width).astype(np.int64), points - 1)
+    # Timestamps are sorted, so are the bucket numbers: reduce contiguous runs
+    used, starts, counts = np.unique(buckets, return_index=True, return_counts=True)
+
+    series = {}
+    for metric, column in values.items():
+        measured = ~np.isnan(column)
+        n = np.add.reduceat(measured.astype(np.int64), starts)
+        total = np.add.reduceat(np.where(measured, column, 0.0), starts)
+        low = np.minimum.reduceat(np.where(measured, column, np.inf), starts)
+        high = np.maximum.reduceat(np.where(measured, column, -np.inf), starts)
+        empty = n == 0
+        with np.errstate(invalid='ignore', divide='ignore'):
+            average = np.where(empty, np.nan, total / n)
+        series[metric] = {
+            'min': _column(np.where(empty, np.nan, low)),
+            'max': _column(np.where(empty, np.nan, high)),
+            'avg': _column(average),
+        }
+
+    return {
+        't': [round(first + bucket * width) for bucket in used.tolist()],
+        'count': counts.tolist(),
+        'series': series,
+    }
+
+
+def lttb(x, y, points):
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+
+    Args:
+        x: Sorted timestamps
+        y: Values (no NaN)
+        points: Number of points kept (at least 3)
+
+    Returns:
+        Indices of the kept points, always including the first and last
+    """
+    n = len(x)
+    if n <= points:
+        return np.arange(n)
+
+    x = x.astype(np.float64)
+    # Inner buckets of (almost) equal size between the first and last points
+    edges = np.linspace(1, n - 1, points - 1).astype(np.int64)
+    selected = np.empty(points, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+
+    previous = 0
+    for bucket in range(points - 2):
+        lo, hi = edges[bucket], edges[bucket + 1]
+        # The next bucket's average (the last point for the last bucket)
+        if bucket + 2 < len(edges):
+            next_lo, next_hi = edges[bucket + 1], edges[bucket + 2]
+            next_x, next_y = x[next_lo:next_hi].mean(), y[next_lo:next_hi].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        # Twice the area of the triangle (previous, candidate, next average)
+        areas = np.abs(
+            (x[previous] - next_x) * (y[lo:hi] - y[previous])
+            - (x[previous] - x[lo:hi]) * (next_y - y[previous])
+        )
+        previous = lo + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+    return selected
+
+
+def downsample_lttb(timestamps, values, points):
+    """
+    LTTB of every metric, on its own measurements.
+
+    Returns:
+        Dictionary with the per-metric columns "t" and "value" ("series")
+    """
+    series = {}
+    for metric, column in values.items():
+        measured = ~np.isnan(column)
+        x, y = timestamps[measured], column[measured]
+        kept = lttb(x, y, max(points, 3))
+        series[metric] = {'t': x[kept].tolist(), 'value': _column(y[kept])}
+    return {'series': series}
+
+
+def vital_trends(patient_id, metrics=None, start=None, end=None, points=DEFAULT_POINTS, mode='minmax'):
+    """
+    Downsampled vital-sign series of a patient.
+
+    Args:
+        patient_id: Id of the patient
+        metrics: Names from METRICS (default: DEFAULT_METRICS)
+        start, end: Aware datetimes bounding the range (end excluded)
+        points: Maximum number of points per series (at least 3 with lttb)
+        mode: 'minmax' or 'lttb'
+
+    Returns:
+        Columnar payload (see the module docstring) with the number of
+        measurements in the range ("measurements")
+    """
+    metrics = list(metrics or DEFAULT_METRICS)
+    timestamps, values = load_series(patient_id, metrics, start, end)
+
+    if mode == 'lttb':
+        payload = downsample_lttb(timestamps, values, points)
+    else:
+        payload = downsample_minmax(timestamps, values, points)
+    return {
+        'patient': patient_id,
+        'mode': mode,
+        'points': points,
+        'measurements': len(timestamps),
+        **payload,
+    }
@@ -25,6 +25,8 @@ urlpatterns = [
     path('medical-records/', views.PatientMedicalRecordListCreateView.as_view(), name='medical_records_list'),
     path('medical-records/<int:pk>/', views.PatientMedicalRecordDetailView.as_view(), name='medical_record_detail'),
     path('<int:patient_id>/medical-records/latest/', views.patient_latest_medical_record, name='latest_medical_record'),
+    path('<int:patient_id>/medical-records/trends/', views.patient_vital_trends, name='vital_trends'),
+    path('<int:patient_id>/vitals/', views.patient_vital_history, name='vital_history'),
     path('my-medical-records/', views.my_medical_records, name='my_medical_records'),
     
     # Medicaments endpoints
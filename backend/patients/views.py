@@ -2,9 +2,14 @@ from rest_framework import generics, permissions, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework.filters import SearchFilter, OrderingFilter
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import CursorPagination
 from django.db.models import Q, Count
-from .models import Patient, PatientSpecialist, PatientMedicalRecord, Medicament
+from .models import Patient, PatientSpecialist, PatientMedicalRecord, PatientVitalSign, Medicament
+from .search import PatientSearchFilter, search_patients
+from .stats import get_patient_statistics
+from . import trends
+from .medicaments import MedicamentFilter, with_current_status
 from .serializers import (
     PatientSerializer, 
     PatientCreateSerializer, 
@@ -13,6 +18,7 @@ from .serializers import (
     AssignSpecialistSerializer,
     PatientMedicalRecordSerializer,
     PatientMedicalRecordListSerializer,
+    PatientVitalSignSerializer,
     MedicamentSerializer
 )
 from accounts.models import User
@@ -23,8 +29,8 @@ class PatientListCreateView(generics.ListCreateAPIView):
     List all patients for the authenticated doctor or create a new patient
     """
     permission_classes = [permissions.IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
-    search_fields = ['first_name', 'last_name', 'phone', 'email']
+    # ?search= matches name/email word prefixes and phone digits (see search.py)
+    filter_backends = [DjangoFilterBackend, PatientSearchFilter, OrderingFilter]
     filterset_fields = ['gender', 'is_active']
     ordering_fields = ['created_at', 'last_name', 'date_of_birth']
     ordering = ['-created_at']
@@ -61,20 +67,19 @@ class PatientDetailView(generics.RetrieveUpdateDestroyAPIView):
 def patient_search(request):
     """
     Advanced search for patients
+    
+    Type-ahead search through the patient search index: every word of the
+    query must start a word of the patient's names or email (accents are
+    ignored), or the query is matched against the phone number digits.
+    Best matches first.
     """
     query = request.GET.get('q', '')
     if not query:
         return Response({'error': 'Paramètre de recherche requis'}, status=status.HTTP_400_BAD_REQUEST)
     
-    # Search in multiple fields
-    patients = Patient.objects.filter(
-        Q(doctor=request.user) & Q(is_active=True) & (
-            Q(first_name__icontains=query) |
-            Q(last_name__icontains=query) |
-            Q(phone__icontains=query) |
-            Q(email__icontains=query)
-        )
-    )[:10]  # Limit to 10 results
+    patient_ids = search_patients(request.user.id, query, limit=10)  # Limit to 10 results
+    patients = Patient.objects.filter(id__in=patient_ids, doctor=request.user, is_active=True).in_bulk()
+    patients = [patients[patient_id] for patient_id in patient_ids if patient_id in patients]
     
     serializer = PatientListSerializer(patients, many=True)
     return Response(serializer.data)
@@ -84,30 +89,11 @@ def patient_search(request):
 def patient_statistics(request):
     """
     Get statistics about patients
-    """
-    total_patients = Patient.objects.filter(doctor=request.user, is_active=True).count()
-    male_patients = Patient.objects.filter(doctor=request.user, is_active=True, gender='M').count()
-    female_patients = Patient.objects.filter(doctor=request.user, is_active=True, gender='F').count()
     
-    # Recent patients (last 30 days)
-    from datetime import date, timedelta
-    thirty_days_ago = date.today() - timedelta(days=30)
-    recent_patients = Patient.objects.filter(
-        doctor=request.user, 
-        is_active=True,
-        created_at__gte=thirty_days_ago
-    ).count()
-    
-    return Response({
-        'total_patients': total_patients,
-        'male_patients': male_patients,
-        'female_patients': female_patients,
-        'recent_patients': recent_patients,
-        'gender_distribution': {
-            'male_percentage': (male_patients / total_patients * 100) if total_patients > 0 else 0,
-            'female_percentage': (female_patients / total_patients * 100) if total_patients > 0 else 0,
-        }
-    })
+    Counts, age buckets and blood-type distribution of the doctor's active
+    patients, computed in one query and briefly cached (see stats.py).
+    """
+    return Response(get_patient_statistics(request.user.id))
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
@@ -459,6 +445,31 @@ class PatientMedicalRecordDetailView(generics.RetrieveUpdateDestroyAPIView):
             return PatientMedicalRecord.objects.none()
 
 
+def _medical_record_access_error(user, patient):
+    """
+    403 response if the user may not read the patient's medical records:
+    only the patient and their doctors may.
+    """
+    if user.user_type == 'patient':
+        if patient.email != user.email:
+            return Response(
+                {'error': 'Vous n\'avez accès qu\'à vos propres dossiers'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+    elif user.user_type == 'doctor':
+        if patient.doctor_id != user.id and patient.primary_doctor_id != user.id:
+            return Response(
+                {'error': 'Vous n\'êtes pas autorisé à voir ce dossier'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+    else:
+        return Response(
+            {'error': 'Accès non autorisé'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    return None
+
+
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def patient_latest_medical_record(request, patient_id):
@@ -475,23 +486,9 @@ def patient_latest_medical_record(request, patient_id):
         )
     
     # Check permissions
-    if request.user.user_type == 'patient':
-        if patient.email != request.user.email:
-            return Response(
-                {'error': 'Vous n\'avez accès qu\'à vos propres dossiers'},
-                status=status.HTTP_403_FORBIDDEN
-            )
-    elif request.user.user_type == 'doctor':
-        if patient.doctor != request.user and patient.primary_doctor != request.user:
-            return Response(
-                {'error': 'Vous n\'êtes pas autorisé à voir ce dossier'},
-                status=status.HTTP_403_FORBIDDEN
-            )
-    else:
-        return Response(
-            {'error': 'Accès non autorisé'},
-            status=status.HTTP_403_FORBIDDEN
-        )
+    denied = _medical_record_access_error(request.user, patient)
+    if denied:
+        return denied
     
     # Get latest medical record
     medical_record = PatientMedicalRecord.objects.filter(patient=patient).first()
@@ -505,6 +502,130 @@ def patient_latest_medical_record(request, patient_id):
     return Response(serializer.data)
 
 
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def patient_vital_trends(request, patient_id):
+    """
+    Downsampled vital-sign series of a patient, for trend charts.
+    
+    Query parameters:
+        metrics: Comma-separated metric names (default: blood pressure, heart
+            rate, SpO2, weight and BMI; see trends.METRICS)
+        start, end: ISO 8601 datetimes or dates (end date included)
+        points: Maximum number of points per series (default 200)
+        mode: 'minmax' (min/max/avg per time bucket, default) or 'lttb'
+    """
+    try:
+        patient = Patient.objects.get(id=patient_id)
+    except Patient.DoesNotExist:
+        return Response(
+            {'error': 'Patient non trouvé'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    
+    denied = _medical_record_access_error(request.user, patient)
+    if denied:
+        return denied
+    
+    metrics = [name.strip() for name in request.query_params.get('metrics', '').split(',') if name.strip()]
+    unknown = [name for name in metrics if name not in trends.METRICS]
+    if unknown:
+        return Response(
+            {'error': f"Unknown metrics: {', '.join(unknown)}. Available: {', '.join(trends.METRICS)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    mode = request.query_params.get('mode', 'minmax').lower()
+    if mode not in trends.MODES:
+        return Response(
+            {'error': f"Invalid mode. Use one of: {', '.join(trends.MODES)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    try:
+        points = min(max(int(request.query_params.get('points', trends.DEFAULT_POINTS)), 1), trends.MAX_POINTS)
+    except ValueError:
+        return Response(
+            {'error': 'points must be an integer'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    bounds = {}
+    for name in ('start', 'end'):
+        value = request.query_params.get(name)
+        if value:
+            try:
+                bounds[name] = trends.parse_bound(value, end=(name == 'end'))
+            except ValueError:
+                return Response(
+                    {'error': f"Invalid {name}. Use an ISO 8601 date or datetime"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+    
+    return Response(trends.vital_trends(patient.id, metrics, points=points, mode=mode, **bounds))
+
+
+class VitalSignHistoryPagination(CursorPagination):
+    """Newest first, paged along the (patient, -recorded_at, -id) index"""
+    ordering = ('-recorded_at', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def patient_vital_history(request, patient_id):
+    """
+    Full vital-signs history of a patient: medical records, consultation
+    vital signs and the vitals noted in consultations, newest first (see
+    vitals.py).
+    
+    Query parameters:
+        source: Only this source (medical_record, consultation_vitals, consultation)
+        start, end: ISO 8601 datetimes or dates (end date included)
+        cursor, page_size: Pagination
+    """
+    try:
+        patient = Patient.objects.get(id=patient_id)
+    except Patient.DoesNotExist:
+        return Response(
+            {'error': 'Patient non trouvé'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    
+    denied = _medical_record_access_error(request.user, patient)
+    if denied:
+        return denied
+    
+    entries = PatientVitalSign.objects.filter(patient=patient).select_related('recorded_by')
+    
+    source = request.query_params.get('source')
+    if source:
+        if source not in dict(PatientVitalSign.SOURCE_CHOICES):
+            return Response(
+                {'error': f"Invalid source. Use one of: {', '.join(dict(PatientVitalSign.SOURCE_CHOICES))}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        entries = entries.filter(source=source)
+    
+    for name, lookup in (('start', 'recorded_at__gte'), ('end', 'recorded_at__lt')):
+        value = request.query_params.get(name)
+        if value:
+            try:
+                entries = entries.filter(**{lookup: trends.parse_bound(value, end=(name == 'end'))})
+            except ValueError:
+                return Response(
+                    {'error': f"Invalid {name}. Use an ISO 8601 date or datetime"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+    
+    paginator = VitalSignHistoryPagination()
+    page = paginator.paginate_queryset(entries, request)
+    serializer = PatientVitalSignSerializer(page, many=True)
+    return paginator.get_paginated_response(serializer.data)
+
+
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def my_medical_records(request):
@@ -533,22 +654,23 @@ class MedicamentListCreateView(generics.ListCreateAPIView):
     serializer_class = MedicamentSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend, OrderingFilter]
-    filterset_fields = ['patient', 'doctor', 'status']
+    # ?status= matches the current status (expired medications are completed)
+    filterset_class = MedicamentFilter
     ordering_fields = ['start_date', 'created_at']
     ordering = ['-start_date']
     
     def get_queryset(self):
         user = self.request.user
         if user.user_type == 'doctor':
-            return Medicament.objects.filter(
+            return with_current_status(Medicament.objects.filter(
                 patient__in=Patient.objects.filter(
                     Q(doctor=user) | Q(primary_doctor=user)
                 )
-            )
+            ))
         elif user.user_type == 'patient':
             try:
                 patient = Patient.objects.get(email=user.email)
-                return Medicament.objects.filter(patient=patient)
+                return with_current_status(Medicament.objects.filter(patient=patient))
             except Patient.DoesNotExist:
                 return Medicament.objects.none()
         return Medicament.objects.none()
@@ -581,10 +703,8 @@ class MedicamentDetailView(generics.RetrieveUpdateDestroyAPIView):
 def my_medicaments(request):
     """
     Get all medicaments for the authenticated patient.
-    Auto-completes expired medications.
+    Expired medications are returned as completed (see medicaments.py).
     """
-    from datetime import date
-    
     if request.user.user_type != 'patient':
         return Response(
             {'error': 'Seuls les patients peuvent accéder à cette ressource'},
@@ -594,14 +714,9 @@ def my_medicaments(request):
     try:
         patient = Patient.objects.get(email=request.user.email)
         
-        # Auto-complete expired medications
-        Medicament.objects.filter(
-            patient=patient,
-            status='active',
-            end_date__lt=date.today()
-        ).update(status='completed')
-        
-        medicaments = Medicament.objects.filter(patient=patient).order_by('-start_date')
+        # Expired medications are completed by the expire_medicaments job:
+        # derive their status instead of writing on a read
+        medicaments = with_current_status(Medicament.objects.filter(patient=patient)).order_by('-start_date')
         serializer = MedicamentSerializer(medicaments, many=True)
         return Response(serializer.data)
     except Patient.DoesNotExist:
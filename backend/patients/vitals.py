@@ -0,0 +1,305 @@
+"""
+Longitudinal vital signs of a patient.
+
+Vitals are recorded in three places:
+    medical_record       - PatientMedicalRecord rows (doctor space)
+    consultation_vitals  - consultations.VitalSigns rows
+    consultation         - the consultations.Consultation.vital_signs JSON
+                           ({"bp": "120/80", "hr": 72, "temp": 37.2, ...})
+
+PatientVitalSign is a denormalized copy of all three with the values as typed
+columns: one row per source row and patient, under a (patient, -recorded_at,
+-id) index. A patient's full history is one index range scan, without JSON parsing
+at read time.
+
+Consultations belong to the patient's user account (appointment.patient). They
+are attached to the Patient records with the same email, which is how patient
+accounts are linked to Patient records everywhere else. The timestamp of the
+JSON vitals is the consultation's start time, or its creation time if it was
+never started.
+
+The rows are kept in sync by the signal handlers in signals.py; migration
+0008 backfilled the vitals recorded before. Run
+`python manage.py rebuild_patient_vitals` after changes that bypass the
+signals (queryset.update(), raw SQL, a patient user changing their email).
+"""
+import re
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Q
+
+from .models import Patient, PatientMedicalRecord, PatientVitalSign
+
+VITAL_FIELDS = [
+    'systolic_bp', 'diastolic_bp', 'heart_rate', 'temperature', 'respiratory_rate',
+    'oxygen_saturation', 'weight', 'height', 'waist_circumference', 'bmi',
+]
+
+# Short keys of the Consultation.vital_signs JSON (model field names are also accepted)
+CONSULTATION_JSON_KEYS = {
+    'hr': 'heart_rate',
+    'temp': 'temperature',
+    'rr': 'respiratory_rate',
+    'spo2': 'oxygen_saturation',
+}
+
+BATCH_SIZE = 2000
+
+_NUMBER = re.compile(r'-?\d+(?:[.,]\d+)?')
+
+
+def _field_value(name, value):
+    """
+    A raw value converted to the type of the PatientVitalSign field, or None
+    if it is not a number that fits the column and the ranges accepted by
+    PatientMedicalRecord (JSON values are not validated anywhere else).
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    if not isinstance(value, (int, float, Decimal)):
+        match = _NUMBER.search(str(value))
+        if not match:
+            return None
+        value = match.group().replace(',', '.')
+    try:
+        number = Decimal(str(value))
+    except InvalidOperation:
+        return None
+    if not number.is_finite() or number < 0:
+        return None
+
+    field = PatientVitalSign._meta.get_field(name)
+    if field.get_internal_type() == 'DecimalField':
+        number = number.quantize(Decimal(1).scaleb(-field.decimal_places))
+    else:
+        number = int(number.to_integral_value())
+    try:
+        # Column validators (digits, integer range) and the clinical ranges
+        field.run_validators(number)
+        PatientMedicalRecord._meta.get_field(name).run_validators(number)
+    except ValidationError:
+        return None
+    return number
+
+
+def _bmi(weight, height):
+    """BMI from kg and cm, rounded like the source models"""
+    if not weight or not height:
+        return None
+    height_m = float(height) / 100
+    return _field_value('bmi', round(float(weight) / (height_m * height_m), 1))
+
+
+def parse_consultation_vitals(data):
+    """
+    Vitals of a Consultation.vital_signs JSON.
+
+    Returns:
+        Dictionary of PatientVitalSign field -> value, for the values present
+    """
+    if not isinstance(data, dict):
+        return {}
+
+    values = {}
+    for key, raw in data.items():
+        name = CONSULTATION_JSON_KEYS.get(key, key)
+        if name in VITAL_FIELDS and name != 'bmi':
+            value = _field_value(name, raw)
+            if value is not None:
+                values[name] = value
+
+    # Blood pressure is written "120/80"
+    blood_pressure = data.get('bp')
+    if isinstance(blood_pressure, str) and '/' in blood_pressure:
+        systolic, _, diastolic = blood_pressure.partition('/')
+        for name, raw in (('systolic_bp', systolic), ('diastolic_bp', diastolic)):
+            value = _field_value(name, raw)
+            if value is not None:
+                values[name] = value
+
+    bmi = _field_value('bmi', data.get('bmi')) or _bmi(values.get('weight'), values.get('height'))
+    if bmi is not None:
+        values['bmi'] = bmi
+    return values
+
+
+def _patients_by_email(patient_ids=None, emails=None):
+    """
+    Ids of the Patient records per email (consultations are attached by email).
+
+    Args:
+        patient_ids: Only these patients (default: all)
+        emails: Only these emails (list or values queryset, default: all)
+    """
+    patients = Patient.objects.exclude(Q(email__isnull=True) | Q(email=''))
+    if patient_ids is not None:
+        patients = patients.filter(id__in=patient_ids)
+    if emails is not None:
+        patients = patients.filter(email__in=emails)
+    by_email = {}
+    for patient_id, email in patients.values_list('id', 'email'):
+        by_email.setdefault(email, []).append(patient_id)
+    return by_email
+
+
+def _medical_record_rows(records):
+    """PatientVitalSign instances of PatientMedicalRecord rows"""
+    for record in records.values(
+        'id', 'patient_id', 'doctor_id', 'recorded_at', 'created_at', *VITAL_FIELDS
+    ).iterator(chunk_size=BATCH_SIZE):
+        yield PatientVitalSign(
+            patient_id=record['patient_id'],
+            source='medical_record',
+            source_id=record['id'],
+            recorded_at=record['recorded_at'] or record['created_at'],
+            recorded_by_id=record['doctor_id'],
+            **{name: record[name] for name in VITAL_FIELDS}
+        )
+
+
+def _consultation_vitals_rows(vitals, patients_by_email):
+    """PatientVitalSign instances of consultations.VitalSigns rows"""
+    fields = [name for name in VITAL_FIELDS if name != 'waist_circumference']
+    for row in vitals.values(
+        'id', 'recorded_at', 'recorded_by_id', 'consultation__appointment__patient__email', *fields
+    ).iterator(chunk_size=BATCH_SIZE):
+        for patient_id in patients_by_email.get(row['consultation__appointment__patient__email'], ()):
+            yield PatientVitalSign(
+                patient_id=patient_id,
+                source='consultation_vitals',
+                source_id=row['id'],
+                recorded_at=row['recorded_at'],
+                recorded_by_id=row['recorded_by_id'],
+                **{name: row[name] for name in fields}
+            )
+
+
+def _consultation_rows(consultations, patients_by_email):
+    """PatientVitalSign instances of the consultations' vital_signs JSON"""
+    for row in consultations.values(
+        'id', 'vital_signs', 'start_time', 'created_at',
+        'appointment__doctor_id', 'appointment__patient__email'
+    ).iterator(chunk_size=BATCH_SIZE):
+        values = parse_consultation_vitals(row['vital_signs'])
+        if not values:
+            continue
+        for patient_id in patients_by_email.get(row['appointment__patient__email'], ()):
+            yield PatientVitalSign(
+                patient_id=patient_id,
+                source='consultation',
+                source_id=row['id'],
+                recorded_at=row['start_time'] or row['created_at'],
+                recorded_by_id=row['appointment__doctor_id'],
+                **values
+            )
+
+
+def _replace(source, source_ids, rows):
+    """Replace the entries of source rows"""
+    with transaction.atomic():
+        PatientVitalSign.objects.filter(source=source, source_id__in=source_ids).delete()
+        PatientVitalSign.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+
+
+def remove_source(source, source_ids):
+    """Remove the entries of deleted source rows"""
+    PatientVitalSign.objects.filter(source=source, source_id__in=source_ids).delete()
+
+
+def sync_medical_record(record):
+    """(Re-)copy a PatientMedicalRecord after it was saved"""
+    _replace('medical_record', [record.id], _medical_record_rows(PatientMedicalRecord.objects.filter(id=record.id)))
+
+
+def sync_consultation_vitals(vitals):
+    """(Re-)copy a consultations.VitalSigns row after it was saved"""
+    from consultations.models import VitalSigns
+
+    rows = VitalSigns.objects.filter(id=vitals.id)
+    _replace('consultation_vitals', [vitals.id], _consultation_vitals_rows(
+        rows, _patients_by_email(emails=rows.values('consultation__appointment__patient__email'))
+    ))
+
+
+def sync_consultation(consultation):
+    """(Re-)copy a consultation's vital_signs JSON after it was saved"""
+    from consultations.models import Consultation
+
+    rows = Consultation.objects.filter(id=consultation.id)
+    _replace('consultation', [consultation.id], _consultation_rows(
+        rows, _patients_by_email(emails=rows.values('appointment__patient__email'))
+    ))
+
+
+def sync_patient_consultations(patient):
+    """Re-attach the consultation vitals of a Patient record whose email was set or changed"""
+    from consultations.models import Consultation, VitalSigns
+
+    with transaction.atomic():
+        PatientVitalSign.objects.filter(
+            patient=patient, source__in=['consultation', 'consultation_vitals']
+        ).delete()
+        if not patient.email:
+            return
+        patients_by_email = {patient.email: [patient.id]}
+        PatientVitalSign.objects.bulk_create(
+            [
+                *_consultation_rows(
+                    Consultation.objects.filter(appointment__patient__email=patient.email), patients_by_email
+                ),
+                *_consultation_vitals_rows(
+                    VitalSigns.objects.filter(consultation__appointment__patient__email=patient.email),
+                    patients_by_email
+                ),
+            ],
+            batch_size=BATCH_SIZE
+        )
+
+
+def _bulk_insert(rows):
+    """Insert rows in batches, without holding them all in memory"""
+    inserted = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            PatientVitalSign.objects.bulk_create(batch)
+            inserted += len(batch)
+            batch = []
+    PatientVitalSign.objects.bulk_create(batch)
+    return inserted + len(batch)
+
+
+def rebuild_vitals(patient_ids=None):
+    """
+    Rebuild the table from the three sources.
+
+    Args:
+        patient_ids: Only rebuild these patients' entries (default: all)
+
+    Returns:
+        Number of entries written
+    """
+    from consultations.models import Consultation, VitalSigns
+
+    records = PatientMedicalRecord.objects.all()
+    entries = PatientVitalSign.objects.all()
+    if patient_ids:
+        records = records.filter(patient_id__in=patient_ids)
+        entries = entries.filter(patient_id__in=patient_ids)
+    patients_by_email = _patients_by_email(patient_ids or None)
+    consultations = Consultation.objects.all()
+    vitals = VitalSigns.objects.all()
+    if patient_ids:
+        consultations = consultations.filter(appointment__patient__email__in=list(patients_by_email))
+        vitals = vitals.filter(consultation__appointment__patient__email__in=list(patients_by_email))
+
+    with transaction.atomic():
+        entries.delete()
+        return (
+            _bulk_insert(_medical_record_rows(records))
+            + _bulk_insert(_consultation_vitals_rows(vitals, patients_by_email))
+            + _bulk_insert(_consultation_rows(consultations, patients_by_email))
+        )
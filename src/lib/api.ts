@@ -424,6 +424,23 @@ export const appointmentsAPI = {
     console.log("⚠️ Unexpected response format, returning empty array");
     return [];
   },
+
+  // Earliest free slots across all doctors of a specialization
+  findFirstAvailableSlots: async (params: {
+    specialization: string;
+    start_date?: string;
+    end_date?: string;
+    days_ahead?: number;
+    limit?: number;
+  }) => {
+    const response = await api.get(
+      "/api/appointments/time-slots/first_available/",
+      {
+        params,
+      }
+    );
+    return response.data.slots || [];
+  },
 };
 
 // Time Slots API
@@ -626,6 +643,22 @@ export const healthPredictionsAPI = {
     return response.data;
   },
 
+  predictBatch: async (rows: Array<Record<string, number>>) => {
+    const response = await api.post(
+      "/api/health-predictions/predictions/predict_batch/",
+      { rows }
+    );
+    return response.data;
+  },
+
+  predictBatchCsv: async (csvFile: FormData) => {
+    const response = await apiFileUpload.post(
+      "/api/health-predictions/predictions/predict_batch/",
+      csvFile
+    );
+    return response.data;
+  },
+
   getMyPredictions: async () => {
     const response = await api.get(
       "/api/health-predictions/predictions/my_predictions/"
@@ -640,13 +673,60 @@ export const healthPredictionsAPI = {
     return response.data;
   },
 
-  segmentBrainTumor: async (imageFile: FormData) => {
+  segmentBrainTumor: async (
+    imageFile: FormData,
+    options?: {
+      mask_format?: "png" | "rle" | "bitpacked";
+      include_original?: boolean;
+      include_comparison?: boolean;
+    }
+  ) => {
     const response = await apiFileUpload.post(
       "/api/health-predictions/segmentation/segment/",
+      imageFile,
+      { params: options }
+    );
+    return response.data;
+  },
+
+  createSegmentationJob: async (imageFile: FormData) => {
+    const response = await apiFileUpload.post(
+      "/api/health-predictions/segmentation-jobs/",
       imageFile
     );
     return response.data;
   },
+
+  getSegmentationJob: async (
+    jobId: string,
+    options?: {
+      mask_format?: "png" | "rle" | "bitpacked";
+      include_original?: boolean;
+      include_comparison?: boolean;
+    }
+  ) => {
+    const response = await api.get(
+      `/api/health-predictions/segmentation-jobs/${jobId}/`,
+      { params: options }
+    );
+    return response.data;
+  },
+
+  cancelSegmentationJob: async (jobId: string) => {
+    const response = await api.post(
+      `/api/health-predictions/segmentation-jobs/${jobId}/cancel/`
+    );
+    return response.data;
+  },
+
+  getSegmentationComparison: async (resultId: string) => {
+    // The endpoint answers JSON (base64) to axios' default Accept header
+    const response = await api.get(
+      `/api/health-predictions/segmentation/${resultId}/comparison/`,
+      { responseType: "blob", headers: { Accept: "image/png" } }
+    );
+    return response.data;
+  },
 };
 
 // Medical Records API